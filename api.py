@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import os, sys
+import argparse
+import threading
 import uvicorn
 import aiofiles
 import configparser
@@ -14,11 +16,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uuid
 
-from sources.llm_provider import Provider
-from sources.interaction import Interaction
-from sources.agents import CasualAgent, CoderAgent, FileAgent, PlannerAgent, BrowserAgent
-from sources.browser import Browser, create_driver
-from sources.utility import pretty_print
+from sources.utility import pretty_print, startup_profiler
+
+with startup_profiler.phase("imports"):
+    from sources.llm_provider import Provider
+    from sources.interaction import Interaction
+    from sources.agents import CasualAgent, CoderAgent, FileAgent, PlannerAgent, BrowserAgent
+    from sources.browser import Browser, create_driver
 from sources.logger import Logger
 from sources.schemas import QueryRequest, QueryResponse
 
@@ -52,6 +56,10 @@ logger = Logger("backend.log")
 config = configparser.ConfigParser()
 config.read('config.ini')
 
+parser = argparse.ArgumentParser(description='AgenticSeek API server')
+parser.add_argument('--profile-startup', action='store_true', help='print the time spent in each startup phase')
+args, _ = parser.parse_known_args()
+
 api.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -87,47 +95,50 @@ def initialize_system():
         
         headless = True
     
-    provider = Provider(
-        provider_name=config["MAIN"]["provider_name"],
-        model=config["MAIN"]["provider_model"],
-        server_address=config["MAIN"]["provider_server_address"],
-        is_local=config.getboolean('MAIN', 'is_local')
-    )
+    with startup_profiler.phase("provider"):
+        provider = Provider(
+            provider_name=config["MAIN"]["provider_name"],
+            model=config["MAIN"]["provider_model"],
+            server_address=config["MAIN"]["provider_server_address"],
+            is_local=config.getboolean('MAIN', 'is_local')
+        )
     logger.info(f"Provider initialized: {provider.provider_name} ({provider.model})")
 
-    browser = Browser(
-        create_driver(headless=headless, stealth_mode=stealth_mode, lang=languages[0]),
-        anticaptcha_manual_install=stealth_mode
-    )
+    with startup_profiler.phase("browser"):
+        browser = Browser(
+            create_driver(headless=headless, stealth_mode=stealth_mode, lang=languages[0]),
+            anticaptcha_manual_install=stealth_mode
+        )
     logger.info("Browser initialized")
 
-    agents = [
-        CasualAgent(
-            name=config["MAIN"]["agent_name"],
-            prompt_path=f"prompts/{personality_folder}/casual_agent.txt",
-            provider=provider, verbose=False
-        ),
-        CoderAgent(
-            name="coder",
-            prompt_path=f"prompts/{personality_folder}/coder_agent.txt",
-            provider=provider, verbose=False
-        ),
-        FileAgent(
-            name="File Agent",
-            prompt_path=f"prompts/{personality_folder}/file_agent.txt",
-            provider=provider, verbose=False
-        ),
-        BrowserAgent(
-            name="Browser",
-            prompt_path=f"prompts/{personality_folder}/browser_agent.txt",
-            provider=provider, verbose=False, browser=browser
-        ),
-        PlannerAgent(
-            name="Planner",
-            prompt_path=f"prompts/{personality_folder}/planner_agent.txt",
-            provider=provider, verbose=False, browser=browser
-        )
-    ]
+    with startup_profiler.phase("agents"):
+        agents = [
+            CasualAgent(
+                name=config["MAIN"]["agent_name"],
+                prompt_path=f"prompts/{personality_folder}/casual_agent.txt",
+                provider=provider, verbose=False
+            ),
+            CoderAgent(
+                name="coder",
+                prompt_path=f"prompts/{personality_folder}/coder_agent.txt",
+                provider=provider, verbose=False
+            ),
+            FileAgent(
+                name="File Agent",
+                prompt_path=f"prompts/{personality_folder}/file_agent.txt",
+                provider=provider, verbose=False
+            ),
+            BrowserAgent(
+                name="Browser",
+                prompt_path=f"prompts/{personality_folder}/browser_agent.txt",
+                provider=provider, verbose=False, browser=browser
+            ),
+            PlannerAgent(
+                name="Planner",
+                prompt_path=f"prompts/{personality_folder}/planner_agent.txt",
+                provider=provider, verbose=False, browser=browser
+            )
+        ]
     logger.info("Agents initialized")
 
     interaction = Interaction(
@@ -135,15 +146,44 @@ def initialize_system():
         tts_enabled=config.getboolean('MAIN', 'speak'),
         stt_enabled=config.getboolean('MAIN', 'listen'),
         recover_last_session=config.getboolean('MAIN', 'recover_last_session'),
-        langs=languages
+        langs=languages,
+        routing_engine=config.get('MAIN', 'routing_engine', fallback='cascade'),
+        router_confidence_threshold=config.getfloat('MAIN', 'router_confidence_threshold', fallback=0.7),
+        routing_cache_size=config.getint('MAIN', 'routing_cache_size', fallback=1024)
     )
     logger.info("Interaction initialized")
     return interaction
 
-interaction = initialize_system()
+interaction = None
+startup_error = None
 is_generating = False
 query_resp_history = []
 
+def initialize_in_background():
+    """
+    Initialize the agents and models in a background thread, so the API serves /health while they load.
+    """
+    global interaction, startup_error
+    try:
+        interaction = initialize_system()
+    except Exception as e:
+        startup_error = str(e)
+        logger.error(f"Initialization failed: {startup_error}")
+        return
+    if args.profile_startup:
+        interaction.router.wait_ready()
+        startup_profiler.report()
+
+def not_ready_response() -> JSONResponse:
+    if startup_error is not None:
+        return JSONResponse(status_code=500, content={"error": f"Initialization failed: {startup_error}"})
+    failed = {name: state for name, state in interaction.router.readiness().items() if state.startswith("error")} if interaction is not None else {}
+    if failed:
+        return JSONResponse(status_code=500, content={"error": f"Router models failed to load: {failed}"})
+    return JSONResponse(status_code=503, content={"error": "AgenticSeek is still loading, please retry shortly"})
+
+threading.Thread(target=initialize_in_background, daemon=True).start()
+
 @api.get("/screenshot")
 async def get_screenshot():
     logger.info("Screenshot endpoint called")
@@ -159,22 +199,52 @@ async def get_screenshot():
 @api.get("/health")
 async def health_check():
     logger.info("Health check endpoint called")
-    return {"status": "healthy", "version": "0.1.0"}
+    if interaction is None:
+        return {"status": "error" if startup_error else "loading", "version": "0.1.0", "ready": False, "router": {}, "backends": []}
+    providers = {id(agent.llm): agent.llm for agent in interaction.agents}.values()
+    return {"status": "healthy", "version": "0.1.0",
+            "ready": interaction.router.is_ready(),
+            "router": interaction.router.readiness(),
+            "backends": [provider.health_report() for provider in providers]}
+
+@api.get("/sessions")
+async def list_sessions():
+    logger.info("Sessions endpoint called")
+    if interaction is None:
+        return not_ready_response()
+    return {"current": interaction.session_id, "sessions": interaction.list_sessions()}
+
+@api.post("/sessions/{session_id}/recover")
+async def recover_session(session_id: str):
+    logger.info(f"Recover session endpoint called for {session_id}")
+    if interaction is None:
+        return not_ready_response()
+    if is_generating:
+        return JSONResponse(status_code=429, content={"error": "A query is being processed, please wait."})
+    if not interaction.load_last_session(session_id):
+        return JSONResponse(status_code=404, content={"error": f"Session {session_id} not found"})
+    return {"status": "recovered", "session_id": session_id}
 
 @api.get("/is_active")
 async def is_active():
     logger.info("Is active endpoint called")
+    if interaction is None:
+        return not_ready_response()
     return {"is_active": interaction.is_active}
 
 @api.get("/stop")
 async def stop():
     logger.info("Stop endpoint called")
+    if interaction is None:
+        return not_ready_response()
     interaction.current_agent.request_stop()
     return JSONResponse(status_code=200, content={"status": "stopped"})
 
 @api.get("/latest_answer")
 async def get_latest_answer():
     global query_resp_history
+    if interaction is None:
+        return not_ready_response()
     if interaction.current_agent is None:
         return JSONResponse(status_code=404, content={"error": "No agent available"})
     uid = str(uuid.uuid4())
@@ -222,6 +292,8 @@ async def think_wrapper(interaction, query):
 async def process_query(request: QueryRequest):
     global is_generating, query_resp_history
     logger.info(f"Processing query: {request.query}")
+    if interaction is None or not interaction.router.is_ready():
+        return not_ready_response()
     query_resp = QueryResponse(
         done="false",
         answer="",
@@ -4,12 +4,15 @@ import sys
 import argparse
 import configparser
 import asyncio
+import datetime
 
-from sources.llm_provider import Provider
-from sources.interaction import Interaction
-from sources.agents import Agent, CoderAgent, CasualAgent, FileAgent, PlannerAgent, BrowserAgent, McpAgent
-from sources.browser import Browser, create_driver
-from sources.utility import pretty_print
+from sources.utility import pretty_print, startup_profiler
+
+with startup_profiler.phase("imports"):
+    from sources.llm_provider import Provider
+    from sources.interaction import Interaction
+    from sources.agents import Agent, CoderAgent, CasualAgent, FileAgent, PlannerAgent, BrowserAgent, McpAgent
+    from sources.browser import Browser, create_driver
 
 import warnings
 warnings.filterwarnings("ignore")
@@ -17,49 +20,74 @@ warnings.filterwarnings("ignore")
 config = configparser.ConfigParser()
 config.read('config.ini')
 
-async def main():
+parser = argparse.ArgumentParser(description='AgenticSeek command line interface')
+parser.add_argument('--profile-startup', action='store_true', help='print the time spent in each startup phase')
+parser.add_argument('--list-sessions', action='store_true', help='list the saved sessions and exit')
+parser.add_argument('--session', type=str, default=None, help='id of a saved session to recover')
+
+def list_sessions():
+    from sources.session_index import SessionIndex
+    sessions = SessionIndex().list_all()
+    if not sessions:
+        pretty_print("No saved session.", color="warning")
+    for session in sessions:
+        updated = datetime.datetime.fromtimestamp(session['updated_at']).strftime('%Y-%m-%d %H:%M:%S')
+        pretty_print(f"{session['session_id']}  {updated}  {session['message_count']} messages  ({', '.join(session['agent_types'])})", color="info")
+
+async def main(args):
     pretty_print("Initializing...", color="status")
     stealth_mode = config.getboolean('BROWSER', 'stealth_mode')
     personality_folder = "jarvis" if config.getboolean('MAIN', 'jarvis_personality') else "base"
     languages = config["MAIN"]["languages"].split(' ')
 
-    provider = Provider(provider_name=config["MAIN"]["provider_name"],
-                        model=config["MAIN"]["provider_model"],
-                        server_address=config["MAIN"]["provider_server_address"],
-                        is_local=config.getboolean('MAIN', 'is_local'))
+    with startup_profiler.phase("provider"):
+        provider = Provider(provider_name=config["MAIN"]["provider_name"],
+                            model=config["MAIN"]["provider_model"],
+                            server_address=config["MAIN"]["provider_server_address"],
+                            is_local=config.getboolean('MAIN', 'is_local'))
 
-    browser = Browser(
-        create_driver(headless=config.getboolean('BROWSER', 'headless_browser'), stealth_mode=stealth_mode, lang=languages[0]),
-        anticaptcha_manual_install=stealth_mode
-    )
+    with startup_profiler.phase("browser"):
+        browser = Browser(
+            create_driver(headless=config.getboolean('BROWSER', 'headless_browser'), stealth_mode=stealth_mode, lang=languages[0]),
+            anticaptcha_manual_install=stealth_mode
+        )
 
-    agents = [
-        CasualAgent(name=config["MAIN"]["agent_name"],
-                    prompt_path=f"prompts/{personality_folder}/casual_agent.txt",
-                    provider=provider, verbose=False),
-        CoderAgent(name="coder",
-                   prompt_path=f"prompts/{personality_folder}/coder_agent.txt",
-                   provider=provider, verbose=False),
-        FileAgent(name="File Agent",
-                  prompt_path=f"prompts/{personality_folder}/file_agent.txt",
-                  provider=provider, verbose=False),
-        BrowserAgent(name="Browser",
-                     prompt_path=f"prompts/{personality_folder}/browser_agent.txt",
-                     provider=provider, verbose=False, browser=browser),
-        PlannerAgent(name="Planner",
-                     prompt_path=f"prompts/{personality_folder}/planner_agent.txt",
-                     provider=provider, verbose=False, browser=browser),
-        #McpAgent(name="MCP Agent",
-        #            prompt_path=f"prompts/{personality_folder}/mcp_agent.txt",
-        #            provider=provider, verbose=False), # NOTE under development
-    ]
+    with startup_profiler.phase("agents"):
+        agents = [
+            CasualAgent(name=config["MAIN"]["agent_name"],
+                        prompt_path=f"prompts/{personality_folder}/casual_agent.txt",
+                        provider=provider, verbose=False),
+            CoderAgent(name="coder",
+                       prompt_path=f"prompts/{personality_folder}/coder_agent.txt",
+                       provider=provider, verbose=False),
+            FileAgent(name="File Agent",
+                      prompt_path=f"prompts/{personality_folder}/file_agent.txt",
+                      provider=provider, verbose=False),
+            BrowserAgent(name="Browser",
+                         prompt_path=f"prompts/{personality_folder}/browser_agent.txt",
+                         provider=provider, verbose=False, browser=browser),
+            PlannerAgent(name="Planner",
+                         prompt_path=f"prompts/{personality_folder}/planner_agent.txt",
+                         provider=provider, verbose=False, browser=browser),
+            #McpAgent(name="MCP Agent",
+            #            prompt_path=f"prompts/{personality_folder}/mcp_agent.txt",
+            #            provider=provider, verbose=False), # NOTE under development
+        ]
 
     interaction = Interaction(agents,
                               tts_enabled=config.getboolean('MAIN', 'speak'),
                               stt_enabled=config.getboolean('MAIN', 'listen'),
                               recover_last_session=config.getboolean('MAIN', 'recover_last_session'),
-                              langs=languages
+                              langs=languages,
+                              routing_engine=config.get('MAIN', 'routing_engine', fallback='cascade'),
+                              router_confidence_threshold=config.getfloat('MAIN', 'router_confidence_threshold', fallback=0.7),
+                              routing_cache_size=config.getint('MAIN', 'routing_cache_size', fallback=1024)
                             )
+    if args.session:
+        interaction.load_last_session(args.session)
+    if args.profile_startup:
+        interaction.router.wait_ready()
+        startup_profiler.report()
     try:
         while interaction.is_active:
             interaction.get_user()
@@ -75,4 +103,8 @@ async def main():
             interaction.save_session()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    args = parser.parse_args()
+    if args.list_sessions:
+        list_sessions()
+        sys.exit(0)
+    asyncio.run(main(args))
\ No newline at end of file
@@ -1,8 +1,9 @@
 #!/usr/bin python3
 
 import argparse
+import json
 import time
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 
 from sources.llamacpp_handler import LlamacppLLM
 from sources.ollama_handler import OllamaLLM
@@ -10,6 +11,11 @@ from sources.ollama_handler import OllamaLLM
 parser = argparse.ArgumentParser(description='AgenticSeek server script')
 parser.add_argument('--provider', type=str, help='LLM backend library to use. set to [ollama], [vllm] or [llamacpp]', required=True)
 parser.add_argument('--port', type=int, help='port to use', required=True)
+parser.add_argument('--workers', type=int, default=4, help='number of generations running concurrently')
+parser.add_argument('--max_queue', type=int, default=32, help='number of queued generations before new ones are rejected')
+parser.add_argument('--no_cache', action='store_true', help='disable the response cache')
+parser.add_argument('--cache_size', type=int, default=1024, help='number of cached responses kept in memory')
+parser.add_argument('--cache_ttl', type=float, default=3600, help='time in seconds before a cached response expires')
 args = parser.parse_args()
 
 app = Flask(__name__)
@@ -17,11 +23,15 @@ app = Flask(__name__)
 assert args.provider in ["ollama", "llamacpp"], f"Provider {args.provider} does not exists. see --help for more information"
 
 handler_map = {
-    "ollama": OllamaLLM(),
-    "llamacpp": LlamacppLLM(),
+    "ollama": OllamaLLM,
+    "llamacpp": LlamacppLLM,
 }
 
-generator = handler_map[args.provider]
+generator = handler_map[args.provider](max_workers=args.workers,
+                                       max_queue_size=args.max_queue,
+                                       use_cache=not args.no_cache,
+                                       cache_size=args.cache_size,
+                                       cache_ttl=args.cache_ttl)
 
 @app.route('/generate', methods=['POST'])
 def start_generation():
@@ -29,9 +39,46 @@ def start_generation():
         return jsonify({"error": "Generator not initialized"}), 401
     data = request.get_json()
     history = data.get('messages', [])
-    if generator.start(history):
-        return jsonify({"message": "Generation started"}), 202
-    return jsonify({"error": "Generation already in progress"}), 402
+    model = data.get('model', None)
+    if model is None and generator.model is None:
+        return jsonify({"error": "Model not set"}), 403
+    request_id = generator.start(history, model=model)
+    if request_id is not None:
+        return jsonify({"message": "Generation started", "id": request_id}), 202
+    return jsonify({"error": "Generation queue is full"}), 429
+
+@app.route('/cancel', methods=['POST'])
+def cancel_generation():
+    data = request.get_json()
+    request_id = data.get('id', None)
+    if request_id is None:
+        return jsonify({"error": "Generation id not provided"}), 403
+    if not generator.cancel(request_id):
+        return jsonify({"error": f"Generation {request_id} not found"}), 404
+    return jsonify({"message": "Generation cancelled", "id": request_id}), 200
+
+@app.route('/generate_stream', methods=['POST'])
+def stream_generation():
+    if generator is None:
+        return jsonify({"error": "Generator not initialized"}), 401
+    data = request.get_json()
+    history = data.get('messages', [])
+    model = data.get('model', None)
+    if model is None and generator.model is None:
+        return jsonify({"error": "Model not set"}), 403
+    request_id = generator.start(history, stream=True, model=model)
+    if request_id is None:
+        return jsonify({"error": "Generation queue is full"}), 429
+
+    def event_stream():
+        yield f"data: {json.dumps({'id': request_id})}\n\n"
+        try:
+            for content in generator.stream(request_id):
+                yield f"data: {json.dumps({'token': content})}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        yield "data: [DONE]\n\n"
+    return Response(stream_with_context(event_stream()), mimetype='text/event-stream')
 
 @app.route('/setup', methods=['POST'])
 def setup():
@@ -46,8 +93,17 @@ def setup():
 def get_updated_sentence():
     if not generator:
         return jsonify({"error": "Generator not initialized"}), 405
-    print(generator.get_status())
-    return generator.get_status()
+    request_id = request.args.get('id', None)
+    status = generator.get_status(request_id)
+    if status is None:
+        return jsonify({"error": f"Generation {request_id} not found"}), 404
+    return status
+
+@app.route('/cache_stats')
+def cache_stats():
+    if not generator:
+        return jsonify({"error": "Generator not initialized"}), 405
+    return jsonify(generator.cache_stats()), 200
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', threaded=True, debug=True, port=args.port)
\ No newline at end of file
@@ -1,36 +1,105 @@
-import os
 import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 class Cache:
-    def __init__(self, cache_dir='.cache', cache_file='messages.json'):
+    """
+    Response cache keyed on the model and the message history.
+    The backends generate with the default sampling parameters of the model, so they are not part of the key.
+    Entries live in a SQLite file on disk, with an in-memory LRU in front of it.
+    """
+    def __init__(self, cache_dir='.cache', cache_file='messages.db', max_entries: int = 1024, ttl: float = 3600):
+        """
+        args:
+            cache_dir: directory of the SQLite cache file
+            cache_file: name of the SQLite cache file
+            max_entries: number of entries kept in the in-memory LRU
+            ttl: time in seconds before an entry expires, None to never expire
+        """
         self.cache_dir = Path(cache_dir)
         self.cache_file = self.cache_dir / cache_file
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        if not self.cache_file.exists():
-            with open(self.cache_file, 'w') as f:
-                json.dump([], f)
-
-        with open(self.cache_file, 'r') as f:
-            self.cache = set(json.load(f))
-
-    def add_message_pair(self, user_message: str, assistant_message: str):
-        """Add a user/assistant pair to the cache if not present."""
-        if not any(entry["user"] == user_message for entry in self.cache):
-            self.cache.append({"user": user_message, "assistant": assistant_message})
-            self._save()
-
-    def is_cached(self, user_message: str) -> bool:
-        """Check if a user msg is cached."""
-        return any(entry["user"] == user_message for entry in self.cache)
-
-    def get_cached_response(self, user_message: str) -> str | None:
-        """Return the assistant response to a user message if cached."""
-        for entry in self.cache:
-            if entry["user"] == user_message:
-                return entry["assistant"]
-        return None
-
-    def _save(self):
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f, indent=2)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.db = sqlite3.connect(self.cache_file, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, created REAL)")
+        self.db.commit()
+        self.prune()
+
+    @staticmethod
+    def make_key(model: str, history: list) -> str:
+        """
+        Hash the model and the normalized message history into a cache key.
+        Only the role and content of messages are used, extra fields like timestamps are ignored.
+        """
+        messages = [(message.get('role', ''), message.get('content', '').strip()) for message in history]
+        payload = json.dumps([model, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response for a key, None on miss or if the entry expired."""
+        with self.lock:
+            entry = self.lru.get(key)
+            if entry is None:
+                row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+                entry = tuple(row) if row is not None else None
+            if entry is None or self.is_expired(entry[1]):
+                self.lru.pop(key, None)
+                self.misses += 1
+                return None
+            self.remember(key, entry)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Add a response to the cache, the on-disk write is a single row insert."""
+        entry = (response, time.time())
+        with self.lock:
+            self.remember(key, entry)
+            self.db.execute("INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)", (key, *entry))
+            self.db.commit()
+            self.inserts += 1
+            if self.inserts % 100 == 0:
+                self.prune_locked()
+
+    def remember(self, key: str, entry: tuple) -> None:
+        """Insert an entry at the front of the LRU, evicting the least recently used ones."""
+        self.lru[key] = entry
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.max_entries:
+            self.lru.popitem(last=False)
+
+    def prune(self) -> None:
+        """Delete expired entries from disk."""
+        with self.lock:
+            self.prune_locked()
+
+    def prune_locked(self) -> None:
+        if self.ttl is None:
+            return
+        self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self.db.commit()
+
+    def stats(self) -> dict:
+        with self.lock:
+            size = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self.lru),
+                "disk_entries": size,
+            }
@@ -1,28 +1,62 @@
-
 import threading
 import logging
+import queue
+import uuid
 from abc import abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 from .cache import Cache
 
 class GenerationState:
-    def __init__(self):
+    def __init__(self, request_id: str = None, model: str = None):
         self.lock = threading.Lock()
+        self.request_id = request_id
+        self.model = model # model of the request, fixed when it is admitted
         self.last_complete_sentence = ""
         self.current_buffer = ""
         self.is_generating = False
-    
+        self.is_queued = False
+        self.cancelled = threading.Event()
+        self.error = None
+        self.chunks = None # queue of the generated chunks for a streaming client, None marks the end
+
     def status(self) -> dict:
-        return {
+        status = {
+            "id": self.request_id,
+            "model": self.model,
             "sentence": self.current_buffer,
             "is_complete": not self.is_generating,
             "last_complete_sentence": self.last_complete_sentence,
             "is_generating": self.is_generating,
+            "is_queued": self.is_queued,
+            "is_cancelled": self.cancelled.is_set(),
         }
+        if self.error is not None:
+            status["error"] = self.error
+        return status
 
 class GeneratorLLM():
-    def __init__(self):
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 32, max_finished_states: int = 128,
+                 use_cache: bool = True, cache_size: int = 1024, cache_ttl: float = 3600):
+        """
+        Base class for LLM generation backends.
+        args:
+            max_workers: number of generations running at the same time
+            max_queue_size: number of requests waiting for a worker before new ones are rejected
+            max_finished_states: number of finished generations kept around for polling
+            use_cache: answer identical requests from the response cache
+            cache_size: number of responses kept in memory
+            cache_ttl: time in seconds before a cached response expires
+        """
         self.model = None
-        self.state = GenerationState()
+        self.states = OrderedDict()
+        self.states_lock = threading.Lock()
+        self.last_request_id = None
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.max_finished_states = max_finished_states
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.logger = logging.getLogger(__name__)
         handler = logging.StreamHandler()
         handler.setLevel(logging.INFO)
@@ -30,38 +64,179 @@ class GeneratorLLM():
         handler.setFormatter(formatter)
         self.logger.addHandler(handler)
         self.logger.setLevel(logging.INFO)
-        cache = Cache()
-    
+        self.cache = Cache(max_entries=cache_size, ttl=cache_ttl) if use_cache else None
+
     def set_model(self, model: str) -> None:
         self.logger.info(f"Model set to {model}")
         self.model = model
-    
-    def start(self, history: list) -> bool:
-        if self.model is None:
+
+    def evict_finished_states(self) -> None:
+        """
+        Drop the oldest finished generations once more than max_finished_states are kept.
+        Must be called with states_lock held.
+        """
+        finished = [request_id for request_id, state in self.states.items() if not state.is_generating]
+        for request_id in finished[:max(0, len(finished) - self.max_finished_states)]:
+            del self.states[request_id]
+
+    def start(self, history: list, stream: bool = False, model: str = None) -> str | None:
+        """
+        Queue a generation and return its request id, or None if all workers and queue slots are taken.
+        Requests are admitted to the worker pool in FIFO order.
+        args:
+            history: list of messages
+            stream: keep the generated chunks for stream(), in addition to the polled status
+            model: model of the request, defaults to the model set by set_model() at admission
+        """
+        model = model or self.model
+        if model is None:
             raise Exception("Model not set")
-        with self.state.lock:
-            if self.state.is_generating:
-                return False
-            self.state.is_generating = True
-            self.logger.info("Starting generation")
-            threading.Thread(target=self.generate, args=(history,)).start()
+        with self.states_lock:
+            in_flight = sum(1 for state in self.states.values() if state.is_generating)
+            if in_flight >= self.max_workers + self.max_queue_size:
+                return None
+            request_id = str(uuid.uuid4())
+            state = GenerationState(request_id, model)
+            state.is_generating = True
+            state.is_queued = True
+            if stream:
+                state.chunks = queue.Queue()
+            self.states[request_id] = state
+            self.last_request_id = request_id
+            self.evict_finished_states()
+        self.logger.info(f"Queued generation {request_id}")
+        self.executor.submit(self.generate, history, state)
+        return request_id
+
+    def cancel(self, request_id: str) -> bool:
+        """
+        Request a generation to stop, it is stopped at the next generated chunk.
+        """
+        with self.states_lock:
+            state = self.states.get(request_id)
+        if state is None:
+            return False
+        state.cancelled.set()
+        self.logger.info(f"Cancel requested for generation {request_id}")
         return True
-    
-    def get_status(self) -> dict:
-        with self.state.lock:
-            return self.state.status()
 
-    @abstractmethod
-    def generate(self, history: list) -> None:
+    def stream(self, request_id: str) -> Iterator[str]:
+        """
+        Yield the chunks of a generation started with stream=True, as they are generated.
+        The generation is cancelled if the consumer stops reading before it is complete.
         """
-        Generate text using the model.
+        state = self.get_state(request_id)
+        if state is None or state.chunks is None:
+            raise Exception(f"Generation {request_id} is not streamed")
+        completed = False
+        try:
+            while True:
+                content = state.chunks.get()
+                if content is None:
+                    break
+                yield content
+            completed = True
+        finally:
+            if not completed:
+                self.cancel(request_id)
+        if state.error is not None:
+            raise Exception(state.error)
+
+    def get_state(self, request_id: str = None) -> GenerationState | None:
+        with self.states_lock:
+            if request_id is None:
+                request_id = self.last_request_id
+            return self.states.get(request_id)
+
+    def get_status(self, request_id: str = None) -> dict | None:
+        """
+        Get the status of a generation, defaults to the most recent one.
+        """
+        state = self.get_state(request_id)
+        if state is None:
+            if request_id is None:
+                return GenerationState().status()
+            return None
+        with state.lock:
+            return state.status()
+
+    def generate(self, history: list, state: GenerationState) -> None:
+        """
+        Generate text using the model and store it in the generation state for polling.
         args:
             history: list of strings
+            state: the generation state of the request
         returns:
             None
         """
+        self.logger.info(f"Using {state.model} for generation {state.request_id}")
+        try:
+            with state.lock:
+                state.is_queued = False
+                state.last_complete_sentence = ""
+                state.current_buffer = ""
+            if state.cancelled.is_set():
+                return
+            for content in self.generate_cached(history, state.model):
+                if state.cancelled.is_set():
+                    self.logger.info(f"Generation {state.request_id} cancelled")
+                    break
+                with state.lock:
+                    if '.' in content:
+                        self.logger.info(state.current_buffer)
+                    state.current_buffer += content
+                if state.chunks is not None:
+                    state.chunks.put(content)
+        except Exception as e:
+            self.logger.error(f"Error: {e}")
+            with state.lock:
+                state.error = str(e)
+        finally:
+            self.logger.info(f"Generation {state.request_id} complete")
+            with state.lock:
+                state.is_queued = False
+                state.is_generating = False
+            if state.chunks is not None:
+                state.chunks.put(None)
+
+    def generate_cached(self, history: list, model: str) -> Iterator[str]:
+        """
+        Stream a generation, answering from the response cache if the same history was already answered by the model.
+        Only non-empty generations that run to completion are cached, failed or cancelled ones are not.
+        """
+        if self.cache is None:
+            yield from self.generate_stream(history, model)
+            return
+        key = Cache.make_key(model, history)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.logger.info("Answering from response cache")
+            yield cached
+            return
+        response = ""
+        for content in self.generate_stream(history, model):
+            response += content
+            yield content
+        if response.strip():
+            self.cache.put(key, response)
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    @abstractmethod
+    def generate_stream(self, history: list, model: str) -> Iterator[str]:
+        """
+        Generate text using the model, yielding chunks as soon as they are produced.
+        args:
+            history: list of strings
+            model: the model of the request
+        returns:
+            Iterator over the generated text chunks
+        """
         pass
 
 if __name__ == "__main__":
     generator = GeneratorLLM()
-    generator.get_status()
\ No newline at end of file
+    generator.get_status()
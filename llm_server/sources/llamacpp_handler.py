@@ -1,40 +1,41 @@
 
+import threading
 from .generator import GeneratorLLM
 from llama_cpp import Llama
-from .decorator import timer_decorator
 
 class LlamacppLLM(GeneratorLLM):
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         """
         Handle generation using llama.cpp
+        A llama.cpp context is not thread safe, concurrent requests wait on llm_lock.
+        A single model is loaded at a time, it is reloaded when a request asks for another one.
         """
-        super().__init__()
+        super().__init__(**kwargs)
         self.llm = None
+        self.llm_model = None
+        self.llm_lock = threading.Lock()
     
-    @timer_decorator
-    def generate(self, history):
-        if self.llm is None:
-            self.logger.info(f"Loading {self.model}...")
+    def generate_stream(self, history, model):
+        with self.llm_lock:
+            yield from self.generate_locked(history, model)
+
+    def generate_locked(self, history, model):
+        if self.llm is None or self.llm_model != model:
+            self.logger.info(f"Loading {model}...")
             self.llm = Llama.from_pretrained(
-                repo_id=self.model,
+                repo_id=model,
                 filename="*Q8_0.gguf",
                 n_ctx=4096,
                 verbose=True
             )
-        self.logger.info(f"Using {self.model} for generation with Llama.cpp")
-        try:
-            with self.state.lock:
-                self.state.is_generating = True
-                self.state.last_complete_sentence = ""
-                self.state.current_buffer = ""
-            output = self.llm.create_chat_completion(
-                  messages = history
-            )
-            with self.state.lock:
-                self.state.current_buffer = output['choices'][0]['message']['content']
-        except Exception as e:
-            self.logger.error(f"Error: {e}")
-        finally:
-            with self.state.lock:
-                self.state.is_generating = False
\ No newline at end of file
+            self.llm_model = model
+        self.logger.info(f"Using {model} for generation with Llama.cpp")
+        stream = self.llm.create_chat_completion(
+              messages = history,
+              stream=True
+        )
+        for chunk in stream:
+            content = chunk['choices'][0]['delta'].get('content')
+            if content:
+                yield content
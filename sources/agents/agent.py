@@ -6,14 +6,20 @@ import random
 import time
 
 import asyncio
+import threading
+import configparser
 from concurrent.futures import ThreadPoolExecutor
 
 from sources.memory import Memory
 from sources.utility import pretty_print
 from sources.schemas import executorResult
+from sources.tools.block_parser import parse_blocks
 
 random.seed(time.time())
 
+config = configparser.ConfigParser()
+config.read('config.ini')
+
 class Agent():
     """
     An abstract class for all agents.
@@ -22,7 +28,8 @@ class Agent():
                        prompt_path:str,
                        provider,
                        verbose=False,
-                       browser=None) -> None:
+                       browser=None,
+                       parallel_execution=None) -> None:
         """
         Args:
             name (str): Name of the agent.
@@ -31,6 +38,8 @@ class Agent():
             recover_last_session (bool, optional): Whether to recover the last conversation. 
             verbose (bool, optional): Enable verbose logging if True. Defaults to False.
             browser: The browser class for web navigation (only for browser agent).
+            parallel_execution (bool, optional): Run the blocks of different tools concurrently in execute_modules.
+                Defaults to [MAIN] parallel_execution in config.ini, False if unset.
         """
             
         self.agent_name = name
@@ -49,6 +58,11 @@ class Agent():
         self.stop = False
         self.verbose = verbose
         self.executor = ThreadPoolExecutor(max_workers=1)
+        self.llm_task = None
+        if parallel_execution is None:
+            parallel_execution = config.getboolean('MAIN', 'parallel_execution', fallback=False)
+        self.parallel_execution = parallel_execution
+        self.max_parallel_blocks = 4
     
     @property
     def get_agent_name(self) -> str:
@@ -122,10 +136,13 @@ class Agent():
     
     def request_stop(self) -> None:
         """
-        Request the agent to stop.
+        Request the agent to stop. An ongoing LLM request is cancelled, aborting the generation.
         """
         self.stop = True
         self.status_message = "Stopped"
+        task = self.llm_task
+        if task is not None and not task.done():
+            task.get_loop().call_soon_threadsafe(task.cancel)
     
     @abstractmethod
     def process(self, prompt, speech_module) -> str:
@@ -159,23 +176,35 @@ class Agent():
     
     async def llm_request(self) -> Tuple[str, str]:
         """
-        Asynchronously ask the LLM to process the prompt.
+        Asynchronously ask the LLM to process the prompt and return the answer and the reasoning.
+        If the agent is stopped during the request, the generation is aborted and the partial answer returned.
         """
         self.status_message = "Thinking..."
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, self.sync_llm_request)
-    
-    def sync_llm_request(self) -> Tuple[str, str]:
-        """
-        Ask the LLM to process the prompt and return the answer and the reasoning.
-        """
-        memory = self.memory.get()
-        thought = self.llm.respond(memory, self.verbose)
+        chunks = []
+        self.llm_task = asyncio.ensure_future(self.stream_llm_request(chunks))
+        try:
+            thought = await self.llm_task
+        except asyncio.CancelledError:
+            if not self.stop:
+                raise
+            pretty_print("LLM request stopped.", color="warning")
+            thought = "".join(chunks)
+        finally:
+            self.llm_task = None
 
         reasoning = self.extract_reasoning_text(thought)
         answer = self.remove_reasoning_text(thought)
         self.memory.push('assistant', answer)
         return answer, reasoning
+
+    async def stream_llm_request(self, chunks: list) -> str:
+        """
+        Stream the LLM answer to the memory prompt, appending each chunk to chunks as it arrives.
+        """
+        memory = self.memory.get_within_budget()
+        async for chunk in self.llm.respond_async(memory, self.verbose):
+            chunks.append(chunk)
+        return "".join(chunks)
     
     async def wait_message(self, speech_module):
         if speech_module is None:
@@ -227,22 +256,20 @@ class Agent():
         """
         Remove all code/query blocks within a tag from the answer text.
         """
-        tag = f'```'
-        lines = text.split('\n')
-        post_lines = []
-        in_block = False
-        block_idx = 0
-        for line in lines:
-            if tag in line and not in_block:
-                in_block = True
-                continue
-            if not in_block:
-                post_lines.append(line)
-            if tag in line:
-                in_block = False
-                post_lines.append(f"block:{block_idx}")
-                block_idx += 1
-        return "\n".join(post_lines)
+        parts = []
+        last = 0
+        for block_idx, block in enumerate(parse_blocks(text)):
+            line_start = text.rfind('\n', 0, block.span[0]) + 1
+            if not block.closed: # an unclosed block hides the rest of the text
+                parts.append(text[last:max(line_start - 1, last)])
+                last = len(text)
+                break
+            parts.append(text[last:max(line_start, last)])
+            parts.append(f"block:{block_idx}")
+            line_end = text.find('\n', block.span[1])
+            last = len(text) if line_end == -1 else line_end
+        parts.append(text[last:])
+        return "".join(parts)
     
     def show_block(self, block: str) -> None:
         """
@@ -252,34 +279,120 @@ class Agent():
         pretty_print(block, color="code")
         pretty_print('▂'*64, color="status")
 
-    def execute_modules(self, answer: str) -> Tuple[bool, str]:
+    def plan_execution(self, answer: str) -> list:
+        """
+        Find the blocks of every tool in the answer.
+        Returns:
+            list: (tool name, tool, blocks, save path) of each tool with blocks, in the order of the tools.
+        """
+        plan = []
+        for name, tool in self.tools.items():
+            blocks, save_path = tool.load_exec_block(answer)
+            if blocks != None:
+                plan.append((name, tool, blocks, save_path))
+        return plan
+
+    def run_block(self, name: str, tool, block: str) -> executorResult:
+        """
+        Execute a single block with its tool.
+        """
+        output = tool.execute([block])
+        feedback = tool.interpreter_feedback(output) # tool interpreter feedback
+        success = not tool.execution_failure_check(output)
+        return executorResult(block, feedback, success, name)
+
+    def run_blocks_parallel(self, plan: list, stop_on_failure: bool = True) -> dict:
+        """
+        Execute the blocks of the plan in a worker pool.
+        The blocks of a tool run in order in the same worker, unless the tool declares independent_blocks,
+        the blocks of different tools run concurrently. After a failure, no new block is started when stop_on_failure is set.
+        Returns:
+            dict: executorResult of each executed block, keyed by (tool index, block index) in the plan.
+        """
+        lanes = []
+        for t, (_, tool, blocks, _) in enumerate(plan):
+            if tool.independent_blocks:
+                lanes.extend([[(t, b)] for b in range(len(blocks))])
+            else:
+                lanes.append([(t, b) for b in range(len(blocks))])
+        results = {}
+        failed = threading.Event()
+
+        def run_lane(lane):
+            for t, b in lane:
+                if stop_on_failure and failed.is_set():
+                    return
+                name, tool, blocks, _ = plan[t]
+                result = self.run_block(name, tool, blocks[b])
+                results[(t, b)] = result
+                if not result.success:
+                    failed.set()
+
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_blocks, len(lanes))) as pool:
+            for future in [pool.submit(run_lane, lane) for lane in lanes]:
+                future.result()
+        return results
+
+    def execute_modules(self, answer: str, parallel: bool = None, stop_on_failure: bool = True) -> Tuple[bool, str]:
         """
         Execute all the tools the agent has and return the result.
+        Args:
+            answer (str): The answer of the LLM containing the blocks.
+            parallel (bool, optional): Run the blocks of different tools concurrently, defaults to parallel_execution.
+            stop_on_failure (bool): Stop at the first failing block. With parallel execution the blocks already
+                                    running when a block fails still complete, their results are kept.
+        Returns:
+            Tuple[bool, str]: Whether all blocks succeeded, the feedback of the first failure or of the last block.
         """
         feedback = ""
-        success = True
-        blocks = None
         if answer.startswith("```"):
             answer = "I will execute:\n" + answer # there should always be a text before blocks for the function that display answer
 
         self.success = True
-        for name, tool in self.tools.items():
-            feedback = ""
-            blocks, save_path = tool.load_exec_block(answer)
-
-            if blocks != None:
+        plan = self.plan_execution(answer)
+        parallel = self.parallel_execution if parallel is None else parallel
+        results = None
+        if parallel and sum(len(blocks) for _, _, blocks, _ in plan) > 1:
+            for name, _, blocks, _ in plan:
                 pretty_print(f"Executing {len(blocks)} {name} blocks...", color="status")
                 for block in blocks:
                     self.show_block(block)
-                    output = tool.execute([block])
-                    feedback = tool.interpreter_feedback(output) # tool interpreter feedback
-                    success = not tool.execution_failure_check(output)
-                    self.blocks_result.append(executorResult(block, feedback, success, name))
-                    if not success:
-                        self.success = False
-                        self.memory.push('user', feedback)
-                        return False, feedback
-                self.memory.push('user', feedback)
-                if save_path != None:
-                    tool.save_block(blocks, save_path)
+            results = self.run_blocks_parallel(plan, stop_on_failure)
+
+        first_failure = None
+        for t, (name, tool, blocks, save_path) in enumerate(plan):
+            if results is None:
+                if first_failure is not None and stop_on_failure:
+                    break
+                pretty_print(f"Executing {len(blocks)} {name} blocks...", color="status")
+            tool_failure = None
+            executed = 0
+            for b, block in enumerate(blocks):
+                if results is None:
+                    if tool_failure is not None and stop_on_failure:
+                        break
+                    self.show_block(block)
+                    result = self.run_block(name, tool, block)
+                elif (t, b) in results:
+                    result = results[(t, b)]
+                else:
+                    continue
+                executed += 1
+                self.blocks_result.append(result)
+                feedback = result.feedback
+                if not result.success and tool_failure is None:
+                    tool_failure = feedback
+            if tool_failure is not None:
+                self.success = False
+                self.memory.push('user', tool_failure)
+                if first_failure is None:
+                    first_failure = tool_failure
+                continue
+            if executed == 0:
+                continue
+            self.memory.push('user', feedback)
+            if save_path != None and executed == len(blocks):
+                tool.save_block(blocks, save_path)
+        if first_failure is not None:
+            return False, first_failure
         return True, feedback
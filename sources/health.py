@@ -0,0 +1,132 @@
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from sources.logger import Logger
+
+class HealthMonitor:
+    """
+    HealthMonitor probes LLM backends from a background thread and caches whether they are reachable.
+    Lookups never block: they return the cached status and leave the probing to the monitor thread.
+    """
+    def __init__(self, ttl: float = 10.0, probe_timeout: float = 2.0, background: bool = True):
+        """
+        Args:
+            ttl (float): Seconds a probe result stays valid, backends are re-probed at this interval.
+            probe_timeout (float): Timeout in seconds of a single TCP probe.
+            background (bool): Probe the watched backends from a thread, if False they are only probed by refresh().
+        """
+        self.ttl = ttl
+        self.probe_timeout = probe_timeout
+        self.background = background
+        self.logger = Logger("health.log")
+        self.addresses = set()
+        self.status = {}
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def parse_address(address: str) -> tuple:
+        """
+        Get the (host, port) to probe from an address like "127.0.0.1:11434" or "https://api.openai.com".
+        """
+        parsed = urlparse(address if address.startswith(('http://', 'https://')) else f'http://{address}')
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        return parsed.hostname or address, port
+
+    def probe(self, address: str, timeout: float = None) -> tuple:
+        """
+        Check if a backend accepts TCP connections.
+        Args:
+            address (str): Address of the backend.
+            timeout (float, optional): Probe timeout, defaults to probe_timeout.
+        Returns:
+            tuple: (is_online, latency in seconds or None)
+        """
+        if not address:
+            return False, None
+        start = time.time()
+        try:
+            host, port = self.parse_address(address)
+            with socket.create_connection((host, port), timeout=timeout or self.probe_timeout):
+                return True, time.time() - start
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Probe of {address} failed: {str(e)}")
+            return False, None
+
+    def refresh(self, address: str) -> bool:
+        """
+        Probe a backend now and cache the result.
+        """
+        is_online, latency = self.probe(address)
+        with self.lock:
+            self.status[address] = {"online": is_online, "latency": latency, "checked_at": time.time()}
+        return is_online
+
+    def watch(self, address: str) -> None:
+        """
+        Add a backend to the monitored addresses and start the monitor thread if needed.
+        """
+        if not address:
+            return
+        with self.lock:
+            self.addresses.add(address)
+            if not self.background:
+                return
+            if self.thread is None or not self.thread.is_alive():
+                self.stop_event.clear()
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.wake_event.set()
+
+    def run(self) -> None:
+        """
+        Monitor loop, probe every watched backend whose status is older than the ttl.
+        """
+        while not self.stop_event.is_set():
+            self.wake_event.clear()
+            with self.lock:
+                stale = [address for address in self.addresses
+                         if time.time() - self.status.get(address, {}).get("checked_at", 0) >= self.ttl]
+            for address in stale:
+                self.refresh(address)
+            self.wake_event.wait(timeout=self.ttl)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.wake_event.set()
+
+    def is_online(self, address: str) -> bool:
+        """
+        Get the cached status of a backend.
+        Backends not probed yet are assumed online, the monitor probes them in the background.
+        """
+        with self.lock:
+            status = self.status.get(address)
+        if status is None:
+            self.watch(address)
+            return True
+        return status["online"]
+
+    def report(self) -> dict:
+        """
+        Get the cached status of every monitored backend.
+        """
+        with self.lock:
+            return {address: dict(status) for address, status in self.status.items()}
+
+health_monitor = None
+health_monitor_lock = threading.Lock()
+
+def get_health_monitor() -> HealthMonitor:
+    """
+    Get the health monitor shared by the providers, its thread starts when the first backend is looked up.
+    """
+    global health_monitor
+    with health_monitor_lock:
+        if health_monitor is None:
+            health_monitor = HealthMonitor()
+        return health_monitor
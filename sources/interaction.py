@@ -5,10 +5,13 @@ except ImportError:
         import pyreadline3 as readline
     except ImportError:
         readline = None
+import asyncio
+import datetime
+import uuid
 from typing import List, Tuple, Type, Dict
 
 from sources.text_to_speech import Speech
-from sources.utility import pretty_print, animate_thinking
+from sources.utility import pretty_print, animate_thinking, startup_profiler
 from sources.router import AgentRouter
 from sources.speech_to_text import AudioTranscriber, AudioRecorder
 import threading
@@ -22,7 +25,10 @@ class Interaction:
                  tts_enabled: bool = True,
                  stt_enabled: bool = True,
                  recover_last_session: bool = False,
-                 langs: List[str] = ["en", "zh"]
+                 langs: List[str] = ["en", "zh"],
+                 routing_engine: str = "cascade",
+                 router_confidence_threshold: float = 0.7,
+                 routing_cache_size: int = 1024
                 ):
         self.is_active = True
         self.current_agent = None
@@ -30,10 +36,16 @@ class Interaction:
         self.last_answer = None
         self.last_reasoning = None
         self.agents = agents
+        self.session_id = None
+        self.set_session(str(uuid.uuid4()))
         self.tts_enabled = tts_enabled
         self.stt_enabled = stt_enabled
         self.recover_last_session = recover_last_session
-        self.router = AgentRouter(self.agents, supported_language=langs)
+        self.router = AgentRouter(self.agents,
+                                  supported_language=langs,
+                                  routing_engine=routing_engine,
+                                  router_confidence_threshold=router_confidence_threshold,
+                                  cache_size=routing_cache_size) # routing models load in the background
         self.ai_name = self.find_ai_name()
         self.speech = None
         self.transcriber = None
@@ -41,11 +53,14 @@ class Interaction:
         self.is_generating = False
         self.languages = langs
         if tts_enabled:
-            self.initialize_tts()
+            with startup_profiler.phase("TTS"):
+                self.initialize_tts()
         if stt_enabled:
-            self.initialize_stt()
+            with startup_profiler.phase("STT"):
+                self.initialize_stt()
         if recover_last_session:
-            self.load_last_session()
+            with startup_profiler.phase("session recovery"):
+                self.load_last_session()
         self.emit_status()
     
     def get_spoken_language(self) -> str:
@@ -92,12 +107,39 @@ class Interaction:
             blks.extend(agent.get_blocks_result())
         return blks
     
-    def load_last_session(self):
-        """Recover the last session."""
+    def set_session(self, session_id: str) -> None:
+        """Save the memories of all the agents under one session id."""
+        self.session_id = session_id
+        session_time = datetime.datetime.now()
+        for agent in self.agents:
+            agent.memory.join_session(session_id, session_time)
+
+    def get_session_index(self):
+        return self.agents[0].memory.get_session_index()
+
+    def list_sessions(self, limit: int = 20) -> List[Dict]:
+        """List the saved sessions, the most recent first."""
+        if not self.agents:
+            return []
+        return self.get_session_index().list_all(limit)
+
+    def load_last_session(self, session_id: str = None) -> bool:
+        """
+        Recover the last session, or the session with the given id, in the memory of every agent.
+        The recovered session is continued: the next saves update it.
+        Returns:
+            bool: Whether the memory of an agent was recovered.
+        """
+        if session_id is None and self.agents:
+            session_id = self.get_session_index().last_session_id() # None for sessions saved before the index
+        recovered = False
         for agent in self.agents:
             if agent.type == "planner_agent":
                 continue
-            agent.memory.load_memory(agent.type)
+            recovered = agent.memory.load_memory(agent.type, session_id) or recovered
+        if recovered and session_id is not None:
+            self.set_session(session_id)
+        return recovered
     
     def save_session(self):
         """Save the current session."""
@@ -157,7 +199,7 @@ class Interaction:
         push_last_agent_memory = False
         if self.last_query is None or len(self.last_query) == 0:
             return False
-        agent = self.router.select_agent(self.last_query)
+        agent = await asyncio.to_thread(self.router.select_agent, self.last_query) # routing runs the router models, keep the loop free
         if agent is None:
             return False
         if self.current_agent != agent and self.last_answer is not None:
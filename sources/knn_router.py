@@ -0,0 +1,89 @@
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+class KnnRouter:
+    """
+    KnnRouter classifies a query by its k nearest few shots examples, by cosine similarity of sentence embeddings.
+    Every classification head (agent role, complexity...) is scored from the same query embedding.
+    """
+    def __init__(self, embed_fn: Callable[[List[str]], np.ndarray], k: int = 5):
+        """
+        Args:
+            embed_fn (Callable): Embed a list of texts into a (len(texts), dim) array.
+            k (int): Number of nearest examples voting for a label.
+        """
+        self.embed_fn = embed_fn
+        self.k = k
+        self.heads = {}
+
+    @staticmethod
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+    def fit(self, examples: Dict[str, List[Tuple[str, str]]]) -> None:
+        """
+        Embed the examples of every head, a text shared by several heads is embedded once.
+        Args:
+            examples (Dict[str, List[Tuple[str, str]]]): The (text, label) examples of each head, eg: {"tasks": [...], "complexity": [...]}
+        """
+        texts = sorted({text for pairs in examples.values() for text, _ in pairs})
+        embeddings = self.normalize(self.embed_fn(texts))
+        rows = {text: i for i, text in enumerate(texts)}
+        self.heads = {}
+        for name, pairs in examples.items():
+            label_names = sorted({label for _, label in pairs})
+            label_index = {label: i for i, label in enumerate(label_names)}
+            self.heads[name] = (embeddings[[rows[text] for text, _ in pairs]],
+                                np.array([label_index[label] for _, label in pairs]),
+                                label_names)
+
+    def vote(self, queries: np.ndarray, matrix: np.ndarray, label_ids: np.ndarray, label_names: list) -> np.ndarray:
+        """
+        Score the labels of a head for normalized queries, by the similarity of their top k examples.
+        Returns:
+            np.ndarray: (len(queries), len(label_names)) scores, each row sums to 1 unless no example is similar.
+        """
+        similarities = queries @ matrix.T
+        k = min(self.k, matrix.shape[0])
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        weights = np.clip(np.take_along_axis(similarities, top, axis=1), 0, None)
+        scores = np.zeros((len(queries), len(label_names)), dtype=np.float32)
+        np.add.at(scores, (np.arange(len(queries))[:, None], label_ids[top]), weights)
+        return scores / np.maximum(scores.sum(axis=1, keepdims=True), 1e-12)
+
+    def predict_batch(self, texts: List[str]) -> List[Dict[str, List[Tuple[str, float]]]]:
+        """
+        Classify texts with a single embedding pass and one matrix product per head.
+        Returns:
+            List[Dict[str, List[Tuple[str, float]]]]: For each text, the (label, score) of every head, best first.
+        """
+        if not self.heads:
+            raise ValueError("KnnRouter has no examples, call fit or load first.")
+        queries = self.normalize(self.embed_fn(texts))
+        results = [{} for _ in texts]
+        for name, (matrix, label_ids, label_names) in self.heads.items():
+            scores = self.vote(queries, matrix, label_ids, label_names)
+            for result, row in zip(results, scores):
+                order = np.argsort(-row)
+                result[name] = [(label_names[i], float(row[i])) for i in order]
+        return results
+
+    def predict(self, text: str) -> Dict[str, List[Tuple[str, float]]]:
+        return self.predict_batch([text])[0]
+
+    def save(self, path: str) -> None:
+        arrays = {}
+        for name, (matrix, label_ids, label_names) in self.heads.items():
+            arrays[f"{name}.matrix"] = matrix
+            arrays[f"{name}.label_ids"] = label_ids
+            arrays[f"{name}.label_names"] = np.array(label_names)
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    def load(self, path: str) -> None:
+        with np.load(path) as data:
+            names = {key.rsplit('.', 1)[0] for key in data.files}
+            self.heads = {name: (data[f"{name}.matrix"], data[f"{name}.label_ids"], data[f"{name}.label_names"].tolist())
+                          for name in names}
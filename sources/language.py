@@ -1,29 +1,74 @@
 from typing import List, Tuple, Type, Dict
 import re
+import time
+import threading
+from collections import OrderedDict
 import langid
-from transformers import MarianMTModel, MarianTokenizer
 
 from sources.utility import pretty_print, animate_thinking
 from sources.logger import Logger
+from sources.model_profile import optimize_model
+
+TRANSLATOR_MODEL = "Helsinki-NLP/opus-mt-{lang}-en"
 
 class LanguageUtility:
     """LanguageUtility for language, or emotion identification"""
-    def __init__(self, supported_language: List[str] = ["en", "fr", "zh"]):
+    def __init__(self, supported_language: List[str] = ["en", "fr", "zh"],
+                 translator_idle_timeout: float = 900,
+                 translation_cache_size: int = 512):
         """
         Initialize the LanguageUtility class
         args:
-            supported_language: list of languages for translation, determine which Helsinki-NLP model to load
+            supported_language: list of languages for translation, determine which Helsinki-NLP model can be loaded
+            translator_idle_timeout: seconds a translator stays loaded without being used, None to never unload
+            translation_cache_size: number of translations kept in the LRU cache
         """
-        self.translators_tokenizer = None 
-        self.translators_model = None
         self.logger = Logger("language.log")
         self.supported_language = supported_language
-        self.load_model()
-    
-    def load_model(self) -> None:
-        animate_thinking("Loading language utility...", color="status")
-        self.translators_tokenizer = {lang: MarianTokenizer.from_pretrained(f"Helsinki-NLP/opus-mt-{lang}-en") for lang in self.supported_language if lang != "en"}
-        self.translators_model = {lang: MarianMTModel.from_pretrained(f"Helsinki-NLP/opus-mt-{lang}-en") for lang in self.supported_language if lang != "en"}
+        self.translators = {}
+        self.translators_last_used = {}
+        self.translators_lock = threading.Lock()
+        self.translator_idle_timeout = translator_idle_timeout
+        self.translation_cache = OrderedDict()
+        self.translation_cache_size = translation_cache_size
+        self.translation_cache_lock = threading.Lock()
+        langid.set_languages(self.supported_language)
+
+    def load_translator(self, lang: str) -> Tuple["MarianTokenizer", "MarianMTModel"]:
+        """
+        Get the translator of a language, loading it on first use.
+        Args:
+            lang: ISO language code
+        Returns: the tokenizer and model of the language
+        """
+        with self.translators_lock:
+            self.translators_last_used[lang] = time.time()
+            if lang not in self.translators:
+                from transformers import MarianMTModel, MarianTokenizer
+                animate_thinking(f"Loading {lang} translator...", color="status")
+                tokenizer = MarianTokenizer.from_pretrained(TRANSLATOR_MODEL.format(lang=lang))
+                model = optimize_model(MarianMTModel.from_pretrained(TRANSLATOR_MODEL.format(lang=lang)))
+                self.translators[lang] = (tokenizer, model)
+                self.logger.info(f"Loaded {lang} translator.")
+            return self.translators[lang]
+
+    def evict_idle_translators(self) -> List[str]:
+        """
+        Unload the translators not used for longer than the idle timeout.
+        Called on every detection and translation, so a translator of a language no longer used is unloaded
+        even when the following queries are all in English.
+        Returns: the evicted languages
+        """
+        if self.translator_idle_timeout is None:
+            return []
+        now = time.time()
+        with self.translators_lock:
+            idle = [lang for lang in self.translators
+                    if now - self.translators_last_used.get(lang, now) > self.translator_idle_timeout]
+            for lang in idle:
+                del self.translators[lang]
+                self.logger.info(f"Unloaded idle {lang} translator.")
+        return idle
     
     def detect_language(self, text: str) -> str:
         """
@@ -33,7 +78,7 @@ class LanguageUtility:
             text: string to analyze
         Returns: ISO639-1 language code
         """
-        langid.set_languages(self.supported_language)
+        self.evict_idle_translators()
         lang, score = langid.classify(text)
         self.logger.info(f"Identified: {text} as {lang} with conf {score}")
         return lang
@@ -46,16 +91,48 @@ class LanguageUtility:
             origin_lang: ISO language code
         Returns: translated str
         """
-        if origin_lang == "en":
-            return text
-        if origin_lang not in self.translators_tokenizer:
-            pretty_print(f"Language {origin_lang} not supported for translation", color="error")
-            return text
-        tokenizer = self.translators_tokenizer[origin_lang]
-        inputs = tokenizer(text, return_tensors="pt", padding=True)
-        model = self.translators_model[origin_lang]
-        translation = model.generate(**inputs)
-        return tokenizer.decode(translation[0], skip_special_tokens=True)
+        return self.translate_batch([text], [origin_lang])[0]
+
+    def translate_batch(self, texts: List[str], origin_langs: List[str], batch_size: int = 16) -> List[str]:
+        """
+        Translate texts to English, the texts of each language are translated by padded batches.
+        Args:
+            texts: strings to translate
+            origin_langs: ISO language code of each text
+            batch_size: number of texts per generate call
+        Returns: translated strings, in the order of texts
+        """
+        self.evict_idle_translators()
+        translations = list(texts)
+        pending = {}
+        with self.translation_cache_lock:
+            for i, (text, lang) in enumerate(zip(texts, origin_langs)):
+                if lang == "en":
+                    continue
+                key = (lang, text)
+                if key in self.translation_cache:
+                    self.translation_cache.move_to_end(key)
+                    translations[i] = self.translation_cache[key]
+                else:
+                    pending.setdefault(lang, {}).setdefault(text, []).append(i)
+        for lang, positions in pending.items():
+            if lang not in self.supported_language:
+                pretty_print(f"Language {lang} not supported for translation", color="error")
+                continue
+            tokenizer, model = self.load_translator(lang)
+            unique_texts = list(positions)
+            for start in range(0, len(unique_texts), batch_size):
+                chunk = unique_texts[start:start + batch_size]
+                inputs = tokenizer(chunk, return_tensors="pt", padding=True)
+                outputs = tokenizer.batch_decode(model.generate(**inputs), skip_special_tokens=True)
+                with self.translation_cache_lock:
+                    for text, translation in zip(chunk, outputs):
+                        self.translation_cache[(lang, text)] = translation
+                        for i in positions[text]:
+                            translations[i] = translation
+                    while len(self.translation_cache) > self.translation_cache_size:
+                        self.translation_cache.popitem(last=False)
+        return translations
 
     def analyze(self, text):
         """
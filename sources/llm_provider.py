@@ -1,24 +1,46 @@
 import os
-import platform
+import json
+import asyncio
 import socket
-import subprocess
+import threading
 import time
+import weakref
 from urllib.parse import urlparse
 
 import httpx
 import requests
 from dotenv import load_dotenv
 from ollama import Client as OllamaClient
-from openai import OpenAI
+from ollama import AsyncClient as AsyncOllamaClient
+from openai import OpenAI, AsyncOpenAI
 
+from sources.health import HealthMonitor, get_health_monitor
+from sources.load_balancer import LoadBalancer, Node, NodeUnavailable
 from sources.logger import Logger
 from sources.utility import pretty_print, animate_thinking
 
 class Provider:
-    def __init__(self, provider_name, model, server_address="127.0.0.1:5000", is_local=False):
+    def __init__(self, provider_name, model, server_address="127.0.0.1:5000", is_local=False,
+                 pool_size=10, request_timeout=600, health_monitor=None, routing_strategy="least_outstanding",
+                 pool_member=False):
+        """
+        Args:
+            provider_name (str): Name of the LLM backend.
+            model (str): Model to use.
+            server_address (str): Address of the backend for local and server providers.
+                A comma separated list of addresses enables pool mode: requests are load balanced between them.
+            is_local (bool): Whether the backend runs locally.
+            pool_size (int): Maximum number of keep-alive connections per backend.
+            request_timeout (float): Timeout in seconds for connecting to and reading from a backend.
+            health_monitor (HealthMonitor): Monitor probing the backend, defaults to the one shared by the process.
+            routing_strategy (str): Pool mode routing, "least_outstanding" requests or "latency" EWMA.
+            pool_member (bool): Whether the provider is a node of a pool, its transport errors are then
+                raised as NodeUnavailable for the load balancer to fail over.
+        """
         self.provider_name = provider_name.lower()
         self.model = model
         self.is_local = is_local
+        self.pool_member = pool_member
         self.server_ip = server_address
         self.server_address = server_address
         self.available_providers = {
@@ -34,10 +56,38 @@ class Provider:
             "openrouter": self.openrouter_fn,
             "test": self.test_fn
         }
+        self.stream_providers = {
+            "ollama": self.ollama_stream_fn,
+            "server": self.server_stream_fn,
+        }
+        self.async_stream_providers = {
+            "ollama": self.ollama_async_stream_fn,
+            "server": self.server_async_stream_fn,
+            "openai": self.openai_async_stream_fn,
+            "lm-studio": self.openai_async_stream_fn,
+            "google": self.openai_async_stream_fn,
+            "deepseek": self.openai_async_stream_fn,
+            "openrouter": self.openai_async_stream_fn,
+        }
         self.logger = Logger("provider.log")
         self.api_key = None
+        self.pool_size = pool_size
+        self.request_timeout = request_timeout
+        self.clients = {}
+        self.async_clients = weakref.WeakKeyDictionary() # event loop -> {name: async client}
+        self.clients_lock = threading.Lock()
         self.internal_url, self.in_docker = self.get_internal_url()
         self.unsafe_providers = ["openai", "deepseek", "dsk_deepseek", "together", "google", "openrouter"]
+        self.cloud_addresses = {
+            "openai": "https://api.openai.com",
+            "huggingface": "https://router.huggingface.co",
+            "google": "https://generativelanguage.googleapis.com",
+            "deepseek": "https://api.deepseek.com",
+            "dsk_deepseek": "https://chat.deepseek.com",
+            "together": "https://api.together.xyz",
+            "openrouter": "https://openrouter.ai",
+        }
+        self.health = health_monitor if health_monitor is not None else get_health_monitor()
         if self.provider_name not in self.available_providers:
             raise ValueError(f"Unknown provider: {provider_name}")
         if self.provider_name in self.unsafe_providers and self.is_local == False:
@@ -45,6 +95,16 @@ class Provider:
             self.api_key = self.get_api_key(self.provider_name)
         elif self.provider_name != "ollama":
             pretty_print(f"Provider: {provider_name} initialized at {self.server_ip}", color="success")
+        self.balancer = None
+        addresses = [address.strip() for address in server_address.split(',') if address.strip()]
+        if len(addresses) > 1:
+            nodes = [Node(address, Provider(provider_name, model, address, is_local,
+                                            pool_size=pool_size,
+                                            request_timeout=request_timeout,
+                                            health_monitor=self.health,
+                                            pool_member=True)) for address in addresses]
+            self.balancer = LoadBalancer(nodes, strategy=routing_strategy)
+            self.logger.info(f"Pool mode with {len(nodes)} nodes, routing by {routing_strategy}")
 
     def get_model_name(self) -> str:
         return self.model
@@ -65,35 +125,423 @@ class Provider:
             return "http://localhost", False
         return url, True
 
+    def get_ollama_host(self) -> str:
+        if self.is_local and self.in_docker:
+            port = "11434"  # default
+            if ":" in self.server_address:
+                port = self.server_address.split(":")[1]
+            return f"{self.internal_url}:{port}"
+        return f"http://{self.server_address}"
+
+    def get_lm_studio_url(self) -> str:
+        if self.in_docker:
+            # Extract port from server_address if present
+            port = "1234"  # default
+            if ":" in self.server_address:
+                port = self.server_address.split(":")[1]
+            return f"{self.internal_url}:{port}"
+        return f"http://{self.server_ip}"
+
+    def get_backend_address(self) -> str | None:
+        """
+        Get the address of the backend the provider sends requests to, None for the test provider.
+        """
+        if self.provider_name == "test":
+            return None
+        if self.provider_name == "ollama":
+            return self.get_ollama_host()
+        if self.provider_name == "lm-studio":
+            return self.get_lm_studio_url()
+        if self.provider_name == "server" or self.is_local:
+            return self.server_ip
+        return self.cloud_addresses.get(self.provider_name)
+
+    def is_monitored(self) -> bool:
+        """
+        Whether the health monitor probes the backend. Cloud APIs are not probed, only local and self-hosted servers.
+        """
+        return self.is_local or self.provider_name in ["ollama", "server", "lm-studio"]
+
+    def is_backend_online(self) -> bool:
+        """
+        Get the cached health status of the backend, backends not monitored are assumed online.
+        The backend is watched by the health monitor from its first lookup.
+        """
+        address = self.get_backend_address()
+        if address is None or not self.is_monitored():
+            return True
+        return self.health.is_online(address)
+
+    def check_backend_online(self) -> bool:
+        """
+        Warn if the backend is known to be offline. Use the cached health status, this never blocks.
+        """
+        if self.balancer is not None:
+            return any(node.is_healthy() for node in self.balancer.nodes)
+        if self.is_backend_online():
+            return True
+        address = self.get_backend_address()
+        pretty_print(f"Server is offline at {address}", color="failure")
+        self.logger.warning(f"Backend {address} is offline according to the health monitor.")
+        return False
+
+    def health_report(self) -> dict:
+        """
+        Get the cached health status of the backend, or of every node in pool mode.
+        """
+        if self.balancer is not None:
+            return {
+                "provider": self.provider_name,
+                "model": self.model,
+                "strategy": self.balancer.strategy,
+                "nodes": [{**node.provider.health_report(), **node.report()} for node in self.balancer.nodes],
+            }
+        address = self.get_backend_address()
+        status = self.health.report().get(address, {})
+        return {
+            "provider": self.provider_name,
+            "model": self.model,
+            "address": address,
+            "online": status.get("online"),
+            "latency": status.get("latency"),
+            "checked_at": status.get("checked_at"),
+        }
+
+    def get_client(self, name: str, factory):
+        """
+        Return the long-lived client of a backend, creating it on first use.
+        Clients keep their connections alive and are shared by every agent using this provider.
+        Args:
+            name (str): Key of the client, include anything the client depends on like the url.
+            factory (callable): Function creating the client.
+        """
+        with self.clients_lock:
+            if name not in self.clients:
+                self.logger.info(f"Creating client {name}")
+                self.clients[name] = factory()
+            return self.clients[name]
+
+    def get_async_client(self, name: str, factory):
+        """
+        Return the long-lived async client of a backend for the running event loop, creating it on first use.
+        Async clients are bound to the event loop they were created on, so each loop has its own.
+        Args:
+            name (str): Key of the client, include anything the client depends on like the url.
+            factory (callable): Function creating the client.
+        """
+        loop = asyncio.get_running_loop()
+        with self.clients_lock:
+            clients = self.async_clients.setdefault(loop, {})
+            if name not in clients:
+                self.logger.info(f"Creating async client {name}")
+                clients[name] = factory()
+            return clients[name]
+
+    def make_http_client(self) -> httpx.Client:
+        """
+        Create a httpx client with a keep-alive connection pool.
+        """
+        limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        return httpx.Client(limits=limits, timeout=self.request_timeout)
+
+    def make_session(self) -> requests.Session:
+        """
+        Create a requests session with a keep-alive connection pool.
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get_openai_api_key(self) -> str:
+        """
+        Get the key of OpenAI compatible APIs. Local servers like lm-studio don't check it,
+        but the client refuses to start without one, so they are given a placeholder.
+        """
+        return self.api_key or "not-needed"
+
+    def get_openai_client(self, base_url: str = None) -> OpenAI:
+        """
+        Get the shared OpenAI compatible client for a base url.
+        """
+        return self.get_client(f"openai:{base_url}", lambda: OpenAI(api_key=self.get_openai_api_key(),
+                                                                    base_url=base_url,
+                                                                    timeout=self.request_timeout,
+                                                                    http_client=self.make_http_client()))
+
+    def make_async_http_client(self) -> httpx.AsyncClient:
+        """
+        Create an async httpx client with a keep-alive connection pool.
+        """
+        limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        return httpx.AsyncClient(limits=limits, timeout=self.request_timeout)
+
+    def get_async_openai_client(self, base_url: str = None) -> AsyncOpenAI:
+        """
+        Get the async OpenAI compatible client of the running event loop for a base url.
+        """
+        return self.get_async_client(f"async-openai:{base_url}", lambda: AsyncOpenAI(api_key=self.get_openai_api_key(),
+                                                                                     base_url=base_url,
+                                                                                     timeout=self.request_timeout,
+                                                                                     http_client=self.make_async_http_client()))
+
+    def get_openai_base_url(self) -> str | None:
+        """
+        Get the base url of OpenAI compatible providers, None for the official OpenAI API.
+        """
+        if self.provider_name == "openai":
+            if self.is_local and self.in_docker:
+                try:
+                    host, port = self.server_ip.split(':')
+                except Exception as e:
+                    port = "8000"
+                return f"{self.internal_url}:{port}"
+            if self.is_local:
+                return f"http://{self.server_ip}"
+            return None
+        if self.provider_name == "lm-studio":
+            return f"{self.get_lm_studio_url()}/v1"
+        if self.is_local:
+            raise Exception(f"{self.provider_name} is not available for local use. Change config.ini")
+        return {
+            "google": "https://generativelanguage.googleapis.com/v1beta/openai/",
+            "deepseek": "https://api.deepseek.com",
+            "openrouter": "https://openrouter.ai/api/v1",
+        }[self.provider_name]
+
+    @staticmethod
+    async def close_async_clients(clients: list) -> None:
+        for client in clients:
+            close = getattr(client, 'aclose', None) or client.close # httpx has aclose, openai and ollama an async close
+            await close()
+
+    def close(self) -> None:
+        """
+        Close all the clients and their connection pools.
+        Async clients are closed on the event loop they were created on.
+        """
+        with self.clients_lock:
+            clients = list(self.clients.values())
+            async_clients = list(self.async_clients.items())
+            self.clients = {}
+            self.async_clients = weakref.WeakKeyDictionary()
+        for client in clients:
+            if hasattr(client, 'close'):
+                client.close()
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        for loop, loop_clients in async_clients:
+            closing = self.close_async_clients(list(loop_clients.values()))
+            if loop.is_closed():
+                closing.close() # the connections were dropped with their loop
+            elif loop is running_loop:
+                loop.create_task(closing)
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(closing, loop).result(timeout=self.request_timeout)
+            else:
+                loop.run_until_complete(closing)
+
     def respond(self, history, verbose=True):
         """
         Use the choosen provider to generate text.
         """
+        if self.balancer is not None:
+            return self.balanced_respond(history, verbose)
         llm = self.available_providers[self.provider_name]
         self.logger.info(f"Using provider: {self.provider_name} at {self.server_ip}")
+        self.check_backend_online()
         try:
             thought = llm(history, verbose)
         except KeyboardInterrupt:
             self.logger.warning("User interrupted the operation with Ctrl+C")
             return "Operation interrupted by user. REQUEST_EXIT"
-        except ConnectionError as e:
+        except Exception as e:
+            return self.handle_provider_error(e)
+        return thought
+
+    def respond_stream(self, history, verbose=True):
+        """
+        Use the choosen provider to generate text, yielding chunks as soon as they are generated.
+        Providers without a streaming implementation yield their whole answer at once.
+        """
+        if self.balancer is not None:
+            yield from self.balanced_respond_stream(history, verbose)
+            return
+        llm = self.stream_providers.get(self.provider_name)
+        if llm is None:
+            yield self.respond(history, verbose)
+            return
+        self.logger.info(f"Streaming from provider: {self.provider_name} at {self.server_ip}")
+        self.check_backend_online()
+        try:
+            for chunk in llm(history, verbose):
+                yield chunk
+        except KeyboardInterrupt:
+            self.logger.warning("User interrupted the operation with Ctrl+C")
+            yield "Operation interrupted by user. REQUEST_EXIT"
+        except Exception as e:
+            yield self.handle_provider_error(e)
+
+    async def respond_async(self, history, verbose=True):
+        """
+        Asynchronously generate text with the choosen provider, yielding chunks as soon as they are generated.
+        Cancelling the task consuming the chunks closes the upstream stream, which stops the generation.
+        Providers without an async implementation run in a thread and yield their whole answer at once.
+        """
+        if self.balancer is not None:
+            async for chunk in self.balanced_respond_async(history, verbose):
+                yield chunk
+            return
+        llm = self.async_stream_providers.get(self.provider_name)
+        if llm is None:
+            yield await asyncio.to_thread(self.respond, history, verbose)
+            return
+        self.logger.info(f"Async streaming from provider: {self.provider_name} at {self.server_ip}")
+        self.check_backend_online()
+        try:
+            async for chunk in llm(history, verbose):
+                yield chunk
+        except asyncio.CancelledError:
+            self.logger.warning(f"Generation with {self.provider_name} cancelled.")
+            raise
+        except Exception as e:
+            yield self.handle_provider_error(e)
+
+    def balanced_respond(self, history, verbose=True):
+        """
+        Generate text on the best node of the pool, retrying on the next node when a node fails or gives an empty answer.
+        """
+        last_error = None
+        for node in self.balancer.ranked():
+            llm = node.provider.available_providers[node.provider.provider_name]
+            self.balancer.acquire(node)
+            start = time.time()
+            try:
+                thought = llm(history, verbose)
+            except KeyboardInterrupt:
+                self.balancer.release(node)
+                self.logger.warning("User interrupted the operation with Ctrl+C")
+                return "Operation interrupted by user. REQUEST_EXIT"
+            except Exception as e:
+                self.balancer.release(node, failed=True)
+                self.logger.warning(f"Node {node.address} failed: {str(e)}. Trying next node.")
+                last_error = e
+                continue
+            if not thought:
+                self.balancer.release(node, failed=True)
+                self.logger.warning(f"Node {node.address} returned an empty answer. Trying next node.")
+                last_error = NodeUnavailable(f"Node {node.address} returned an empty answer.")
+                continue
+            self.balancer.release(node, latency=time.time() - start)
+            return thought
+        return self.handle_provider_error(last_error)
+
+    def balanced_respond_stream(self, history, verbose=True):
+        """
+        Stream text from the best node of the pool.
+        A failing node, or one ending its answer without any chunk, is retried on the next node as long as no chunk was yielded yet.
+        """
+        last_error = None
+        for node in self.balancer.ranked():
+            llm = node.provider.stream_providers.get(node.provider.provider_name)
+            if llm is None:
+                llm = lambda history, verbose, node=node: iter([node.provider.available_providers[node.provider.provider_name](history, verbose)])
+            self.balancer.acquire(node)
+            start = time.time()
+            latency = None
+            failed = False
+            try:
+                for chunk in llm(history, verbose):
+                    if not chunk:
+                        continue
+                    if latency is None:
+                        latency = time.time() - start
+                    yield chunk
+                if latency is None:
+                    raise NodeUnavailable(f"Node {node.address} returned an empty answer.")
+                return
+            except KeyboardInterrupt:
+                self.logger.warning("User interrupted the operation with Ctrl+C")
+                yield "Operation interrupted by user. REQUEST_EXIT"
+                return
+            except Exception as e:
+                failed = True
+                last_error = e
+                self.logger.warning(f"Node {node.address} failed: {str(e)}.")
+                if latency is not None:
+                    yield self.handle_provider_error(e)
+                    return
+            finally:
+                self.balancer.release(node, latency=latency, failed=failed)
+        yield self.handle_provider_error(last_error)
+
+    async def balanced_respond_async(self, history, verbose=True):
+        """
+        Asynchronously stream text from the best node of the pool.
+        A failing node is retried on the next node as long as no chunk was yielded yet.
+        """
+        last_error = None
+        for node in self.balancer.ranked():
+            llm = node.provider.async_stream_providers.get(node.provider.provider_name)
+            self.balancer.acquire(node)
+            start = time.time()
+            latency = None
+            failed = False
+            try:
+                if llm is None:
+                    thought = await asyncio.to_thread(node.provider.available_providers[node.provider.provider_name], history, verbose)
+                    if not thought:
+                        raise NodeUnavailable(f"Node {node.address} returned an empty answer.")
+                    latency = time.time() - start
+                    yield thought
+                    return
+                async for chunk in llm(history, verbose):
+                    if not chunk:
+                        continue
+                    if latency is None:
+                        latency = time.time() - start
+                    yield chunk
+                if latency is None:
+                    raise NodeUnavailable(f"Node {node.address} returned an empty answer.")
+                return
+            except asyncio.CancelledError:
+                self.logger.warning(f"Generation on node {node.address} cancelled.")
+                raise
+            except Exception as e:
+                failed = True
+                last_error = e
+                self.logger.warning(f"Node {node.address} failed: {str(e)}.")
+                if latency is not None:
+                    yield self.handle_provider_error(e)
+                    return
+            finally:
+                self.balancer.release(node, latency=latency, failed=failed)
+        yield self.handle_provider_error(last_error)
+
+    def handle_provider_error(self, e: Exception) -> str:
+        """
+        Turn a provider failure into an answer for the user or raise it with more context.
+        """
+        if isinstance(e, ConnectionError):
             raise ConnectionError(f"{str(e)}\nConnection to {self.server_ip} failed.")
-        except AttributeError as e:
+        if isinstance(e, AttributeError):
             raise NotImplementedError(f"{str(e)}\nIs {self.provider_name} implemented ?")
-        except ModuleNotFoundError as e:
+        if isinstance(e, ModuleNotFoundError):
             raise ModuleNotFoundError(
                 f"{str(e)}\nA import related to provider {self.provider_name} was not found. Is it installed ?")
-        except Exception as e:
-            if "try again later" in str(e).lower():
-                return f"{self.provider_name} server is overloaded. Please try again later."
-            if "refused" in str(e):
-                return f"Server {self.server_ip} seem offline. Unable to answer."
-            raise Exception(f"Provider {self.provider_name} failed: {str(e)}") from e
-        return thought
+        if "try again later" in str(e).lower():
+            return f"{self.provider_name} server is overloaded. Please try again later."
+        if "refused" in str(e):
+            return f"Server {self.server_ip} seem offline. Unable to answer."
+        raise Exception(f"Provider {self.provider_name} failed: {str(e)}") from e
 
-    def is_ip_online(self, address: str, timeout: int = 10) -> bool:
+    def is_ip_online(self, address: str, timeout: int = 2) -> bool:
         """
-        Check if an address is online by sending a ping request.
+        Check if an address is online by opening a TCP connection to it.
+        This probes directly, the cached status of the backend is given by check_backend_online.
         """
         if not address:
             return False
@@ -103,65 +551,120 @@ class Provider:
         if "127.0.0.1" in address or "localhost" in address:
             return True
         try:
-            ip_address = socket.gethostbyname(hostname)
+            socket.gethostbyname(hostname)
         except socket.gaierror:
             self.logger.error(f"Cannot resolve: {hostname}")
             return False
-        param = '-n' if platform.system().lower() == 'windows' else '-c'
-        command = ['ping', param, '1', ip_address]
-        try:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-            return result.returncode == 0
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError) as e:
-            return False
+        is_online, _ = self.health.probe(address, timeout)
+        return is_online
 
     def server_fn(self, history, verbose=False):
         """
         Use a remote server with LLM to generate text.
         """
-        thought = ""
+        return "".join(self.server_stream_fn(history, verbose))
+
+    def server_stream_fn(self, history, verbose=False):
+        """
+        Stream text from a remote server with LLM, chunk by chunk as server-sent events.
+        """
         route_setup = f"{self.server_ip}/setup"
-        route_gen = f"{self.server_ip}/generate"
+        route_stream = f"{self.server_ip}/generate_stream"
 
-        if not self.is_ip_online(self.server_ip):
-            pretty_print(f"Server is offline at {self.server_ip}", color="failure")
+        session = self.get_client("session", self.make_session)
+        try:
+            session.post(route_setup, json={"model": self.model}, timeout=self.request_timeout)
+            with session.post(route_stream, json={"messages": history, "model": self.model}, stream=True, timeout=self.request_timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    event = self.parse_server_event(line)
+                    if event is None:
+                        continue
+                    if "done" in event:
+                        break
+                    if "error" in event:
+                        if self.pool_member:
+                            raise NodeUnavailable(f"Server {self.server_ip} failed: {event['error']}")
+                        pretty_print(event["error"], color="failure")
+                        break
+                    if "token" not in event:
+                        continue
+                    if verbose:
+                        print(event["token"], end="", flush=True)
+                    yield event["token"]
+        except requests.exceptions.RequestException as e:
+            if self.pool_member:
+                raise NodeUnavailable(f"Request to {self.server_ip} failed: {str(e)}") from e
+            pretty_print(f"HTTP request failed: {str(e)}", color="failure")
+        except ValueError as e:
+            pretty_print(f"Failed to parse JSON response: {str(e)}", color="failure")
+        except KeyError as e:
+            raise Exception(
+                f"{str(e)}\nError occured with server route. Are you using the correct address for the config.ini provider?") from e
 
+    async def server_async_stream_fn(self, history, verbose=False):
+        """
+        Asynchronously stream text from a remote server with LLM.
+        """
+        route_setup = f"{self.server_ip}/setup"
+        route_stream = f"{self.server_ip}/generate_stream"
+        client = self.get_async_client("async-http", self.make_async_http_client)
         try:
-            requests.post(route_setup, json={"model": self.model})
-            requests.post(route_gen, json={"messages": history})
-            is_complete = False
-            while not is_complete:
-                try:
-                    response = requests.get(f"{self.server_ip}/get_updated_sentence")
-                    if "error" in response.json():
-                        pretty_print(response.json()["error"], color="failure")
+            await client.post(route_setup, json={"model": self.model})
+            async with client.stream("POST", route_stream, json={"messages": history, "model": self.model}) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    event = self.parse_server_event(line)
+                    if event is None:
+                        continue
+                    if "done" in event:
                         break
-                    thought = response.json()["sentence"]
-                    is_complete = bool(response.json()["is_complete"])
-                    time.sleep(2)
-                except requests.exceptions.RequestException as e:
-                    pretty_print(f"HTTP request failed: {str(e)}", color="failure")
-                    break
-                except ValueError as e:
-                    pretty_print(f"Failed to parse JSON response: {str(e)}", color="failure")
-                    break
-                except Exception as e:
-                    pretty_print(f"An error occurred: {str(e)}", color="failure")
-                    break
+                    if "error" in event:
+                        if self.pool_member:
+                            raise NodeUnavailable(f"Server {self.server_ip} failed: {event['error']}")
+                        pretty_print(event["error"], color="failure")
+                        break
+                    if "token" not in event:
+                        continue
+                    if verbose:
+                        print(event["token"], end="", flush=True)
+                    yield event["token"]
+        except httpx.HTTPError as e:
+            if self.pool_member:
+                raise NodeUnavailable(f"Request to {self.server_ip} failed: {str(e)}") from e
+            pretty_print(f"HTTP request failed: {str(e)}", color="failure")
+        except ValueError as e:
+            pretty_print(f"Failed to parse JSON response: {str(e)}", color="failure")
         except KeyError as e:
             raise Exception(
                 f"{str(e)}\nError occured with server route. Are you using the correct address for the config.ini provider?") from e
-        except Exception as e:
-            raise e
-        return thought
+
+    def parse_server_event(self, line: str) -> dict | None:
+        """
+        Parse a server-sent event line of the llm_server stream, None for empty or keep-alive lines.
+        """
+        if not line or not line.startswith("data: "):
+            return None
+        data = line[len("data: "):]
+        if data == "[DONE]":
+            return {"done": True}
+        return json.loads(data)
 
     def ollama_fn(self, history, verbose=False):
         """
         Use local or remote Ollama server to generate text.
         """
-        thought = ""
-        host = f"{self.internal_url}:11434" if self.is_local else f"http://{self.server_address}"
-        client = OllamaClient(host=host)
+        return "".join(self.ollama_stream_fn(history, verbose))
+
+    def ollama_stream_fn(self, history, verbose=False):
+        """
+        Stream text from a local or remote Ollama server, chunk by chunk.
+        """
+        host = self.get_ollama_host()
+        limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        client = self.get_client(f"ollama:{host}", lambda: OllamaClient(host=host,
+                                                                        timeout=self.request_timeout,
+                                                                        limits=limits))
 
         try:
             stream = client.chat(
@@ -172,7 +675,7 @@ class Provider:
             for chunk in stream:
                 if verbose:
                     print(chunk["message"]["content"], end="", flush=True)
-                thought += chunk["message"]["content"]
+                yield chunk["message"]["content"]
         except httpx.ConnectError as e:
             raise Exception(
                 f"\nOllama connection failed at {host}. Check if the server is running."
@@ -181,23 +684,85 @@ class Provider:
             if hasattr(e, 'status_code') and e.status_code == 404:
                 animate_thinking(f"Downloading {self.model}...")
                 client.pull(self.model)
-                self.ollama_fn(history, verbose)
+                yield from self.ollama_stream_fn(history, verbose)
+                return
             if "refused" in str(e).lower():
                 raise Exception(
                     f"Ollama connection refused at {host}. Is the server running?"
                 ) from e
             raise e
 
-        return thought
+    async def ollama_async_stream_fn(self, history, verbose=False):
+        """
+        Asynchronously stream text from a local or remote Ollama server.
+        """
+        host = self.get_ollama_host()
+        limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        client = self.get_async_client(f"async-ollama:{host}", lambda: AsyncOllamaClient(host=host,
+                                                                                         timeout=self.request_timeout,
+                                                                                         limits=limits))
+        try:
+            stream = await client.chat(
+                model=self.model,
+                messages=history,
+                stream=True,
+            )
+            async for chunk in stream:
+                if verbose:
+                    print(chunk["message"]["content"], end="", flush=True)
+                yield chunk["message"]["content"]
+        except httpx.ConnectError as e:
+            raise Exception(
+                f"\nOllama connection failed at {host}. Check if the server is running."
+            ) from e
+        except Exception as e:
+            if hasattr(e, 'status_code') and e.status_code == 404:
+                animate_thinking(f"Downloading {self.model}...")
+                await client.pull(self.model)
+                async for chunk in self.ollama_async_stream_fn(history, verbose):
+                    yield chunk
+                return
+            if "refused" in str(e).lower():
+                raise Exception(
+                    f"Ollama connection refused at {host}. Is the server running?"
+                ) from e
+            raise e
+
+    async def openai_async_stream_fn(self, history, verbose=False):
+        """
+        Asynchronously stream text from an OpenAI compatible API (openai, lm-studio, google, deepseek, openrouter).
+        """
+        client = self.get_async_openai_client(self.get_openai_base_url())
+        model = "deepseek-chat" if self.provider_name == "deepseek" else self.model
+        try:
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=history,
+                stream=True,
+            )
+        except Exception as e:
+            raise Exception(f"{self.provider_name} API error: {str(e)}") from e
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if not content:
+                    continue
+                if verbose:
+                    print(content, end="", flush=True)
+                yield content
+        finally:
+            await stream.close()
 
     def huggingface_fn(self, history, verbose=False):
         """
         Use huggingface to generate text.
         """
         from huggingface_hub import InferenceClient
-        client = InferenceClient(
+        client = self.get_client("huggingface", lambda: InferenceClient(
             api_key=self.get_api_key("huggingface")
-        )
+        ))
         completion = client.chat.completions.create(
             model=self.model,
             messages=history,
@@ -210,17 +775,7 @@ class Provider:
         """
         Use openai to generate text.
         """
-        base_url = self.server_ip
-        if self.is_local and self.in_docker:
-            try:
-                host, port = base_url.split(':')
-            except Exception as e:
-                port = "8000"
-            client = OpenAI(api_key=self.api_key, base_url=f"{self.internal_url}:{port}")
-        elif self.is_local:
-            client = OpenAI(api_key=self.api_key, base_url=f"http://{base_url}")
-        else:
-            client = OpenAI(api_key=self.api_key)
+        client = self.get_openai_client(self.get_openai_base_url())
 
         try:
             response = client.chat.completions.create(
@@ -242,7 +797,9 @@ class Provider:
         """
         from anthropic import Anthropic
 
-        client = Anthropic(api_key=self.api_key)
+        client = self.get_client("anthropic", lambda: Anthropic(api_key=self.api_key,
+                                                                timeout=self.request_timeout,
+                                                                http_client=self.make_http_client()))
         system_message = None
         messages = []
         for message in history:
@@ -276,7 +833,7 @@ class Provider:
         if self.is_local:
             raise Exception("Google Gemini is not available for local use. Change config.ini")
 
-        client = OpenAI(api_key=self.api_key, base_url="https://generativelanguage.googleapis.com/v1beta/openai/")
+        client = self.get_openai_client("https://generativelanguage.googleapis.com/v1beta/openai/")
         try:
             response = client.chat.completions.create(
                 model=self.model,
@@ -296,7 +853,7 @@ class Provider:
         Use together AI for completion
         """
         from together import Together
-        client = Together(api_key=self.api_key)
+        client = self.get_client("together", lambda: Together(api_key=self.api_key, timeout=self.request_timeout))
         if self.is_local:
             raise Exception("Together AI is not available for local use. Change config.ini")
 
@@ -318,7 +875,7 @@ class Provider:
         """
         Use deepseek api to generate text.
         """
-        client = OpenAI(api_key=self.api_key, base_url="https://api.deepseek.com")
+        client = self.get_openai_client("https://api.deepseek.com")
         if self.is_local:
             raise Exception("Deepseek (API) is not available for local use. Change config.ini")
         try:
@@ -338,14 +895,7 @@ class Provider:
         """
         Use local lm-studio server to generate text.
         """
-        if self.in_docker:
-            # Extract port from server_address if present
-            port = "1234"  # default
-            if ":" in self.server_address:
-                port = self.server_address.split(":")[1]
-            url = f"{self.internal_url}:{port}"
-        else:
-            url = f"http://{self.server_ip}"
+        url = self.get_lm_studio_url()
         route_start = f"{url}/v1/chat/completions"
         payload = {
             "messages": history,
@@ -355,7 +905,8 @@ class Provider:
         }
 
         try:
-            response = requests.post(route_start, json=payload, timeout=30)
+            session = self.get_client("session", self.make_session)
+            response = session.post(route_start, json=payload, timeout=self.request_timeout)
             if response.status_code != 200:
                 raise Exception(f"LM Studio returned status {response.status_code}: {response.text}")
             if not response.text.strip():
@@ -393,7 +944,7 @@ class Provider:
         """
         Use OpenRouter API to generate text.
         """
-        client = OpenAI(api_key=self.api_key, base_url="https://openrouter.ai/api/v1")
+        client = self.get_openai_client("https://openrouter.ai/api/v1")
         if self.is_local:
             # This case should ideally not be reached if unsafe_providers is set correctly
             # and is_local is False in config for openrouter
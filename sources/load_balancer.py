@@ -0,0 +1,123 @@
+import threading
+import time
+from typing import List
+
+from sources.logger import Logger
+
+class NodeUnavailable(Exception):
+    """
+    A node of the pool could not answer: unreachable, failing or returning an empty answer.
+    """
+    pass
+
+class Node:
+    """
+    A backend of the pool and its routing statistics.
+    """
+    def __init__(self, address: str, provider):
+        self.address = address
+        self.provider = provider
+        self.outstanding = 0
+        self.latency_ewma = None
+        self.failures = 0
+        self.unhealthy_until = 0.0
+
+    def is_healthy(self) -> bool:
+        """
+        Whether the node is out of its failure backoff and reachable according to the health monitor.
+        """
+        if time.time() < self.unhealthy_until:
+            return False
+        return self.provider.is_backend_online()
+
+    def report(self) -> dict:
+        return {
+            "address": self.address,
+            "healthy": self.is_healthy(),
+            "outstanding": self.outstanding,
+            "latency_ewma": self.latency_ewma,
+            "failures": self.failures,
+        }
+
+class LoadBalancer:
+    """
+    LoadBalancer routes requests between several backends serving the same model.
+    Nodes are ranked by outstanding requests or by latency, failing nodes are put aside with an exponential backoff.
+    """
+    strategies = ["least_outstanding", "latency"]
+
+    def __init__(self, nodes: List[Node],
+                 strategy: str = "least_outstanding",
+                 ewma_alpha: float = 0.3,
+                 base_backoff: float = 2.0,
+                 max_backoff: float = 60.0):
+        """
+        Args:
+            nodes (List[Node]): The backends of the pool.
+            strategy (str): "least_outstanding" or "latency" (EWMA of the time to first answer chunk).
+            ewma_alpha (float): Weight of the last measure in the latency EWMA.
+            base_backoff (float): Seconds a node is put aside after its first failure, doubled on each new failure.
+            max_backoff (float): Maximum seconds a node is put aside.
+        """
+        if strategy not in self.strategies:
+            raise ValueError(f"Unknown routing strategy: {strategy}. Choose from {self.strategies}")
+        if len(nodes) == 0:
+            raise ValueError("Load balancer needs at least one node.")
+        self.nodes = nodes
+        self.strategy = strategy
+        self.ewma_alpha = ewma_alpha
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.logger = Logger("load_balancer.log")
+
+    def score(self, node: Node) -> tuple:
+        latency = node.latency_ewma if node.latency_ewma is not None else 0.0
+        if self.strategy == "latency":
+            return (latency, node.outstanding)
+        return (node.outstanding, latency)
+
+    def ranked(self) -> List[Node]:
+        """
+        Get the nodes in the order they should be tried.
+        Healthy nodes come first, best score first, then unhealthy ones as a last resort, soonest to recover first.
+        """
+        with self.lock:
+            healthy = [node for node in self.nodes if node.is_healthy()]
+            unhealthy = [node for node in self.nodes if node not in healthy]
+            healthy.sort(key=self.score)
+            unhealthy.sort(key=lambda node: node.unhealthy_until)
+            return healthy + unhealthy
+
+    def acquire(self, node: Node) -> None:
+        with self.lock:
+            node.outstanding += 1
+
+    def release(self, node: Node, latency: float = None, failed: bool = False) -> None:
+        """
+        Release a request of a node and record its outcome.
+        Args:
+            node (Node): The node that served the request.
+            latency (float, optional): Seconds until the first answer chunk, None if unknown.
+            failed (bool): Whether the request failed, the node is then put aside.
+        """
+        with self.lock:
+            node.outstanding = max(0, node.outstanding - 1)
+            if failed:
+                node.failures += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (node.failures - 1))
+                node.unhealthy_until = time.time() + backoff
+                self.logger.warning(f"Node {node.address} failed {node.failures} times, backing off {backoff:.1f}s.")
+                return
+            if latency is None:
+                return
+            node.failures = 0
+            node.unhealthy_until = 0.0
+            if node.latency_ewma is None:
+                node.latency_ewma = latency
+            else:
+                node.latency_ewma = self.ewma_alpha * latency + (1 - self.ewma_alpha) * node.latency_ewma
+
+    def report(self) -> List[dict]:
+        with self.lock:
+            return [node.report() for node in self.nodes]
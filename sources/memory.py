@@ -4,17 +4,23 @@ import uuid
 import os
 import sys
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Type, Dict
-import torch
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import configparser
 
 from sources.utility import timer_decorator, pretty_print, animate_thinking
 from sources.logger import Logger
+from sources.token_counter import get_token_counter
+from sources.session_index import SessionIndex
+from sources.model_profile import optimize_model, get_summary_settings
 
 config = configparser.ConfigParser()
 config.read('config.ini')
 
+SUMMARY_MODEL = "pszemraj/led-base-book-summary"
+
 class Memory():
     """
     Memory is a class for managing the conversation memory
@@ -23,25 +29,64 @@ class Memory():
     def __init__(self, system_prompt: str,
                  recover_last_session: bool = False,
                  memory_compression: bool = True,
-                 model_provider: str = "deepseek-r1:14b"):
+                 model_provider: str = "deepseek-r1:14b",
+                 summary_beams: int = None,
+                 summary_batch_size: int = None,
+                 journal_fsync: str = "periodic",
+                 journal_compact_after: int = 256):
+        """
+        Args:
+            system_prompt (str): The system prompt of the agent.
+            recover_last_session (bool): Whether to load the last saved session.
+            memory_compression (bool): Whether to summarize long messages with the summarization model.
+            model_provider (str): Name of the LLM the memory is sent to, used for token counting.
+            summary_beams (int, optional): Beams of the summarization model, 1 for greedy decoding (recommended on CPU).
+                Defaults to [MAIN] summary_beams, or to the model profile setting.
+            summary_batch_size (int, optional): Maximum number of texts summarized by a single generate call.
+                Defaults to [MAIN] summary_batch_size, or 8.
+            journal_fsync (str): When the session journal is synced to disk: "always", "periodic" or "never".
+            journal_compact_after (int): Number of journal records after which the journal is compacted.
+        """
         self.memory = [{'role': 'system', 'content': system_prompt}]
-        
+        self.model_provider = model_provider
+        self.token_counter = get_token_counter(model_provider)
+        self.token_counts = []
+        self.total_tokens = 0
+        self.recount_tokens()
+
         self.logger = Logger("memory.log")
         self.session_time = datetime.datetime.now()
         self.session_id = str(uuid.uuid4())
         self.conversation_folder = f"conversations/"
         self.session_recovered = False
-        if recover_last_session:
-            self.load_memory()
-            self.session_recovered = True
-        # memory compression system
+        # session journal, an append-only JSONL file of the memory changes
+        if journal_fsync not in ["always", "periodic", "never"]:
+            raise ValueError(f"Unknown journal fsync policy: {journal_fsync}")
+        self.journal_fsync = journal_fsync
+        self.journal_fsync_interval = 5.0
+        self.journal_compact_after = journal_compact_after
+        self.journal_path = None
+        self.journal_length = 0
+        self.journal_records = 0
+        self.journal_stale = True
+        self.journal_offset = 0
+        self.last_fsync = 0.0
+        self.session_index = None
+        # memory compression system, summaries are computed by a background worker and cached by content hash
         self.model = None
         self.tokenizer = None
-        self.device = self.get_cuda_device()
+        self.device = None
         self.memory_compression = memory_compression
-        self.model_provider = model_provider
-        if self.memory_compression:
-            self.download_model()
+        summary_settings = get_summary_settings()
+        self.summary_beams = max(1, summary_beams or summary_settings["summary_beams"])
+        self.summary_batch_size = max(1, summary_batch_size or summary_settings["summary_batch_size"])
+        self.summaries = {}
+        self.pending_summaries = {}
+        self.compression_lock = threading.Lock()
+        self.compression_executor = ThreadPoolExecutor(max_workers=1) if memory_compression else None
+        if recover_last_session:
+            self.load_memory()
+            self.session_recovered = True
 
     def get_ideal_ctx(self, model_name: str) -> int | None:
         """
@@ -68,35 +113,123 @@ class Memory():
     
     def download_model(self):
         """Download the model if not already downloaded."""
+        if self.model is not None and self.tokenizer is not None:
+            return
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
         animate_thinking("Loading memory compression model...", color="status")
-        self.tokenizer = AutoTokenizer.from_pretrained("pszemraj/led-base-book-summary")
-        self.model = AutoModelForSeq2SeqLM.from_pretrained("pszemraj/led-base-book-summary")
+        self.device = self.get_cuda_device()
+        self.tokenizer = AutoTokenizer.from_pretrained(SUMMARY_MODEL)
+        self.model = optimize_model(AutoModelForSeq2SeqLM.from_pretrained(SUMMARY_MODEL))
         self.logger.info("Memory compression system initialized.")
     
     def get_filename(self) -> str:
-        """Get the filename for the save file."""
-        return f"memory_{self.session_time.strftime('%Y-%m-%d_%H-%M-%S')}.txt"
+        """Get the filename for the session journal."""
+        return f"memory_{self.session_time.strftime('%Y-%m-%d_%H-%M-%S')}.jsonl"
     
     def save_memory(self, agent_type: str = "casual_agent") -> None:
-        """Save the session memory to a file."""
-        if not os.path.exists(self.conversation_folder):
-            self.logger.info(f"Created folder {self.conversation_folder}.")
-            os.makedirs(self.conversation_folder)
+        """
+        Save the session memory to its journal.
+        Only the messages pushed since the last save are appended. The whole memory is written again only
+        when it was rewritten (clear, reset, compression), and the journal is compacted once it holds too many records.
+        """
         save_path = os.path.join(self.conversation_folder, agent_type)
         if not os.path.exists(save_path):
+            self.logger.info(f"Created folder {save_path}.")
             os.makedirs(save_path)
-        filename = self.get_filename()
-        path = os.path.join(save_path, filename)
-        json_memory = json.dumps(self.memory)
-        with open(path, 'w') as f:
-            self.logger.info(f"Saved memory json at {path}")
-            f.write(json_memory)
+        path = os.path.join(save_path, self.get_filename())
+        if path != self.journal_path:
+            self.journal_path = path
+            self.journal_records = 0
+            self.journal_stale = True
+        if self.journal_stale:
+            records = [{'op': 'replace', 'memory': self.memory}]
+        else:
+            records = [{'op': 'append', 'message': message} for message in self.memory[self.journal_length:]]
+        if self.journal_records + len(records) > self.journal_compact_after:
+            self.compact_journal()
+        elif records:
+            self.append_journal(records)
+        self.journal_length = len(self.memory)
+        self.journal_stale = False
+        self.get_session_index().record(self.session_id, agent_type, path, self.session_time.timestamp(),
+                                        len(self.memory), self.journal_offset)
+
+    def get_session_index(self) -> SessionIndex:
+        """Get the index of the saved sessions of the conversation folder."""
+        if self.session_index is None:
+            self.session_index = SessionIndex(self.conversation_folder)
+        return self.session_index
+
+    def join_session(self, session_id: str, session_time: datetime.datetime) -> None:
+        """Save the memory under a session shared with the memories of the other agents."""
+        self.session_id = session_id
+        self.session_time = session_time
+
+    def list_sessions(self, agent_type: str = "casual_agent", limit: int = 20) -> list:
+        """List the saved sessions of an agent, the most recent first."""
+        return self.get_session_index().list_sessions(agent_type, limit)
+
+    def sync_journal(self, f, force: bool = False) -> None:
+        """Flush the journal to disk according to the fsync policy."""
+        if self.journal_fsync == "never":
+            return
+        if self.journal_fsync == "periodic" and not force and time.time() - self.last_fsync < self.journal_fsync_interval:
+            return
+        f.flush()
+        os.fsync(f.fileno())
+        self.last_fsync = time.time()
+
+    def append_journal(self, records: list) -> None:
+        """Append records to the session journal."""
+        with open(self.journal_path, 'ab') as f:
+            f.write(''.join(json.dumps(record) + '\n' for record in records).encode('utf-8'))
+            self.sync_journal(f)
+            self.journal_offset = f.tell()
+        self.journal_records += len(records)
+
+    def compact_journal(self) -> None:
+        """Rewrite the session journal as a single record of the current memory."""
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write((json.dumps({'op': 'replace', 'memory': self.memory}) + '\n').encode('utf-8'))
+            self.sync_journal(f, force=True)
+            self.journal_offset = f.tell()
+        os.replace(tmp_path, self.journal_path)
+        self.journal_records = 1
+        self.logger.info(f"Compacted session journal {self.journal_path}")
+
+    def replay_journal(self, path: str, end: int = None) -> list:
+        """
+        Rebuild the memory from a session journal.
+        Corrupted records, like a last line cut by a crash, are skipped.
+        Args:
+            path (str): Path of the journal.
+            end (int, optional): Byte offset to replay up to, defaults to the whole journal.
+        """
+        memory = []
+        try:
+            with open(path, 'rb') as f:
+                data = f.read() if end is None else f.read(end)
+                for line in data.splitlines():
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        self.logger.warning(f"Skipping corrupted record in journal {path}")
+                        continue
+                    if record.get('op') == 'replace':
+                        memory = list(record['memory'])
+                    elif record.get('op') == 'append':
+                        memory.append(record['message'])
+        except Exception as e:
+            self.logger.warning(f"Error replaying journal {path}: {e}")
+            return []
+        return memory
     
     def find_last_session_path(self, path) -> str:
         """Find the last session path."""
         saved_sessions = []
         for filename in os.listdir(path):
-            if filename.startswith('memory_'):
+            if filename.startswith('memory_') and filename.endswith(('.jsonl', '.txt')):
                 date = filename.split('_')[1]
                 saved_sessions.append((filename, date))
         saved_sessions.sort(key=lambda x: x[1], reverse=True)
@@ -131,37 +264,110 @@ class Memory():
             return {}
         return json_memory
 
-    def load_memory(self, agent_type: str = "casual_agent") -> None:
-        """Load the memory from the last session."""
+    def load_memory(self, agent_type: str = "casual_agent", session_id: str = None) -> bool:
+        """
+        Load the memory from the last session, or from a given session.
+        Args:
+            agent_type (str): Type of the agent the memory belongs to.
+            session_id (str, optional): Id of the session to recover, defaults to the last session.
+        Returns:
+            bool: Whether a memory was recovered.
+        """
         if self.session_recovered == True:
-            return
+            return False
         pretty_print(f"Loading {agent_type} past memories... ", color="status")
         save_path = os.path.join(self.conversation_folder, agent_type)
         if not os.path.exists(save_path):
             pretty_print("No memory to load.", color="success")
-            return
-        filename = self.find_last_session_path(save_path)
-        if filename is None:
-            pretty_print("Last session memory not found.", color="warning")
-            return
-        path = os.path.join(save_path, filename)
-        self.memory = self.load_json_file(path) 
+            return False
+        index = self.get_session_index()
+        session = index.get(session_id, agent_type) if session_id else index.last(agent_type)
+        if session is not None:
+            memory = self.replay_journal(session['path'], session['byte_offset'])
+        elif session_id is not None:
+            pretty_print(f"Session {session_id} not found.", color="warning")
+            return False
+        else: # sessions saved before the index existed
+            filename = self.find_last_session_path(save_path)
+            if filename is None:
+                pretty_print("Last session memory not found.", color="warning")
+                return False
+            path = os.path.join(save_path, filename)
+            memory = self.load_json_file(path) if filename.endswith('.txt') else self.replay_journal(path)
+        if not memory:
+            pretty_print("Last session memory is empty or corrupted.", color="warning")
+            return False
+        self.memory = memory
         if self.memory[-1]['role'] == 'user':
             self.memory.pop()
-        self.compress()
+        self.journal_stale = True
+        self.recount_tokens()
+        self.compress(wait=False)
         pretty_print("Session recovered successfully", color="success")
+        return True
     
     def reset(self, memory: list = []) -> None:
         self.logger.info("Memory reset performed.")
         self.memory = memory
-    
+        self.journal_stale = True
+        self.recount_tokens()
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text with the tokenizer of the model."""
+        return self.token_counter.count(text)
+
+    def recount_tokens(self) -> None:
+        """Recount the tokens of every message, after the memory was replaced or its messages rewritten."""
+        self.token_counts = [self.count_tokens(message['content']) for message in self.memory]
+        self.total_tokens = sum(self.token_counts)
+
+    def get_token_budget(self, reserve: int = 0) -> int | None:
+        """
+        Get the number of tokens left in the model context for new messages.
+        Args:
+            reserve (int): Tokens kept free, e.g. for the answer of the model.
+        Returns:
+            int | None: remaining tokens (negative if the history overflows), None if the context size is unknown.
+        """
+        ideal_ctx = self.get_ideal_ctx(self.model_provider)
+        if ideal_ctx is None:
+            return None
+        return ideal_ctx - self.total_tokens - reserve
+
+    def fits_in_context(self, text: str) -> bool:
+        """Check if a text can be added to the memory without overflowing the model context."""
+        budget = self.get_token_budget()
+        return budget is None or self.count_tokens(text) <= budget
+
+    def get_within_budget(self, max_tokens: int = None) -> list:
+        """
+        Get the messages to send to the model: the system prompt and the most recent messages that fit the context.
+        The summaries finished by the background worker are swapped in first, whether the context size is known or not.
+        The last message is always included.
+        Args:
+            max_tokens (int, optional): Token budget, defaults to the model context size.
+        Returns:
+            list: The messages fitting the budget, in order.
+        """
+        if self.memory_compression:
+            self.apply_summaries()
+        if max_tokens is None:
+            max_tokens = self.get_ideal_ctx(self.model_provider)
+        if max_tokens is None or self.total_tokens <= max_tokens or len(self.memory) <= 2:
+            return self.memory
+        used = self.token_counts[0] + self.token_counts[-1]
+        start = len(self.memory) - 1
+        while start > 1 and used + self.token_counts[start-1] <= max_tokens:
+            start -= 1
+            used += self.token_counts[start]
+        self.logger.info(f"Sending {len(self.memory) - start} of {len(self.memory) - 1} messages ({used} tokens) to fit {max_tokens} tokens.")
+        return self.memory[:1] + self.memory[start:]
+
     def push(self, role: str, content: str) -> int:
         """Push a message to the memory."""
-        ideal_ctx = self.get_ideal_ctx(self.model_provider)
-        if ideal_ctx is not None:
-            if self.memory_compression and len(content) > ideal_ctx * 1.5:
-                self.logger.info(f"Compressing memory: Content {len(content)} > {ideal_ctx} model context.")
-                self.compress()
+        tokens = self.count_tokens(content)
+        if self.memory_compression and role != 'system':
+            self.schedule_summaries([content])
         curr_idx = len(self.memory)
         if self.memory[curr_idx-1]['content'] == content:
             pretty_print("Warning: same message have been pushed twice to memory", color="error")
@@ -170,12 +376,17 @@ class Memory():
             self.memory.append({'role': role, 'content': content})
         else:
             self.memory.append({'role': role, 'content': content, 'time': time_str, 'model_used': self.model_provider})
+        self.token_counts.append(tokens)
+        self.total_tokens += tokens
         return curr_idx-1
     
     def clear(self) -> None:
         """Clear all memory except system prompt"""
         self.logger.info("Memory clear performed.")
         self.memory = self.memory[:1]
+        self.journal_stale = True
+        self.token_counts = self.token_counts[:1]
+        self.total_tokens = sum(self.token_counts)
     
     def clear_section(self, start: int, end: int) -> None:
         """
@@ -188,11 +399,15 @@ class Memory():
         start = max(0, start) + 1
         end = min(end, len(self.memory)-1) + 2
         self.memory = self.memory[:start] + self.memory[end:]
+        self.journal_stale = True
+        self.total_tokens -= sum(self.token_counts[start:end])
+        self.token_counts = self.token_counts[:start] + self.token_counts[end:]
     
     def get(self) -> list:
         return self.memory
 
     def get_cuda_device(self) -> str:
+        import torch
         if torch.backends.mps.is_available():
             return "mps"
         elif torch.cuda.is_available():
@@ -209,48 +424,164 @@ class Memory():
         Returns:
             str: The summarized text
         """
+        return self.summarize_batch([text], min_length)[0]
+
+    def summarize_batch(self, texts: List[str], min_length: int = 64) -> List[str]:
+        """
+        Summarize several texts using the AI model.
+        Texts are sorted by length and cut into buckets of summary_batch_size, each bucket is summarized by a single generate call.
+        Args:
+            texts (List[str]): The texts to summarize
+            min_length (int, optional): The minimum length of the summaries. Defaults to 64.
+        Returns:
+            List[str]: The summarized texts, in the order of texts
+        """
+        summaries = list(texts)
         if self.tokenizer is None or self.model is None:
             self.logger.warning("No tokenizer or model to perform summarization.")
-            return text
-        if len(text) < min_length*1.5:
-            return text
-        max_length = len(text) // 2 if len(text) > min_length*2 else min_length*2
-        input_text = "summarize: " + text
-        inputs = self.tokenizer(input_text, return_tensors="pt", max_length=512, truncation=True)
-        summary_ids = self.model.generate(
-            inputs['input_ids'],
-            max_length=max_length,
-            min_length=min_length,
-            length_penalty=1.0,
-            num_beams=4,
-            early_stopping=True
-        )
-        summary = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-        summary.replace('summary:', '')
-        self.logger.info(f"Memory summarized from len {len(text)} to {len(summary)}.")
-        self.logger.info(f"Summarized text:\n{summary}")
-        return summary
+            return summaries
+        todo = sorted([i for i, text in enumerate(texts) if len(text) >= min_length*1.5], key=lambda i: len(texts[i]))
+        for start in range(0, len(todo), self.summary_batch_size):
+            bucket = todo[start:start + self.summary_batch_size]
+            bucket_summaries = self.generate_summaries([texts[i] for i in bucket], min_length)
+            for i, summary in zip(bucket, bucket_summaries):
+                self.logger.info(f"Memory summarized from len {len(texts[i])} to {len(summary)}.")
+                summaries[i] = summary
+        return summaries
+
+    def generate_summaries(self, texts: List[str], min_length: int) -> List[str]:
+        """
+        Summarize a bucket of texts of similar length with a single generate call.
+        Greedy decoding is used if summary_beams is 1, much faster on CPU.
+        """
+        import torch
+        longest = max(len(text) for text in texts)
+        max_length = longest // 2 if longest > min_length*2 else min_length*2
+        inputs = self.tokenizer(["summarize: " + text for text in texts], return_tensors="pt",
+                                max_length=512, truncation=True, padding=True)
+        with torch.no_grad():
+            summary_ids = self.model.generate(
+                inputs['input_ids'],
+                attention_mask=inputs['attention_mask'],
+                max_length=max_length,
+                min_length=min_length,
+                length_penalty=1.0,
+                num_beams=self.summary_beams,
+                early_stopping=self.summary_beams > 1
+            )
+        summaries = self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+        return [summary.replace('summary:', '').strip() for summary in summaries]
     
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def summarize_cached(self, keys: List[str], texts: List[str]) -> List[str]:
+        """
+        Summarize texts on the compression worker and cache the summaries under their content hash.
+        """
+        try:
+            self.download_model()
+            summaries = self.summarize_batch(texts)
+        except Exception as e:
+            self.logger.warning(f"Background summarization failed: {str(e)}")
+            summaries = list(texts)
+        with self.compression_lock:
+            for key, summary in zip(keys, summaries):
+                self.summaries[key] = summary
+                self.summaries[self.content_hash(summary)] = summary # a summary is never summarized again
+                self.pending_summaries.pop(key, None)
+        return summaries
+
+    def schedule_summaries(self, contents: List[str]) -> list:
+        """
+        Queue the summarization of the oversized messages on the background worker, as a single batch.
+        A text already summarized or queued is never summarized twice.
+        Returns:
+            list: The pending summarizations the messages wait for.
+        """
+        if self.compression_executor is None:
+            return []
+        futures = set()
+        keys, texts = [], []
+        with self.compression_lock:
+            for content in contents:
+                if len(content) <= 1024:
+                    continue
+                key = self.content_hash(content)
+                if key in self.summaries or key in keys:
+                    continue
+                if key in self.pending_summaries:
+                    futures.add(self.pending_summaries[key])
+                    continue
+                keys.append(key)
+                texts.append(content)
+            if keys:
+                future = self.compression_executor.submit(self.summarize_cached, keys, texts)
+                for key in keys:
+                    self.pending_summaries[key] = future
+                futures.add(future)
+        return list(futures)
+
+    def apply_summaries(self) -> int:
+        """
+        Swap the summaries ready so far in place of their messages, all at once.
+        Messages whose summary is still being computed are left untouched.
+        Returns:
+            int: The number of messages replaced.
+        """
+        with self.compression_lock:
+            if not self.summaries:
+                return 0
+            memory = list(self.memory)
+            token_counts = list(self.token_counts)
+            replaced = 0
+            for i, message in enumerate(memory):
+                if message['role'] == 'system' or len(message['content']) <= 1024:
+                    continue
+                summary = self.summaries.get(self.content_hash(message['content']))
+                if summary is None or summary == message['content']:
+                    continue
+                memory[i] = {**message, 'content': summary}
+                token_counts[i] = self.count_tokens(summary)
+                replaced += 1
+            if replaced:
+                self.memory, self.token_counts = memory, token_counts
+                self.journal_stale = True
+                self.total_tokens = sum(token_counts)
+                self.logger.info(f"Swapped {replaced} summarized messages in memory, now {self.total_tokens} tokens.")
+            return replaced
+
     #@timer_decorator
-    def compress(self) -> str:
+    def compress(self, wait: bool = True) -> None:
         """
-        Compress (summarize) the memory using the model.
+        Compress (summarize) the oversized messages of the memory using the model.
+        Args:
+            wait (bool): Wait for the summaries and swap them in, else leave them to the background worker.
         """
-        if self.tokenizer is None or self.model is None:
-            self.logger.warning("No tokenizer or model to perform memory compression.")
+        if self.compression_executor is None:
+            self.logger.warning("Memory compression is disabled.")
             return
-        for i in range(len(self.memory)):
-            if self.memory[i]['role'] == 'system':
-                continue
-            if len(self.memory[i]['content']) > 1024:
-                self.memory[i]['content'] = self.summarize(self.memory[i]['content'])
-    
-    def trim_text_to_max_ctx(self, text: str) -> str:
+        futures = self.schedule_summaries([message['content'] for message in self.memory if message['role'] != 'system'])
+        if not wait:
+            return
+        for future in futures:
+            future.result()
+        self.apply_summaries()
+
+    def trim_text_to_max_ctx(self, text: str, reserve: int = 1024) -> str:
         """
-        Truncate a text to fit within the maximum context size of the model.
+        Truncate a text to the tokens left in the model context after the history.
+        Args:
+            text (str): The text to truncate.
+            reserve (int): Tokens kept free for the prompt around the text and the answer of the model.
         """
-        ideal_ctx = self.get_ideal_ctx(self.model_provider)
-        return text[:ideal_ctx] if ideal_ctx is not None else text
+        budget = self.get_token_budget(reserve)
+        if budget is None:
+            return text
+        if budget <= 0:
+            self.logger.warning(f"No context left for the text, history uses {self.total_tokens} tokens.")
+        return self.token_counter.truncate(text, max(0, budget))
     
     #@timer_decorator
     def compress_text_to_max_ctx(self, text) -> str:
@@ -264,8 +595,8 @@ class Memory():
         if ideal_ctx is None:
             self.logger.warning("No ideal context size found.")
             return text
-        while len(text) > ideal_ctx:
-            self.logger.info(f"Compressing text: {len(text)} > {ideal_ctx} model context.")
+        while self.count_tokens(text) > ideal_ctx:
+            self.logger.info(f"Compressing text: {self.count_tokens(text)} tokens > {ideal_ctx} model context.")
             text = self.summarize(text)
         return text
 
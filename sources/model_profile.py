@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import difflib
+import threading
+import configparser
+from typing import Callable, List
+
+from sources.utility import pretty_print
+from sources.logger import Logger
+
+PROFILES = ["default", "cpu-optimized"]
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+logger = Logger("model_profile.log")
+threads_lock = threading.Lock()
+threads_configured = False
+
+def get_model_profile() -> str:
+    """
+    Get the model profile selected in config.ini ([MAIN] model_profile), "default" if unset.
+    """
+    profile = config.get('MAIN', 'model_profile', fallback='default').strip()
+    if profile not in PROFILES:
+        logger.warning(f"Unknown model profile {profile}, using default. Choose from {PROFILES}")
+        return "default"
+    return profile
+
+def get_summary_settings() -> dict:
+    """
+    Get the decoding settings of the memory summarizer, [MAIN] summary_beams and summary_batch_size in config.ini.
+    The cpu-optimized profile defaults to greedy decoding, much faster on CPU, the default profile to 4 beams.
+    """
+    default_beams = 1 if get_model_profile() == "cpu-optimized" else 4
+    return {
+        "summary_beams": config.getint('MAIN', 'summary_beams', fallback=default_beams),
+        "summary_batch_size": config.getint('MAIN', 'summary_batch_size', fallback=8),
+    }
+
+def configure_threads(num_threads: int = None, concurrent_jobs: int = 1) -> None:
+    """
+    Set the number of CPU threads used by torch, once per process: only the first call takes effect.
+    Args:
+        num_threads (int, optional): Intra-op threads, defaults to [MAIN] cpu_threads or the number of CPUs.
+        concurrent_jobs (int): Number of models run at the same time, the threads are shared between them.
+    """
+    global threads_configured
+    import torch
+    with threads_lock:
+        if threads_configured:
+            return
+        threads_configured = True
+        num_threads = num_threads or config.getint('MAIN', 'cpu_threads', fallback=0) or os.cpu_count() or 1
+        num_threads = max(1, num_threads // concurrent_jobs)
+        torch.set_num_threads(num_threads)
+        try:
+            torch.set_num_interop_threads(max(1, min(4, num_threads // 2)))
+        except RuntimeError:
+            pass # inter-op threads can only be set before the first parallel work
+        logger.info(f"Torch configured with {num_threads} threads.")
+
+def optimize_model(model, profile: str = None):
+    """
+    Apply the model profile to a loaded PyTorch model.
+    With the cpu-optimized profile, the Linear layers of a model on CPU are replaced by int8 dynamically quantized ones.
+    Args:
+        model: The PyTorch model.
+        profile (str, optional): The model profile, defaults to the one of config.ini.
+    Returns:
+        The model to use, quantized or unchanged.
+    """
+    profile = profile or get_model_profile()
+    if profile != "cpu-optimized":
+        return model
+    import torch
+    parameter = next(model.parameters(), None)
+    if parameter is not None and parameter.device.type != "cpu":
+        return model
+    configure_threads()
+    model.eval()
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    logger.info(f"Quantized {type(model).__name__} to int8.")
+    return quantized
+
+def compare_outputs(name: str, run_baseline: Callable, run_optimized: Callable, inputs: List[str]) -> dict:
+    """
+    Run the fp32 baseline and the optimized model on the same inputs, compare their outputs and latency.
+    Args:
+        name (str): Name of the model.
+        run_baseline (Callable): Run the baseline model on an input, return a string.
+        run_optimized (Callable): Run the optimized model on an input, return a string.
+        inputs (List[str]): The inputs to compare on.
+    Returns:
+        dict: exact match rate, mean text similarity and the latency of both models.
+    """
+    report = {"model": name, "exact_match": 0.0, "similarity": 0.0, "baseline_latency": 0.0, "optimized_latency": 0.0}
+    for text in inputs:
+        start = time.perf_counter()
+        baseline = run_baseline(text)
+        report["baseline_latency"] += time.perf_counter() - start
+        start = time.perf_counter()
+        optimized = run_optimized(text)
+        report["optimized_latency"] += time.perf_counter() - start
+        report["exact_match"] += baseline == optimized
+        report["similarity"] += difflib.SequenceMatcher(None, baseline, optimized).ratio()
+    for key in ["exact_match", "similarity", "baseline_latency", "optimized_latency"]:
+        report[key] /= len(inputs)
+    color = "success" if report["similarity"] >= 0.9 else "warning"
+    pretty_print(f"{name}: exact match {report['exact_match']:.0%}, similarity {report['similarity']:.0%}, "
+                 f"latency {report['baseline_latency']*1000:.0f}ms -> {report['optimized_latency']*1000:.0f}ms", color=color)
+    return report
+
+def verify_profile(languages: List[str] = None) -> List[dict]:
+    """
+    Verify the cpu-optimized profile against the fp32 baseline for the router, translator and summarizer models.
+    """
+    from transformers import pipeline, MarianMTModel, MarianTokenizer, AutoTokenizer, AutoModelForSeq2SeqLM
+    from sources.router import BART_MODEL
+    from sources.language import TRANSLATOR_MODEL
+    from sources.memory import SUMMARY_MODEL
+    configure_threads()
+    reports = []
+
+    queries = ["search the web for the best laptops of 2025", "write a python script to rename my files",
+               "hey, how is your day going?", "find the file report.pdf in my documents"]
+    labels = ["talk", "web", "code", "files"]
+    baseline = pipeline("zero-shot-classification", model=BART_MODEL, device="cpu")
+    optimized = pipeline("zero-shot-classification", model=BART_MODEL, device="cpu")
+    optimized.model = optimize_model(optimized.model, "cpu-optimized")
+    reports.append(compare_outputs("bart", lambda text: baseline(text, labels)['labels'][0],
+                                   lambda text: optimized(text, labels)['labels'][0], queries))
+
+    samples = {"fr": ["Cherche la météo à Paris", "Écris un script python pour trier une liste"],
+               "zh": ["帮我在网上搜索最新的新闻", "写一个python脚本"],
+               "es": ["Busca en internet las noticias de hoy", "Escribe un programa en python"]}
+    for lang in languages or config["MAIN"]["languages"].split(' '):
+        if lang == "en" or lang not in samples:
+            continue
+        tokenizer = MarianTokenizer.from_pretrained(TRANSLATOR_MODEL.format(lang=lang))
+        model = MarianMTModel.from_pretrained(TRANSLATOR_MODEL.format(lang=lang))
+        quantized = optimize_model(MarianMTModel.from_pretrained(TRANSLATOR_MODEL.format(lang=lang)), "cpu-optimized")
+        translate = lambda m: lambda text: tokenizer.decode(m.generate(**tokenizer(text, return_tensors="pt"))[0], skip_special_tokens=True)
+        reports.append(compare_outputs(f"translator {lang}", translate(model), translate(quantized), samples[lang]))
+
+    tokenizer = AutoTokenizer.from_pretrained(SUMMARY_MODEL)
+    model = AutoModelForSeq2SeqLM.from_pretrained(SUMMARY_MODEL)
+    quantized = optimize_model(AutoModelForSeq2SeqLM.from_pretrained(SUMMARY_MODEL), "cpu-optimized")
+    summarize = lambda m: lambda text: tokenizer.decode(m.generate(**tokenizer("summarize: " + text, return_tensors="pt"),
+                                                                   max_length=96, num_beams=1)[0], skip_special_tokens=True)
+    long_text = " ".join(["The compiler cannot find the helper_functions.h header because it is not in the include paths."
+                          " Use quotes for local headers and pass the directory with the -I flag."] * 4)
+    reports.append(compare_outputs("summarizer", summarize(model), summarize(quantized), [long_text]))
+    return reports
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    verify_profile()
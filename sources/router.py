@@ -1,11 +1,15 @@
 import os
 import sys
-import torch
+import copy
+import json
+import pickle
+import time
 import random
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Type, Dict
 
-from transformers import pipeline
-from adaptive_classifier import AdaptiveClassifier
+import numpy as np
 
 from sources.agents.agent import Agent
 from sources.agents.code_agent import CoderAgent
@@ -13,36 +17,167 @@ from sources.agents.casual_agent import CasualAgent
 from sources.agents.planner_agent import FileAgent
 from sources.agents.browser_agent import BrowserAgent
 from sources.language import LanguageUtility
-from sources.utility import pretty_print, animate_thinking, timer_decorator
+from sources.routing_cache import RoutingCache
+from sources.knn_router import KnnRouter
+from sources.utility import pretty_print, animate_thinking, timer_decorator, startup_profiler
 from sources.logger import Logger
+from sources.model_profile import optimize_model, configure_threads, get_model_profile
+
+BART_MODEL = "facebook/bart-large-mnli"
+
+class BackbonePickler(pickle.Pickler):
+    """
+    Pickle a classifier without its transformer backbone, the backbone objects are saved as references.
+    """
+    def __init__(self, file, backbone: dict):
+        super().__init__(file)
+        self.backbone_names = {id(obj): name for name, obj in backbone.items()}
+
+    def persistent_id(self, obj):
+        return self.backbone_names.get(id(obj))
+
+class BackboneUnpickler(pickle.Unpickler):
+    """
+    Unpickle a classifier saved by BackbonePickler, plugging in the already loaded backbone.
+    """
+    def __init__(self, file, backbone: dict):
+        super().__init__(file)
+        self.backbone = backbone
+
+    def persistent_load(self, pid):
+        return self.backbone[pid]
 
 class AgentRouter:
     """
     AgentRouter is a class that selects the appropriate agent based on the user query.
     """
-    def __init__(self, agents: list, supported_language: List[str] = ["en", "fr", "zh"]):
+    state_dir = ".cache/router"
+    routing_engines = ["cascade", "knn"]
+
+    def __init__(self, agents: list, supported_language: List[str] = ["en", "fr", "zh"],
+                 router_confidence_threshold: float = 0.7,
+                 vote_confidence_threshold: float = None,
+                 cache_size: int = 1024,
+                 cache_ttl: float = 3600,
+                 routing_engine: str = "cascade",
+                 knn_k: int = 5,
+                 concurrent_signals: bool = True):
+        """
+        The models are loaded concurrently in the background, they are waited for on first use.
+        Args:
+            agents (list): The agents to route between.
+            supported_language (List[str]): Languages of the queries, their translation models are loaded on first use.
+            router_confidence_threshold (float): Confidence of the llm_router above which its choice is final, BART is only run below.
+            vote_confidence_threshold (float, optional): Confidence of BART above which it decides alone, defaults to always voting.
+            cache_size (int): Number of routing decisions cached, 0 to disable the cache.
+            cache_ttl (float): Seconds a cached routing decision stays valid.
+            routing_engine (str): "cascade" (llm_router classifiers then BART) or "knn" (nearest few shots examples by embedding).
+            knn_k (int): Number of nearest examples voting in the knn engine.
+            concurrent_signals (bool): Estimate the complexity concurrently with the task vote in the cascade engine,
+                                       with the cpu-optimized profile torch threads are then split between the two.
+        """
+        if routing_engine not in self.routing_engines:
+            raise ValueError(f"Unknown routing engine: {routing_engine}. Choose from {self.routing_engines}")
         self.agents = agents
+        self.routing_engine = routing_engine
+        self.knn_k = knn_k
         self.logger = Logger("router.log")
-        self.lang_analysis = LanguageUtility(supported_language=supported_language)
-        self.pipelines = self.load_pipelines()
-        self.talk_classifier = self.load_llm_router()
-        self.complexity_classifier = self.load_llm_router()
-        self.learn_few_shots_tasks()
-        self.learn_few_shots_complexity()
         self.asked_clarify = False
+        self.router_confidence_threshold = router_confidence_threshold
+        self.vote_confidence_threshold = vote_confidence_threshold
+        self.tier_counts = {"short": 0, "llm_router": 0, "bart": 0, "vote": 0, "knn": 0}
+        self.last_decision = None
+        self.last_timings = None
+        self.concurrent_signals = concurrent_signals and routing_engine == "cascade"
+        self.signal_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router_signal") if self.concurrent_signals else None
+        self.cache = RoutingCache(cache_size, cache_ttl) if cache_size > 0 else None
+        if self.concurrent_signals and get_model_profile() == "cpu-optimized":
+            configure_threads(concurrent_jobs=2) # before any model loads, the threads are only configured once
+        loader = ThreadPoolExecutor(max_workers=3, thread_name_prefix="router_loader")
+        self.components = {
+            "language": loader.submit(self.load_component, "language", LanguageUtility, supported_language),
+            "llm_router": loader.submit(self.load_component, "llm_router", self.load_classifiers),
+        }
+        if routing_engine == "knn":
+            self.components["knn"] = loader.submit(self.load_component, "knn", self.load_knn_router)
+        else:
+            self.components["bart"] = loader.submit(self.load_component, "bart", self.load_pipelines)
+        loader.shutdown(wait=False)
+
+    def load_component(self, name: str, load_fn, *args):
+        """Load a routing model on the loader pool, timed for the startup profile."""
+        with startup_profiler.phase(f"router {name}"):
+            try:
+                return load_fn(*args)
+            except Exception as e:
+                self.logger.error(f"Failed to load router component {name}: {str(e)}")
+                raise
+
+    def get_component(self, name: str):
+        """Get a routing model, waiting for it to be loaded. Raise the loading error if it failed."""
+        return self.components[name].result()
+
+    @property
+    def lang_analysis(self) -> LanguageUtility:
+        return self.get_component("language")
+
+    @property
+    def pipelines(self) -> Dict[str, "Pipeline"]:
+        return self.get_component("bart")
+
+    @property
+    def knn_router(self) -> KnnRouter:
+        return self.get_component("knn")
+
+    @property
+    def talk_classifier(self) -> "AdaptiveClassifier":
+        return self.get_component("llm_router")[0]
+
+    @property
+    def complexity_classifier(self) -> "AdaptiveClassifier":
+        return self.get_component("llm_router")[1]
+
+    def readiness(self) -> dict:
+        """
+        Get the loading state of each routing model: "loading", "ready" or "error: <reason>".
+        """
+        states = {}
+        for name, future in self.components.items():
+            if not future.done():
+                states[name] = "loading"
+            elif future.exception() is not None:
+                states[name] = f"error: {str(future.exception())}"
+            else:
+                states[name] = "ready"
+        return states
+
+    def is_ready(self) -> bool:
+        return all(state == "ready" for state in self.readiness().values())
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Wait for every routing model to be loaded, return whether they all loaded successfully."""
+        for future in self.components.values():
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        return self.is_ready()
     
-    def load_pipelines(self) -> Dict[str, Type[pipeline]]:
+    def load_pipelines(self) -> Dict[str, "Pipeline"]:
         """
         Load the pipelines for the text classification used for routing.
         returns:
-            Dict[str, Type[pipeline]]: The loaded pipelines
+            Dict[str, Pipeline]: The loaded pipelines
         """
+        from transformers import pipeline
         animate_thinking("Loading zero-shot pipeline...", color="status")
+        bart = pipeline("zero-shot-classification", model=BART_MODEL)
+        bart.model = optimize_model(bart.model)
         return {
-            "bart": pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+            "bart": bart
         }
 
-    def load_llm_router(self) -> AdaptiveClassifier:
+    def load_llm_router(self) -> "AdaptiveClassifier":
         """
         Load the LLM router model.
         returns:
@@ -50,7 +185,8 @@ class AgentRouter:
         exceptions:
             Exception: If the safetensors fails to load
         """
-        path = "../llm_router" if __name__ == "__main__" else "./llm_router"
+        from adaptive_classifier import AdaptiveClassifier
+        path = self.get_llm_router_path()
         try:
             animate_thinking("Loading LLM router model...", color="status")
             talk_classifier = AdaptiveClassifier.from_pretrained(path)
@@ -58,7 +194,137 @@ class AgentRouter:
             raise Exception("Failed to load the routing model. Please run the dl_safetensors.sh script inside llm_router/ directory to download the model.")
         return talk_classifier
 
+    def get_llm_router_path(self) -> str:
+        return "./llm_router"
+
+    def load_classifiers(self) -> tuple:
+        """
+        Load the talk and complexity classifiers and learn their few shots examples.
+        Both classifiers share the same transformer backbone, only their prototypes and heads are separate.
+        The trained classifiers are saved, and loaded instead of learning the examples again while the examples and weights are unchanged.
+        returns:
+            tuple: (talk classifier, complexity classifier)
+        """
+        talk_classifier = self.load_llm_router()
+        backbone = {"model": talk_classifier.model, "tokenizer": talk_classifier.tokenizer}
+        state_key = self.router_state_key(talk_classifier)
+        classifiers = self.load_router_state(state_key, backbone)
+        if classifiers is not None:
+            return classifiers
+        shared = {id(obj): obj for obj in backbone.values()}
+        complexity_classifier = copy.deepcopy(talk_classifier, shared)
+        self.learn_few_shots_tasks(talk_classifier)
+        self.learn_few_shots_complexity(complexity_classifier)
+        self.save_router_state(state_key, backbone, (talk_classifier, complexity_classifier))
+        return talk_classifier, complexity_classifier
+
+    def embed_texts(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Embed texts with the llm_router transformer backbone, mean pooled over the tokens.
+        Args:
+            texts (List[str]): The texts to embed
+            batch_size (int): Number of texts per forward pass
+        Returns:
+            np.ndarray: (len(texts), hidden size) embeddings
+        """
+        import torch
+        model, tokenizer = self.talk_classifier.model, self.talk_classifier.tokenizer
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            inputs = tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                               max_length=512, return_tensors="pt").to(model.device)
+            with torch.no_grad():
+                hidden = model(**inputs).last_hidden_state
+            mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            embeddings.append(((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)).cpu().numpy())
+        return np.concatenate(embeddings)
+
+    def load_knn_router(self) -> KnnRouter:
+        """
+        Build the knn router from the few shots examples, the example embeddings are saved and reused while unchanged.
+        returns:
+            KnnRouter: The knn router, with a "tasks" and a "complexity" head.
+        """
+        knn_router = KnnRouter(self.embed_texts, k=self.knn_k)
+        path = os.path.join(self.state_dir, f"router_knn_{self.router_state_key(self.talk_classifier)[:32]}.npz")
+        if os.path.exists(path):
+            try:
+                knn_router.load(path)
+                self.logger.info(f"Loaded knn router examples from {path}")
+                return knn_router
+            except Exception as e:
+                self.logger.warning(f"Failed to load knn router examples {path}: {str(e)}")
+        knn_router.fit({"tasks": self.few_shots_tasks(), "complexity": self.few_shots_complexity()})
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            for filename in os.listdir(self.state_dir):
+                if filename.startswith("router_knn_"):
+                    os.remove(os.path.join(self.state_dir, filename))
+            knn_router.save(path)
+        except Exception as e:
+            self.logger.warning(f"Failed to save knn router examples {path}: {str(e)}")
+        return knn_router
+
+    def router_state_key(self, classifier: "AdaptiveClassifier") -> str:
+        """
+        Hash the few shots examples, the llm_router files and the backbone name into the key of the trained state.
+        """
+        digest = hashlib.sha256()
+        examples = [sorted(self.few_shots_tasks()), sorted(self.few_shots_complexity())]
+        digest.update(json.dumps(examples, ensure_ascii=False).encode('utf-8'))
+        path = self.get_llm_router_path()
+        for filename in sorted(os.listdir(path)):
+            file_path = os.path.join(path, filename)
+            if not os.path.isfile(file_path):
+                continue
+            digest.update(filename.encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        backbone_name = getattr(getattr(classifier.model, 'config', None), '_name_or_path', '')
+        digest.update(str(backbone_name).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_router_state_path(self, state_key: str) -> str:
+        return os.path.join(self.state_dir, f"router_state_{state_key[:32]}.pkl")
+
+    def load_router_state(self, state_key: str, backbone: dict) -> tuple | None:
+        """
+        Load the trained classifiers saved under a state key, None if there is none or it can't be read.
+        """
+        path = self.get_router_state_path(state_key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                classifiers = BackboneUnpickler(f, backbone).load()
+            self.logger.info(f"Loaded trained router state from {path}")
+            return classifiers
+        except Exception as e:
+            self.logger.warning(f"Failed to load router state {path}, learning the examples again: {str(e)}")
+            return None
+
+    def save_router_state(self, state_key: str, backbone: dict, classifiers: tuple) -> None:
+        """
+        Save the trained classifiers without their backbone under a state key.
+        """
+        path = self.get_router_state_path(state_key)
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                BackbonePickler(f, backbone).dump(classifiers)
+            os.replace(tmp_path, path)
+            self.logger.info(f"Saved trained router state at {path}")
+            for filename in os.listdir(self.state_dir):
+                stale_path = os.path.join(self.state_dir, filename)
+                if filename.startswith("router_state_") and stale_path != path:
+                    os.remove(stale_path)
+        except Exception as e:
+            self.logger.warning(f"Failed to save router state {path}: {str(e)}")
+
     def get_device(self) -> str:
+        import torch
         if torch.backends.mps.is_available():
             return "mps"
         elif torch.cuda.is_available():
@@ -66,12 +332,22 @@ class AgentRouter:
         else:
             return "cpu"
     
-    def learn_few_shots_complexity(self) -> None:
+    def learn_few_shots_complexity(self, classifier: "AdaptiveClassifier") -> None:
         """
         Few shot learning for complexity estimation.
         Use the build in add_examples method of the Adaptive_classifier.
         """
-        few_shots = [
+        few_shots = self.few_shots_complexity()
+        random.shuffle(few_shots)
+        texts = [text for text, _ in few_shots]
+        labels = [label for _, label in few_shots]
+        classifier.add_examples(texts, labels)
+
+    def few_shots_complexity(self) -> List[Tuple[str, str]]:
+        """
+        Examples of the complexity estimation, (text, LOW or HIGH).
+        """
+        return [
             ("hi", "LOW"),
             ("How it's going ?", "LOW"),
             ("What’s the weather like today?", "LOW"),
@@ -195,17 +471,23 @@ class AgentRouter:
             ("Create a Node.js app to query a public API for event listings and display them", "HIGH"),
             ("Find a file named ‘budget.xlsx’, analyze its data, and generate a chart", "HIGH"),
         ]
+
+    def learn_few_shots_tasks(self, classifier: "AdaptiveClassifier") -> None:
+        """
+        Few shot learning for tasks classification.
+        Use the build in add_examples method of the Adaptive_classifier.
+        """
+        few_shots = self.few_shots_tasks()
         random.shuffle(few_shots)
         texts = [text for text, _ in few_shots]
         labels = [label for _, label in few_shots]
-        self.complexity_classifier.add_examples(texts, labels)
+        classifier.add_examples(texts, labels)
 
-    def learn_few_shots_tasks(self) -> None:
+    def few_shots_tasks(self) -> List[Tuple[str, str]]:
         """
-        Few shot learning for tasks classification.
-        Use the build in add_examples method of the Adaptive_classifier.
+        Examples of the tasks classification, (text, agent role).
         """
-        few_shots = [
+        return [
             ("Write a python script to check if the device on my network is connected to the internet", "coding"),
             ("Hey could you search the web for the latest news on the tesla stock market ?", "web"),
             ("I would like you to search for weather api", "web"),
@@ -351,10 +633,6 @@ class AgentRouter:
             ("hi", "talk"),
             ("hello", "talk"),
         ]
-        random.shuffle(few_shots)
-        texts = [text for text, _ in few_shots]
-        labels = [label for _, label in few_shots]
-        self.talk_classifier.add_examples(texts, labels)
 
     def llm_router(self, text: str) -> tuple:
         """
@@ -362,33 +640,121 @@ class AgentRouter:
         Args:
             text: The input text
         """
-        predictions = self.talk_classifier.predict(text)
+        return self.top_task(self.talk_classifier.predict(text))
+
+    def top_task(self, predictions: list) -> tuple:
+        """Get the most confident task label of the LLM router predictions."""
         predictions = [pred for pred in predictions if pred[0] not in ["HIGH", "LOW"]]
         predictions = sorted(predictions, key=lambda x: x[1], reverse=True)
         return predictions[0]
     
     def router_vote(self, text: str, labels: list, log_confidence:bool = False) -> str:
         """
-        Vote between the LLM router and BART model.
+        Routing cascade between the LLM router and BART model.
+        The small LLM router decides alone when confident enough in one of the labels, BART zero-shot is only run for uncertain texts,
+        then the most confident of the two wins. The tier that decided is recorded in last_decision.
         Args:
             text: The input text
             labels: The labels to classify
         Returns:
             str: The selected label
         """
+        return self.record_decision(text, *self.cascade_vote(text, labels, log_confidence))
+
+    def cascade_vote(self, text: str, labels: list, log_confidence: bool = False) -> tuple:
+        """
+        Run the routing cascade of router_vote without recording the decision.
+        Returns:
+            tuple: (tier, label, confidence)
+        """
         if len(text) <= 8:
-            return "talk"
+            return "short", "talk", 1.0
+        llm_router, confidence_llm_router = self.llm_router(text)
+        if llm_router in labels and confidence_llm_router >= self.router_confidence_threshold:
+            return "llm_router", llm_router, confidence_llm_router
         result_bart = self.pipelines['bart'](text, labels)
-        result_llm_router = self.llm_router(text)
+        return self.weigh_votes(text, (llm_router, confidence_llm_router), result_bart, log_confidence)
+
+    def router_vote_batch(self, texts: List[str], labels: list, batch_size: int = 32) -> List[str]:
+        """
+        Routing cascade of router_vote for a batch of texts.
+        The LLM router classifies all texts in one batched pass, BART then classifies the uncertain ones in padded batches.
+        """
+        roles = [None] * len(texts)
+        candidates = []
+        for i, text in enumerate(texts):
+            if len(text) <= 8:
+                roles[i] = self.record_decision(text, "short", "talk", 1.0)
+            else:
+                candidates.append(i)
+        if not candidates:
+            return roles
+        predictions = self.talk_classifier.predict_batch([texts[i] for i in candidates], batch_size=batch_size)
+        uncertain = []
+        for i, prediction in zip(candidates, predictions):
+            llm_router, confidence_llm_router = self.top_task(prediction)
+            if llm_router in labels and confidence_llm_router >= self.router_confidence_threshold:
+                roles[i] = self.record_decision(texts[i], "llm_router", llm_router, confidence_llm_router)
+            else:
+                uncertain.append((i, (llm_router, confidence_llm_router)))
+        if not uncertain:
+            return roles
+        results_bart = self.pipelines['bart']([texts[i] for i, _ in uncertain], labels, batch_size=batch_size)
+        for (i, prediction), result_bart in zip(uncertain, results_bart):
+            roles[i] = self.vote(texts[i], prediction, result_bart)
+        return roles
+
+    def vote(self, text: str, llm_router_prediction: tuple, result_bart: dict, log_confidence: bool = False) -> str:
+        """
+        Vote between the LLM router prediction and the BART zero-shot result, return the label.
+        """
+        return self.record_decision(text, *self.weigh_votes(text, llm_router_prediction, result_bart, log_confidence))
+
+    def weigh_votes(self, text: str, llm_router_prediction: tuple, result_bart: dict, log_confidence: bool = False) -> tuple:
+        """
+        Weigh the LLM router prediction against the BART zero-shot result.
+        Returns:
+            tuple: (tier, label, confidence)
+        """
+        llm_router, confidence_llm_router = llm_router_prediction
         bart, confidence_bart = result_bart['labels'][0], result_bart['scores'][0]
-        llm_router, confidence_llm_router = result_llm_router[0], result_llm_router[1]
+        if self.vote_confidence_threshold is not None and confidence_bart >= self.vote_confidence_threshold:
+            return "bart", bart, confidence_bart
         final_score_bart = confidence_bart / (confidence_bart + confidence_llm_router)
         final_score_llm = confidence_llm_router / (confidence_bart + confidence_llm_router)
         self.logger.info(f"Routing Vote for text {text}: BART: {bart} ({final_score_bart}) LLM-router: {llm_router} ({final_score_llm})")
         if log_confidence:
             pretty_print(f"Agent choice -> BART: {bart} ({final_score_bart}) LLM-router: {llm_router} ({final_score_llm})")
-        return bart if final_score_bart > final_score_llm else llm_router
+        if final_score_bart > final_score_llm:
+            return "vote", bart, final_score_bart
+        return "vote", llm_router, final_score_llm
+
+    def record_decision(self, text: str, tier: str, label: str, confidence: float) -> str:
+        """
+        Record which tier of the routing cascade decided, return the label.
+        """
+        self.tier_counts[tier] += 1
+        self.last_decision = {"tier": tier, "label": label, "confidence": confidence}
+        self.logger.info(f"Routing decided by {tier}: {label} ({confidence:.2f}) for text {text}")
+        return label
+
+    def routing_stats(self) -> dict:
+        """
+        Get the number of routing decisions taken by each tier of the cascade, and the decision cache metrics.
+        """
+        total = sum(self.tier_counts.values())
+        return {"decisions": dict(self.tier_counts),
+                "fast_path_rate": (self.tier_counts["short"] + self.tier_counts["llm_router"]) / total if total else 0.0,
+                "cache": self.cache.stats() if self.cache is not None else None}
     
+    def timed_call(self, timings: dict, stage: str, fn, *args, **kwargs):
+        """Call fn and record its duration in seconds as the stage of the routing timings."""
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timings[stage] = time.perf_counter() - start
+
     def find_first_sentence(self, text: str) -> str:
         first_sentence = None
         for line in text.split("\n"):
@@ -411,6 +777,23 @@ class AgentRouter:
         except Exception as e:
             pretty_print(f"Error in estimate_complexity: {str(e)}", color="failure")
             return "LOW"
+        return self.complexity_from_predictions(predictions)
+
+    def estimate_complexity_batch(self, texts: List[str], batch_size: int = 32) -> List[str]:
+        """
+        Estimate the complexity of texts in one batched pass of the complexity classifier.
+        """
+        try:
+            predictions = self.complexity_classifier.predict_batch(texts, batch_size=batch_size)
+        except Exception as e:
+            pretty_print(f"Error in estimate_complexity_batch: {str(e)}", color="failure")
+            return ["LOW"] * len(texts)
+        return [self.complexity_from_predictions(prediction) for prediction in predictions]
+
+    def complexity_from_predictions(self, predictions: list) -> str:
+        """
+        Get the complexity from the complexity classifier predictions, an uncertain complexity is considered HIGH.
+        """
         predictions = sorted(predictions, key=lambda x: x[1], reverse=True)
         if len(predictions) == 0:
             return "LOW"
@@ -449,81 +832,141 @@ class AgentRouter:
         assert len(self.agents) > 0, "No agents available."
         if len(self.agents) == 1:
             return self.agents[0]
-        lang = self.lang_analysis.detect_language(text)
+        timings = {}
+        start = time.perf_counter()
+        lang = self.timed_call(timings, "detect_language", self.lang_analysis.detect_language, text)
         text = self.find_first_sentence(text)
-        text = self.lang_analysis.translate(text, lang)
         labels = [agent.role for agent in self.agents]
-        complexity = self.estimate_complexity(text)
-        if complexity == "HIGH":
+        cache_key = self.cache.make_key(text, lang, labels) if self.cache is not None else None
+        decision = self.cache.get(cache_key) if cache_key is not None else None
+        cache_hit = decision is not None
+        if cache_hit:
+            self.logger.info(f"Routing cache hit for text {text}: {decision}")
+        else:
+            decision = self.route(text, lang, labels, timings)
+        timings["total"] = time.perf_counter() - start
+        self.last_timings = {"cache_hit": cache_hit, **{stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}}
+        self.logger.info(f"Routing timings (ms): {json.dumps(self.last_timings)}")
+        if decision["complexity"] == "HIGH":
             pretty_print(f"Complex task detected, routing to planner agent.", color="info")
+        agent = self.agent_for_decision(decision)
+        if agent is None:
+            pretty_print(f"Error choosing agent.", color="failure")
+            self.logger.error("No agent selected.")
+            return None
+        if cache_key is not None and not cache_hit:
+            self.cache.put(cache_key, decision)
+        if decision["complexity"] != "HIGH":
+            pretty_print(f"Selected agent: {agent.agent_name} (roles: {agent.role})", color="warning")
+        return agent
+
+    def agent_for_decision(self, decision: dict) -> Agent:
+        """
+        Get the agent of a routing decision, the planner agent for complex tasks.
+        """
+        if decision["complexity"] == "HIGH":
             return self.find_planner_agent()
-        try:
-            best_agent = self.router_vote(text, labels, log_confidence=False)
-        except Exception as e:
-            raise e
-        for agent in self.agents:
-            if best_agent == agent.role:
-                role_name = agent.role
-                pretty_print(f"Selected agent: {agent.agent_name} (roles: {role_name})", color="warning")
-                return agent
-        pretty_print(f"Error choosing agent.", color="failure")
-        self.logger.error("No agent selected.")
-        return None
+        return next((agent for agent in self.agents if agent.role == decision["role"]), None)
+
+    def select_agents(self, texts: List[str], batch_size: int = 32) -> List[Agent]:
+        """
+        Select the agents of many texts at once, for offline evaluation or queued jobs.
+        The texts missing from the routing cache are routed with batched passes of the routing models.
+        Args:
+            texts (List[str]): The texts to select the agents from
+            batch_size (int): Number of texts per forward pass of the models
+        Returns:
+            List[Agent]: The selected agent of each text, None when no agent fits
+        """
+        assert len(self.agents) > 0, "No agents available."
+        if len(self.agents) == 1:
+            return [self.agents[0]] * len(texts)
+        start = time.perf_counter()
+        labels = [agent.role for agent in self.agents]
+        langs = [self.lang_analysis.detect_language(text) for text in texts]
+        sentences = [self.find_first_sentence(text) for text in texts]
+        decisions = [None] * len(texts)
+        misses = {}
+        for i, (sentence, lang) in enumerate(zip(sentences, langs)):
+            cache_key = self.cache.make_key(sentence, lang, labels) if self.cache is not None else None
+            decision = self.cache.get(cache_key) if cache_key is not None else None
+            if decision is not None:
+                decisions[i] = decision
+            else:
+                misses.setdefault((sentence, lang), (cache_key, []))[1].append(i)
+        if misses:
+            routed = self.route_batch([sentence for sentence, _ in misses], [lang for _, lang in misses], labels, batch_size)
+            for (cache_key, positions), decision in zip(misses.values(), routed):
+                for i in positions:
+                    decisions[i] = decision
+                if cache_key is not None:
+                    self.cache.put(cache_key, decision)
+        self.logger.info(f"Routed {len(texts)} texts ({len(misses)} not cached) in {time.perf_counter() - start:.3f}s")
+        return [self.agent_for_decision(decision) for decision in decisions]
+
+    def route_batch(self, texts: List[str], langs: List[str], labels: list, batch_size: int = 32) -> List[dict]:
+        """
+        Batched version of route, each routing model runs once per batch of texts instead of once per text.
+        In the cascade engine the task vote only runs on the texts of LOW complexity.
+        """
+        texts = self.lang_analysis.translate_batch(texts, langs, batch_size)
+        if self.routing_engine == "knn":
+            return [self.knn_decision(text, prediction, labels)
+                    for text, prediction in zip(texts, self.knn_router.predict_batch(texts))]
+        decisions = [{"role": None, "complexity": complexity}
+                     for complexity in self.estimate_complexity_batch(texts, batch_size)]
+        low = [i for i, decision in enumerate(decisions) if decision["complexity"] != "HIGH"]
+        if low:
+            roles = self.router_vote_batch([texts[i] for i in low], labels, batch_size)
+            for i, role in zip(low, roles):
+                decisions[i]["role"] = role
+        return decisions
 
-if __name__ == "__main__":
-    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    agents = [
-        CasualAgent("jarvis", "../prompts/base/casual_agent.txt", None),
-        BrowserAgent("browser", "../prompts/base/planner_agent.txt", None),
-        CoderAgent("coder", "../prompts/base/coder_agent.txt", None),
-        FileAgent("file", "../prompts/base/coder_agent.txt", None)
-    ]
-    router = AgentRouter(agents)
-    texts = [
-        "hi",
-        "你好",
-        "Bonjour",
-        "Write a python script to check if the device on my network is connected to the internet",
-         "Peut tu écrire un script python qui vérifie si l'appareil sur mon réseau est connecté à internet?",
-         "写一个Python脚本，检查我网络上的设备是否连接到互联网",
-        "Hey could you search the web for the latest news on the tesla stock market ?",
-         "嘿，你能搜索网页上关于股票市场的最新新闻吗？",
-         "Yo, cherche sur internet comment va tesla en bourse.",
-        "I would like you to search for weather api and then make an app using this API",
-         "我想让你搜索天气API，然后用这个API做一个应用程序",
-         "J'aimerais que tu cherche une api météo et que l'utilise pour faire une application",
-        "Plan a 3-day trip to New York, including flights and hotels.",
-         "计划一次为期3天的纽约之旅，包括机票和酒店。",
-         "Planifie un trip de 3 jours à Paris, y compris les vols et hotels.",
-        "Find on the web the latest research papers on AI.",
-         "在网上找到最新的人工智能研究论文。",
-         "Trouve moi les derniers articles de recherche sur l'IA sur internet",
-        "Help me write a C++ program to sort an array",
-        "Tell me what France been up to lately",
-         "告诉我法国最近在做什么",
-         "Dis moi ce que la France a fait récemment",
-        "Who is Sergio Pesto ?",
-         "谁是Sergio Pesto？",
-         "Qui est Sergio Pesto ?",
-         "帮我写一个C++程序来排序数组",
-         "Aide moi à faire un programme c++ pour trier une array.",
-        "What’s the weather like today? Oh, and can you find a good weather app?",
-         "今天天气怎么样？哦，你还能找到一个好的天气应用程序吗？",
-         "La météo est comment aujourd'hui ? oh et trouve moi une bonne appli météo tant que tu y est.",
-        "Can you debug this Java code? It’s not working.",
-         "你能调试这段Java代码吗？它不起作用。",
-         "Peut tu m'aider à debugger ce code java, ça marche pas",
-        "Can you browse the web and find me a 4090 for cheap?",
-        "你能浏览网页，为我找一个便宜的4090吗？",
-        "Peut tu chercher sur internet et me trouver une 4090 pas cher ?",
-        "Hey, can you find the old_project.zip file somewhere on my drive?",
-        "嘿，你能在我驱动器上找到old_project.zip文件吗？",
-        "Hé trouve moi le old_project.zip, il est quelque part sur mon disque.",
-        "Tell me a funny story",
-        "给我讲一个有趣的故事",
-        "Raconte moi une histoire drole"
-    ]
-    for text in texts:
-        print("Input text:", text)
-        agent = router.select_agent(text)
-        print()
+    def route(self, text: str, lang: str, labels: list, timings: dict = None) -> dict:
+        """
+        Run the routing models on the first sentence of a query.
+        In the cascade engine the complexity and the task vote are independent once the text is translated,
+        they run concurrently when concurrent_signals is enabled.
+        Args:
+            text (str): The first sentence of the query
+            lang (str): The language of the query
+            labels (list): The roles of the agents
+            timings (dict, optional): Filled with the duration of each stage, in seconds
+        Returns:
+            dict: The decision, {"role": selected role or None, "complexity": "LOW" or "HIGH"}
+        """
+        timings = {} if timings is None else timings
+        text = self.timed_call(timings, "translate", self.lang_analysis.translate, text, lang)
+        if self.routing_engine == "knn":
+            return self.timed_call(timings, "knn", self.knn_route, text, labels)
+        if self.signal_pool is None:
+            complexity = self.timed_call(timings, "complexity", self.estimate_complexity, text)
+            if complexity == "HIGH":
+                return {"role": None, "complexity": complexity}
+            return {"role": self.timed_call(timings, "vote", self.router_vote, text, labels), "complexity": complexity}
+        complexity_future = self.signal_pool.submit(self.timed_call, timings, "complexity", self.estimate_complexity, text)
+        decision = self.timed_call(timings, "vote", self.cascade_vote, text, labels)
+        complexity = complexity_future.result()
+        if complexity == "HIGH":
+            return {"role": None, "complexity": complexity} # the vote is discarded, it is not counted in the routing stats
+        return {"role": self.record_decision(text, *decision), "complexity": complexity}
+
+    def knn_route(self, text: str, labels: list) -> dict:
+        """
+        Route with the knn router, the role and the complexity come from a single embedding of the text.
+        As in estimate_complexity, an uncertain complexity is considered HIGH.
+        """
+        return self.knn_decision(text, self.knn_router.predict(text), labels)
+
+    def knn_decision(self, text: str, predictions: dict, labels: list) -> dict:
+        """
+        Get the routing decision from the knn router predictions of a text.
+        """
+        complexity, complexity_confidence = predictions["complexity"][0]
+        if complexity == "HIGH" or complexity_confidence < 0.5:
+            return {"role": None, "complexity": "HIGH"}
+        if len(text) <= 8:
+            return {"role": self.record_decision(text, "short", "talk", 1.0), "complexity": "LOW"}
+        role, confidence = next(((label, score) for label, score in predictions["tasks"] if label in labels),
+                                predictions["tasks"][0])
+        return {"role": self.record_decision(text, "knn", role, confidence), "complexity": "LOW"}
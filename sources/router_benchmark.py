@@ -0,0 +1,130 @@
+"""
+Benchmark of the agent routing accuracy and latency on a labeled dataset.
+Run it as a module from the project root: python -m sources.router_benchmark --dataset benchmarks/router_queries.jsonl
+"""
+
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass
+from typing import List
+
+from sources.utility import pretty_print
+
+DEFAULT_DATASET = "benchmarks/router_queries.jsonl"
+
+@dataclass
+class RoutingTarget:
+    """Agent stand-in for the benchmark, the router only reads the role, type and name of the agents."""
+    role: str
+    type: str
+    agent_name: str
+
+def default_targets() -> List[RoutingTarget]:
+    return [
+        RoutingTarget("talk", "casual_agent", "jarvis"),
+        RoutingTarget("web", "browser_agent", "browser"),
+        RoutingTarget("code", "code_agent", "coder"),
+        RoutingTarget("files", "file_agent", "file"),
+        RoutingTarget("planification", "planner_agent", "planner"),
+    ]
+
+def load_dataset(path: str) -> List[dict]:
+    """
+    Load a JSONL routing dataset, one {"text": ..., "label": <expected agent role>} object per line.
+    """
+    examples = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            example = json.loads(line)
+            if "text" not in example or "label" not in example:
+                raise ValueError(f"{path}:{line_number}: expected 'text' and 'label' keys, got {list(example)}")
+            examples.append(example)
+    return examples
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run_benchmark(router, examples: List[dict], batch_size: int = 32, sequential: bool = False) -> dict:
+    """
+    Route the examples and compare the selected agent roles with the labels.
+    Args:
+        router (AgentRouter): The router to evaluate, its models should be loaded.
+        examples (List[dict]): The labeled texts.
+        batch_size (int): Number of texts per forward pass with select_agents.
+        sequential (bool): Also route the texts one by one with select_agent, to compare the latency.
+    Returns:
+        dict: accuracy, per label accuracy, misrouted texts and latency.
+    """
+    texts = [example["text"] for example in examples]
+    start = time.perf_counter()
+    agents = router.select_agents(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    predictions = [agent.role if agent is not None else None for agent in agents]
+    per_label = {}
+    errors = []
+    for example, prediction in zip(examples, predictions):
+        counts = per_label.setdefault(example["label"], {"correct": 0, "total": 0})
+        counts["total"] += 1
+        if prediction == example["label"]:
+            counts["correct"] += 1
+        else:
+            errors.append({"text": example["text"], "label": example["label"], "prediction": prediction})
+    report = {
+        "count": len(examples),
+        "accuracy": sum(c["correct"] for c in per_label.values()) / len(examples) if examples else 0.0,
+        "per_label": {label: c["correct"] / c["total"] for label, c in per_label.items()},
+        "errors": errors,
+        "batch_seconds": elapsed,
+        "batch_ms_per_query": elapsed * 1000 / len(examples) if examples else 0.0,
+    }
+    if sequential:
+        latencies = []
+        for text in texts:
+            if router.cache is not None:
+                router.cache.clear()
+            start = time.perf_counter()
+            router.select_agent(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+        report["sequential_ms_p50"] = percentile(latencies, 0.5)
+        report["sequential_ms_p95"] = percentile(latencies, 0.95)
+    return report
+
+def print_report(report: dict) -> None:
+    for error in report["errors"]:
+        pretty_print(f"Misrouted: {error['text']} -> {error['prediction']} (expected {error['label']})", color="warning")
+    for label, accuracy in sorted(report["per_label"].items()):
+        pretty_print(f"{label}: {accuracy:.1%}", color="info")
+    pretty_print(f"Accuracy: {report['accuracy']:.1%} on {report['count']} texts", color="success")
+    pretty_print(f"Batch routing: {report['batch_seconds']:.2f}s, {report['batch_ms_per_query']:.1f}ms per text", color="status")
+    if "sequential_ms_p50" in report:
+        pretty_print(f"Sequential routing: p50 {report['sequential_ms_p50']:.1f}ms, p95 {report['sequential_ms_p95']:.1f}ms per text", color="status")
+
+def main():
+    parser = argparse.ArgumentParser(description='Route a labeled JSONL dataset and report the routing accuracy and latency')
+    parser.add_argument('--dataset', default=DEFAULT_DATASET, help='JSONL file of {"text": ..., "label": ...} lines')
+    parser.add_argument('--engine', default="cascade", choices=["cascade", "knn"], help='routing engine to evaluate')
+    parser.add_argument('--languages', nargs='+', default=["en", "fr", "zh"], help='languages of the dataset')
+    parser.add_argument('--batch-size', type=int, default=32, help='texts per forward pass')
+    parser.add_argument('--sequential', action='store_true', help='also measure the latency of routing the texts one by one')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    from sources.router import AgentRouter
+    examples = load_dataset(args.dataset)
+    router = AgentRouter(default_targets(), supported_language=args.languages, routing_engine=args.engine, cache_size=0)
+    if not router.wait_ready():
+        pretty_print(f"Router failed to load: {router.readiness()}", color="failure")
+        sys.exit(1)
+    report = run_benchmark(router, examples, batch_size=args.batch_size, sequential=args.sequential)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+class RoutingCache:
+    """
+    LRU cache of the routing decisions, keyed on the normalized query with a time to live.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        """
+        Args:
+            max_entries (int): Number of decisions kept, the least recently used are evicted first.
+            ttl (float): Seconds before a decision expires, None to never expire.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalize a query so that near-identical ones share an entry: case, spacing and trailing punctuation are ignored.
+        """
+        text = re.sub(r'\s+', ' ', text.strip().lower())
+        return text.rstrip(' .!?,;:')
+
+    def make_key(self, text: str, lang: str, roles: list) -> tuple:
+        return (self.normalize(text), lang, tuple(sorted(roles)))
+
+    def get(self, key: tuple) -> dict | None:
+        """Return the cached decision for a key, None on miss or if it expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (self.ttl is not None and time.time() - entry[1] > self.ttl):
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, decision: dict) -> None:
+        """Add a decision to the cache, evicting the least recently used ones."""
+        with self.lock:
+            self.entries[key] = (decision, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,85 @@
+import os
+import time
+import sqlite3
+import threading
+
+class SessionIndex:
+    """
+    SessionIndex records the saved sessions of every agent in a small SQLite file.
+    Finding the last session or a session by id is an indexed lookup instead of a scan of the conversation folder.
+    """
+    def __init__(self, conversation_folder: str = "conversations/", index_file: str = "sessions.db"):
+        """
+        Args:
+            conversation_folder (str): Folder of the session journals, the index is stored in it.
+            index_file (str): Name of the SQLite index file.
+        """
+        os.makedirs(conversation_folder, exist_ok=True)
+        self.path = os.path.join(conversation_folder, index_file)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("""CREATE TABLE IF NOT EXISTS sessions (
+                            session_id TEXT,
+                            agent_type TEXT,
+                            path TEXT,
+                            created_at REAL,
+                            updated_at REAL,
+                            message_count INTEGER,
+                            byte_offset INTEGER,
+                            PRIMARY KEY (session_id, agent_type))""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS sessions_last ON sessions (agent_type, updated_at)")
+        self.db.commit()
+
+    def record(self, session_id: str, agent_type: str, path: str,
+               created_at: float, message_count: int, byte_offset: int) -> None:
+        """
+        Add or update a session after its journal was written.
+        Args:
+            session_id (str): Id of the session.
+            agent_type (str): Type of the agent the memory belongs to.
+            path (str): Path of the session journal.
+            created_at (float): Timestamp of the session start.
+            message_count (int): Number of messages of the memory.
+            byte_offset (int): End of the last complete record of the journal.
+        """
+        with self.lock:
+            self.db.execute("""INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)
+                               ON CONFLICT (session_id, agent_type) DO UPDATE SET
+                               path = excluded.path, updated_at = excluded.updated_at,
+                               message_count = excluded.message_count, byte_offset = excluded.byte_offset""",
+                            (session_id, agent_type, path, created_at, time.time(), message_count, byte_offset))
+            self.db.commit()
+
+    def get(self, session_id: str, agent_type: str) -> dict | None:
+        """Get a session by id, None if it is not indexed."""
+        with self.lock:
+            row = self.db.execute("SELECT * FROM sessions WHERE session_id = ? AND agent_type = ?",
+                                  (session_id, agent_type)).fetchone()
+        return dict(row) if row is not None else None
+
+    def last(self, agent_type: str) -> dict | None:
+        """Get the last updated session of an agent, None if the agent has no indexed session."""
+        sessions = self.list_sessions(agent_type, limit=1)
+        return sessions[0] if sessions else None
+
+    def list_sessions(self, agent_type: str, limit: int = 20) -> list:
+        """List the sessions of an agent, the most recently updated first."""
+        with self.lock:
+            rows = self.db.execute("SELECT * FROM sessions WHERE agent_type = ? ORDER BY updated_at DESC LIMIT ?",
+                                   (agent_type, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_session_id(self) -> str | None:
+        """Get the id of the last updated session of any agent, None if no session is indexed."""
+        sessions = self.list_all(limit=1)
+        return sessions[0]['session_id'] if sessions else None
+
+    def list_all(self, limit: int = 20) -> list:
+        """List the sessions with the agents they span, the most recently updated first."""
+        with self.lock:
+            rows = self.db.execute("""SELECT session_id, MIN(created_at) AS created_at, MAX(updated_at) AS updated_at,
+                                      GROUP_CONCAT(agent_type) AS agent_types, SUM(message_count) AS message_count
+                                      FROM sessions GROUP BY session_id ORDER BY updated_at DESC LIMIT ?""",
+                                   (limit,)).fetchall()
+        return [{**dict(row), 'agent_types': row['agent_types'].split(',')} for row in rows]
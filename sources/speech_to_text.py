@@ -4,18 +4,16 @@ import queue
 import threading
 import numpy as np
 import time
+from importlib.util import find_spec
 
-IMPORT_FOUND = True
 pyaudio = None
 
-try:
-    import torch
-    import librosa
+# torch, librosa and transformers are only imported when the transcription model is loaded
+IMPORT_FOUND = all(find_spec(name) is not None for name in ["torch", "librosa", "pyaudio", "transformers"])
+if IMPORT_FOUND:
     import pyaudio
-    from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
-except ImportError:
+else:
     print(Fore.RED + "Speech To Text disabled." + Fore.RESET)
-    IMPORT_FOUND = False
 
 audio_queue = queue.Queue()
 done = False
@@ -89,6 +87,8 @@ class Transcript:
         if not IMPORT_FOUND:
             print(Fore.RED + "Transcript: Speech to Text is disabled." + Fore.RESET)
             return
+        import torch
+        from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
         self.last_read = None
         device = self.get_device()
         torch_dtype = torch.float16 if device == "cuda" else torch.float32
@@ -113,6 +113,7 @@ class Transcript:
     def get_device(self) -> str:
         if not IMPORT_FOUND:
             return "cpu"
+        import torch
         if torch.backends.mps.is_available():
             return "mps"
         if torch.cuda.is_available():
@@ -137,6 +138,7 @@ class Transcript:
         if len(audio_data.shape) > 1:
             audio_data = np.mean(audio_data, axis=1)
         if sample_rate != 16000:
+            import librosa
             audio_data = librosa.resample(audio_data, orig_sr=sample_rate, target_sr=16000)
         result = self.pipe(audio_data)
         return self.remove_hallucinations(result["text"])
@@ -4,15 +4,13 @@ import platform
 import subprocess
 from sys import modules
 from typing import List, Tuple, Type, Dict
+from importlib.util import find_spec
 
 IMPORT_FOUND = True
 USE_FALLBACK = False
 
-try:
-    from kokoro import KPipeline
-    from IPython.display import display, Audio
-    import soundfile as sf
-except ImportError:
+# kokoro pulls torch, it is only imported when the speech pipeline is created
+if not all(find_spec(name) is not None for name in ["kokoro", "IPython", "soundfile"]):
     print("Kokoro not available, trying fallback TTS...")
     try:
         from sources.fallback_tts import FallbackSpeech
@@ -52,6 +50,7 @@ class Speech():
             if USE_FALLBACK:
                 self.fallback_speech = FallbackSpeech(enable=True, language=language, voice_idx=voice_idx)
             else:
+                from kokoro import KPipeline
                 self.pipeline = KPipeline(lang_code=self.lang_map[language])
                 
         if not USE_FALLBACK and language in self.voice_map and voice_idx < len(self.voice_map[language]):
@@ -94,6 +93,8 @@ class Speech():
         if voice_idx >= len(self.voice_map[self.language]):
             pretty_print("Invalid voice number, using default voice", color="error")
             voice_idx = 0
+        import soundfile as sf
+        from IPython.display import display, Audio
         sentence = self.clean_sentence(sentence)
         audio_file = f"{self.voice_folder}/sample_{self.voice_map[self.language][voice_idx]}.wav"
         self.voice = self.voice_map[self.language][voice_idx]
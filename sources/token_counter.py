@@ -0,0 +1,124 @@
+import re
+from functools import lru_cache
+
+from sources.logger import Logger
+
+# Hugging Face tokenizers for the model families commonly served through ollama/llm_server.
+TOKENIZER_REPOS = {
+    "deepseek-r1": "deepseek-ai/DeepSeek-R1-Distill-Qwen-7B",
+    "deepseek": "deepseek-ai/DeepSeek-V3",
+    "qwen": "Qwen/Qwen2.5-7B-Instruct",
+    "llama": "meta-llama/Llama-3.1-8B-Instruct",
+    "mistral": "mistralai/Mistral-7B-Instruct-v0.3",
+    "gemma": "google/gemma-2-9b-it",
+    "phi": "microsoft/phi-4",
+}
+
+CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+
+class TokenCounter:
+    """
+    Count tokens of a text, approximated from the characters.
+    Latin text averages about 4 characters per token, CJK characters about one token each.
+    """
+    def __init__(self, cache_size: int = 4096):
+        self.count = lru_cache(maxsize=cache_size)(self.count_tokens)
+
+    def count_tokens(self, text: str) -> int:
+        if not text:
+            return 0
+        cjk = len(CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Truncate a text to at most max_tokens tokens.
+        """
+        if self.count(text) <= max_tokens:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count_tokens(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
+
+class HuggingFaceTokenCounter(TokenCounter):
+    """
+    Count tokens with the tokenizer of the model family.
+    The tokenizer is loaded on first use from the local Hugging Face cache only, so counting never downloads.
+    The character approximation is used if the tokenizer is not available.
+    """
+    def __init__(self, repo_id: str, cache_size: int = 4096):
+        super().__init__(cache_size)
+        self.repo_id = repo_id
+        self.tokenizer = None
+        self.load_failed = False
+        self.logger = Logger("token_counter.log")
+
+    def load_tokenizer(self):
+        if self.tokenizer is None and not self.load_failed:
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(self.repo_id, local_files_only=True)
+                self.logger.info(f"Loaded tokenizer {self.repo_id} for token counting.")
+            except Exception as e:
+                self.logger.warning(f"Tokenizer {self.repo_id} unavailable, approximating token count: {str(e)}")
+                self.load_failed = True
+        return self.tokenizer
+
+    def count_tokens(self, text: str) -> int:
+        tokenizer = self.load_tokenizer()
+        if tokenizer is None or not text:
+            return super().count_tokens(text)
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokenizer = self.load_tokenizer()
+        if tokenizer is None:
+            return super().truncate(text, max_tokens)
+        ids = tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= max_tokens:
+            return text
+        return tokenizer.decode(ids[:max_tokens])
+
+class TiktokenCounter(TokenCounter):
+    """
+    Count tokens of OpenAI models with tiktoken.
+    """
+    def __init__(self, model_name: str, cache_size: int = 4096):
+        super().__init__(cache_size)
+        import tiktoken
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text)) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        ids = self.encoding.encode(text)
+        return text if len(ids) <= max_tokens else self.encoding.decode(ids[:max_tokens])
+
+@lru_cache(maxsize=None)
+def get_token_counter(model_name: str) -> TokenCounter:
+    """
+    Get the token counter of a model, shared by every memory using that model.
+    Args:
+        model_name (str): Name of the model, eg: deepseek-r1:14b, gpt-4o
+    Returns:
+        TokenCounter: A tokenizer based counter if available for the model family, else the approximation.
+    """
+    name = (model_name or "").lower()
+    if name.startswith(("gpt-", "o1", "o3", "o4")):
+        try:
+            return TiktokenCounter(name)
+        except ImportError:
+            return TokenCounter()
+    for family, repo_id in TOKENIZER_REPOS.items():
+        if family in name:
+            return HuggingFaceTokenCounter(repo_id)
+    return TokenCounter()
@@ -8,24 +8,50 @@ if __name__ == "__main__": # if running as a script for individual testing
     sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from sources.tools.tools import Tools
+from sources.tools.python_worker_pool import get_worker_pool
 
 class PyInterpreter(Tools):
     """
     This class is a tool to allow agent for python code execution.
     """
-    def __init__(self):
+    def __init__(self, use_worker_pool: bool = os.name == "posix"):
+        """
+        Args:
+            use_worker_pool (bool): Execute the code in the shared pool of worker processes instead of in this process.
+        """
         super().__init__()
         self.tag = "python"
         self.name = "Python Interpreter"
         self.description = "This tool allows the agent to execute python code."
+        self.worker_pool = get_worker_pool() if use_worker_pool else None
 
     def execute(self, codes:str, safety = False) -> str:
         """
         Execute python code.
         """
-        output = ""
         if safety and input("Execute code ? y/n") != "y":
             return "Code rejected by user."
+        if self.worker_pool is None:
+            return self.execute_in_process(codes)
+        code = '\n\n'.join(codes)
+        self.logger.info(f"Executing code in worker:\n{code}")
+        status, output = self.worker_pool.execute(code)
+        if status.get("stderr"):
+            self.logger.info(f"Code stderr:\n{status['stderr']}")
+        if status["status"] == "exit":
+            self.logger.info("SystemExit caught, code execution stopped.")
+            return f"[SystemExit caught] Output before exit:\n{output}"
+        if status["status"] == "error":
+            self.logger.error(f"Code execution failed: {status['error']}")
+            return "code execution failed:" + status['error']
+        self.logger.info("Code execution finished.")
+        return output
+
+    def execute_in_process(self, codes:str) -> str:
+        """
+        Execute python code in this process, when worker processes are not available.
+        """
+        output = ""
         stdout_buffer = StringIO()
         sys.stdout = stdout_buffer
         global_vars = {
@@ -0,0 +1,158 @@
+"""
+Parser of the fenced blocks of a LLM answer.
+
+An answer is split into blocks in a single pass:
+```<tag>[:<save path>]
+<content>
+```
+A block opens with a fence at the start of a line (after its indentation), a fence inside a sentence is text.
+A fence followed by a tag at the start of a line inside a block closes the block and opens a new one,
+so a block nested in a ```markdown block is still found, the closing fence of the outer block is then skipped.
+The parse of an answer is cached, so every tool, the agents and the planner share it.
+BlockStreamParser parses the blocks of an answer streamed token by token.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple
+
+FENCE = '```'
+
+@dataclass(frozen=True)
+class Block:
+    """
+    A fenced block of an answer.
+    raw: the text between the opening and closing fences, starting with the tag.
+    indent: the text before the opening fence on its line, removed from the lines of the content.
+    span: the (start, end) offsets of the block in the answer, fences included.
+    closed: whether the closing fence was found.
+    """
+    raw: str
+    indent: str
+    span: Tuple[int, int]
+    closed: bool = True
+
+    @property
+    def tag(self) -> str:
+        return re.match(r'[^\s:]*', self.raw).group()
+
+    @property
+    def content(self) -> str:
+        return self.extract(self.tag)[0]
+
+    @property
+    def save_path(self) -> str | None:
+        return self.extract(self.tag)[1]
+
+    def extract(self, tag: str) -> Tuple[str, str | None]:
+        """
+        Get the content and save path of the block read with a tool tag.
+        The save path is given after the tag, on the fence line, eg: ```python:script.py
+        """
+        content = self.raw[len(tag):]
+        if self.indent:
+            lines = [line[len(self.indent):] if line.startswith(self.indent) else line
+                     for line in content.split('\n')]
+            content = '\n'.join(lines)
+        save_path = None
+        if ':' in content.split('\n')[0]:
+            save_path = content.split('\n')[0].split(':')[1]
+            content = content[content.find('\n')+1:]
+        return content, save_path
+
+class BlockStreamParser:
+    """
+    Incremental parser of the blocks of an answer, the answer is fed as it is generated.
+    Each fence is looked for once, parsing a whole answer is linear in its length.
+    """
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.open_position = None
+        self.blocks = []
+        self.finished = False
+        self.outer_fences = 0 # closing fences of the outer blocks interrupted by a nested block
+
+    def starts_line(self, position: int) -> bool:
+        """Whether only indentation precedes a position on its line."""
+        line_start = self.text.rfind('\n', 0, position) + 1
+        return self.text[line_start:position].strip() == ""
+
+    def feed(self, chunk: str) -> List[Block]:
+        """
+        Add a chunk of the answer.
+        Returns:
+            List[Block]: The blocks closed by this chunk.
+        """
+        self.text += chunk
+        closed = []
+        while True:
+            fence = self.text.find(FENCE, self.position)
+            if fence == -1:
+                break
+            after = fence + len(FENCE)
+            at_line_start = self.starts_line(fence)
+            if at_line_start and after == len(self.text) and not self.finished:
+                break # wait for the next chunk to know if a tag follows the fence
+            tagged = at_line_start and after < len(self.text) and not self.text[after].isspace()
+            if self.open_position is None:
+                self.position = after
+                if not at_line_start:
+                    continue # a fence inside a sentence is text
+                if tagged or self.outer_fences == 0:
+                    self.outer_fences = 0
+                    self.open_position = fence
+                else:
+                    self.outer_fences -= 1 # closing fence of an outer block
+                continue
+            if tagged:
+                block = self.make_block(self.open_position, fence, fence_length=0)
+                self.open_position = fence
+                self.outer_fences += 1
+            else:
+                block = self.make_block(self.open_position, fence)
+                self.open_position = None
+            self.position = after
+            self.blocks.append(block)
+            closed.append(block)
+        return closed
+
+    def finish(self) -> List[Block]:
+        """
+        Mark the end of the answer.
+        Returns:
+            List[Block]: The blocks closed by a fence ending the answer.
+        """
+        self.finished = True
+        return self.feed("")
+
+    def make_block(self, start: int, end: int | None, fence_length: int = len(FENCE)) -> Block:
+        """Make the block opened at start and closed by the fence at end, fence_length is 0 if the fence opens the next block."""
+        line_start = self.text.rfind('\n', 0, start) + 1
+        if end is None:
+            return Block(self.text[start + len(FENCE):], self.text[line_start:start], (start, len(self.text)), closed=False)
+        return Block(self.text[start + len(FENCE):end], self.text[line_start:start], (start, end + fence_length))
+
+    def pending_block(self) -> Block | None:
+        """Get the block opened but not closed yet, if any."""
+        if self.open_position is None:
+            return None
+        return self.make_block(self.open_position, None)
+
+    def result(self) -> Tuple[Block, ...]:
+        """Get all the blocks of the answer fed so far, the last one may be unclosed."""
+        pending = self.pending_block()
+        return tuple(self.blocks) + ((pending,) if pending is not None else ())
+
+@lru_cache(maxsize=32)
+def parse_blocks(text: str) -> Tuple[Block, ...]:
+    """
+    Parse the blocks of an answer, the result is cached for the latest answers.
+    Returns:
+        Tuple[Block, ...]: The blocks in the order of the answer, the last one may be unclosed.
+    """
+    parser = BlockStreamParser()
+    parser.feed(text)
+    parser.finish()
+    return parser.result()
@@ -17,6 +17,7 @@ class FileFinder(Tools):
         self.tag = "file_finder"
         self.name = "File Finder"
         self.description = "Finds files in the current directory and returns their information."
+        self.independent_blocks = True
     
     def read_file(self, file_path: str) -> str:
         """
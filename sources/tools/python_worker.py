@@ -0,0 +1,93 @@
+"""
+Worker process of the PythonWorkerPool, run as a script: python python_worker.py
+
+Requests are read from stdin, one JSON object per line: {"id": <int>, "code": <str>, "cpu_seconds": <int>}.
+The code output is written to stdout as it is produced, followed by a status line:
+\n<token>:<id>:{"status": "ok" | "exit" | "error", "error": <str>, "stderr": <str>}
+The token is given by the pool in the PY_WORKER_TOKEN environment variable.
+"""
+
+import os
+import io
+import sys
+import json
+import builtins
+import importlib
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+def set_memory_limit(memory_mb: int) -> None:
+    """
+    Limit the data segment (heap and private writable mappings) of the process to memory_mb MB.
+    The address space is not limited: libraries like torch reserve far more of it than they use.
+    """
+    if resource is None or memory_mb <= 0:
+        return
+    limit = memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+
+def set_cpu_limit(cpu_seconds: int) -> None:
+    """Allow cpu_seconds more seconds of CPU time, the process is killed by SIGXCPU past it."""
+    if resource is None or cpu_seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    limit = int(usage.ru_utime + usage.ru_stime) + cpu_seconds + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+def preload(modules: str) -> None:
+    for name in filter(None, modules.split(',')):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+def run(code: str, cpu_seconds: int, stdout) -> dict:
+    """
+    Execute code in fresh globals, as the in-process interpreter does.
+    The process state is shared by the runs of a worker: environment variables, working directory
+    and imported modules set by a run are seen by the next ones until the worker is replaced.
+    """
+    stderr = io.StringIO()
+    global_vars = {
+        '__builtins__': builtins,
+        'os': os,
+        'sys': sys,
+        '__name__': '__main__'
+    }
+    set_cpu_limit(cpu_seconds)
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        exec(compile(code, "<agent code>", "exec"), global_vars)
+        return {"status": "ok", "stderr": stderr.getvalue()}
+    except SystemExit:
+        return {"status": "exit", "stderr": stderr.getvalue()}
+    except Exception as e:
+        return {"status": "error", "error": str(e) or type(e).__name__, "stderr": stderr.getvalue()}
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+
+def main() -> None:
+    token = os.environ["PY_WORKER_TOKEN"]
+    set_memory_limit(int(os.environ.get("PY_WORKER_MEMORY_MB", "0")))
+    preload(os.environ.get("PY_WORKER_PRELOAD", ""))
+    requests = sys.stdin
+    sys.stdin = open(os.devnull, 'r') # the code must not read the requests
+    stdout = sys.stdout
+    for line in requests:
+        request = json.loads(line)
+        status = run(request["code"], request.get("cpu_seconds", 0), stdout)
+        stdout.flush()
+        stdout.write(f"\n{token}:{request['id']}:{json.dumps(status)}\n")
+        stdout.flush()
+
+if __name__ == "__main__":
+    main()
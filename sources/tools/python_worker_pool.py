@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import queue
+import codecs
+import atexit
+import select
+import signal
+import secrets
+import threading
+import subprocess
+import time
+import configparser
+from typing import Callable, Tuple
+
+from sources.logger import Logger
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+DEFAULT_PRELOAD = ["os", "sys", "re", "json", "math", "time", "datetime", "random", "collections", "itertools", "subprocess"]
+
+class PythonWorker:
+    """
+    A Python process executing code requests, see python_worker.py for the protocol.
+    """
+    def __init__(self, memory_mb: int, preload: list):
+        self.token = secrets.token_hex(16)
+        self.runs = 0
+        env = dict(os.environ, PY_WORKER_TOKEN=self.token,
+                   PY_WORKER_MEMORY_MB=str(memory_mb),
+                   PY_WORKER_PRELOAD=",".join(preload))
+        self.process = subprocess.Popen([sys.executable, "-u", WORKER_SCRIPT],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        env=env)
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self) -> None:
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+        for pipe in [self.process.stdin, self.process.stdout]:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def exit_reason(self) -> str:
+        code = self.process.wait()
+        if code < 0 and -code == getattr(signal, "SIGXCPU", None):
+            return "CPU time limit exceeded"
+        if code < 0:
+            return f"worker killed by signal {signal.Signals(-code).name}"
+        return f"worker exited with code {code}"
+
+    def run(self, code: str, cpu_seconds: int, timeout: float, on_output: Callable[[str], None] = None) -> Tuple[dict, str]:
+        """
+        Execute code in the worker.
+        Args:
+            code (str): The python code.
+            cpu_seconds (int): CPU time limit of the run.
+            timeout (float): Wall time limit of the run, the worker is killed past it.
+            on_output (Callable, optional): Called with the output as it is produced.
+        Returns:
+            Tuple[dict, str]: The status of the run and its output.
+        """
+        self.runs += 1
+        marker = f"\n{self.token}:{self.runs}:"
+        try:
+            self.process.stdin.write((json.dumps({"id": self.runs, "code": code, "cpu_seconds": cpu_seconds}) + "\n").encode('utf-8'))
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return {"status": "error", "error": self.exit_reason()}, ""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        fd = self.process.stdout.fileno()
+        buffer = ""
+        emitted = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            position = buffer.find(marker)
+            if position != -1 and buffer.find("\n", position + len(marker)) != -1:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.kill()
+                return {"status": "error", "error": f"timed out after {timeout} seconds"}, buffer
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return {"status": "error", "error": self.exit_reason()}, buffer
+            buffer += decoder.decode(chunk)
+            position = buffer.find(marker)
+            safe = position if position != -1 else len(buffer) - len(marker) # never emit a part of the status line
+            if on_output is not None and safe > emitted:
+                on_output(buffer[emitted:safe])
+                emitted = safe
+        end = buffer.find("\n", position + len(marker))
+        status = json.loads(buffer[position + len(marker):end])
+        output = buffer[:position]
+        if on_output is not None and len(output) > emitted:
+            on_output(output[emitted:])
+        return status, output
+
+class PythonWorkerPool:
+    """
+    Pool of pre-started Python processes executing the agents code.
+    Each run is limited in CPU time, memory and wall time, a worker is replaced after max_runs runs or when it dies.
+    Runs only get fresh globals: the environment, working directory and imported modules of a worker
+    persist across its runs until it is replaced.
+    """
+    def __init__(self, size: int = 2,
+                 max_runs: int = 50,
+                 cpu_seconds: int = 60,
+                 memory_mb: int = 0,
+                 timeout: float = 300,
+                 preload: list = DEFAULT_PRELOAD):
+        """
+        Args:
+            size (int): Number of workers, the number of codes executed concurrently.
+            max_runs (int): Runs of a worker before it is replaced by a fresh one.
+            cpu_seconds (int): CPU time limit of a run, 0 for no limit.
+            memory_mb (int): Data segment limit of a worker in MB, 0 for no limit.
+            timeout (float): Wall time limit of a run in seconds.
+            preload (list): Modules imported by the workers before their first run.
+        """
+        self.size = size
+        self.max_runs = max_runs
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.preload = preload
+        self.logger = Logger("python_worker_pool.log")
+        self.idle = queue.Queue()
+        self.workers = set()
+        self.lock = threading.Lock()
+        for _ in range(size):
+            self.idle.put(self.spawn())
+
+    def spawn(self) -> PythonWorker:
+        worker = PythonWorker(self.memory_mb, self.preload)
+        with self.lock:
+            self.workers.add(worker)
+        return worker
+
+    def retire(self, worker: PythonWorker) -> None:
+        worker.kill()
+        with self.lock:
+            self.workers.discard(worker)
+
+    def execute(self, code: str, on_output: Callable[[str], None] = None) -> Tuple[dict, str]:
+        """
+        Execute code on an idle worker, waiting for one if they are all busy.
+        Returns:
+            Tuple[dict, str]: The status of the run ({"status": "ok" | "exit" | "error", "error": ..., "stderr": ...}) and its output.
+        """
+        worker = self.idle.get()
+        try:
+            return worker.run(code, self.cpu_seconds, self.timeout, on_output)
+        finally:
+            if not worker.alive() or worker.runs >= self.max_runs:
+                self.logger.info(f"Replacing python worker after {worker.runs} runs.")
+                self.retire(worker)
+                worker = self.spawn()
+            self.idle.put(worker)
+
+    def shutdown(self) -> None:
+        with self.lock:
+            workers = list(self.workers)
+        for worker in workers:
+            self.retire(worker)
+
+worker_pool = None
+worker_pool_lock = threading.Lock()
+
+def get_worker_pool() -> PythonWorkerPool:
+    """
+    Get the worker pool shared by the python interpreters, started on first use.
+    The pool is sized and limited from the [MAIN] section of config.ini.
+    """
+    global worker_pool
+    with worker_pool_lock:
+        if worker_pool is None:
+            worker_pool = PythonWorkerPool(size=config.getint('MAIN', 'python_workers', fallback=2),
+                                           max_runs=config.getint('MAIN', 'python_worker_max_runs', fallback=50),
+                                           cpu_seconds=config.getint('MAIN', 'python_worker_cpu_seconds', fallback=60),
+                                           memory_mb=config.getint('MAIN', 'python_worker_memory_mb', fallback=0))
+            atexit.register(worker_pool.shutdown)
+        return worker_pool
@@ -26,6 +26,7 @@ if __name__ == "__main__": # if running as a script for individual testing
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sources.logger import Logger
+from sources.tools.block_parser import parse_blocks
 
 class Tools():
     """
@@ -43,6 +44,7 @@ class Tools():
         self.excutable_blocks_found = False
         self.safe_mode = False
         self.allow_language_exec_bash = False
+        self.independent_blocks = False # blocks of the tool share no state and can run concurrently
     
     def get_work_dir(self):
         return self.work_dir
@@ -155,7 +157,7 @@ class Tools():
     def load_exec_block(self, llm_text: str):
         """
         Extract code/query blocks from LLM-generated text and process them for execution.
-        This method parses the text looking for code blocks marked with the tool's tag (e.g. ```python).
+        This method reads the blocks marked with the tool's tag (e.g. ```python) from the shared parse of the text.
         Args:
             llm_text (str): The raw text containing code blocks from the LLM
         Returns:
@@ -164,43 +166,21 @@ class Tools():
                 - The path the code blocks was saved to
         """
         assert self.tag != "undefined", "Tag not defined"
-        start_tag = f'```{self.tag}' 
-        end_tag = '```'
+        blocks = [block for block in parse_blocks(llm_text) if block.raw.startswith(self.tag)]
         code_blocks = []
-        start_index = 0
         save_path = None
 
-        if start_tag not in llm_text:
+        if not blocks:
             return None, None
 
-        while True:
-            start_pos = llm_text.find(start_tag, start_index)
-            if start_pos == -1:
-                break
-
-            line_start = llm_text.rfind('\n', 0, start_pos)+1
-            leading_whitespace = llm_text[line_start:start_pos]
-
-            end_pos = llm_text.find(end_tag, start_pos + len(start_tag))
-            if end_pos == -1:
+        for block in blocks:
+            if not block.closed:
                 break
-            content = llm_text[start_pos + len(start_tag):end_pos]
-            lines = content.split('\n')
-            if leading_whitespace:
-                processed_lines = []
-                for line in lines:
-                    if line.startswith(leading_whitespace):
-                        processed_lines.append(line[len(leading_whitespace):])
-                    else:
-                        processed_lines.append(line)
-                content = '\n'.join(processed_lines)
-
-            if ':' in content.split('\n')[0]:
-                save_path = content.split('\n')[0].split(':')[1]
-                content = content[content.find('\n')+1:]
+            content, block_save_path = block.extract(self.tag)
+            if block_save_path is not None:
+                save_path = block_save_path
             self.excutable_blocks_found = True
             code_blocks.append(content)
-            start_index = end_pos + len(end_tag)
         self.logger.info(f"Found {len(code_blocks)} blocks to execute")
         return code_blocks, save_path
     
@@ -5,6 +5,7 @@ import platform
 import threading
 import itertools
 import time
+from contextlib import contextmanager
 
 thinking_event = threading.Event()
 current_animation_thread = None
@@ -119,6 +120,42 @@ def timer_decorator(func):
         return result
     return wrapper
 
+class StartupProfiler:
+    """
+    Record the duration of the startup phases (imports, models loading...), printed by --profile-startup.
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a startup phase.
+        Usage:
+        with startup_profiler.phase("router models"):
+            # code to time
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.append((name, time.perf_counter() - start))
+
+    def report(self) -> list:
+        """Print the duration of every phase and the total time since the start."""
+        with self.lock:
+            phases = list(self.phases)
+        pretty_print("Startup profile:", color="status")
+        for name, duration in phases:
+            pretty_print(f"  {name:<20} {duration:8.2f}s", color="info")
+        pretty_print(f"  {'total':<20} {time.perf_counter() - self.start_time:8.2f}s", color="status")
+        return phases
+
+startup_profiler = StartupProfiler()
+
 if __name__ == "__main__":
     import time
     pretty_print("starting imaginary task", "success")
@@ -0,0 +1,88 @@
+import unittest
+import threading
+from unittest.mock import MagicMock, patch
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sources.agents import agent as agent_module
+from sources.agents.agent import Agent
+from sources.tools.tools import Tools
+
+class RecordingTool(Tools):
+    """Tool executing blocks by recording them, a block containing 'fail' fails."""
+    def __init__(self, tag, barrier=None):
+        super().__init__()
+        self.tag = tag
+        self.barrier = barrier
+        self.executed = []
+
+    def execute(self, blocks, safety=False):
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5)
+        self.executed.extend(blocks)
+        return blocks[0].strip()
+
+    def execution_failure_check(self, output):
+        return "fail" in output
+
+    def interpreter_feedback(self, output):
+        return f"[{self.tag}] {output}"
+
+class TestAgentExecution(unittest.TestCase):
+    def setUp(self):
+        self.agent = Agent("test", "prompt.txt", None)
+        self.agent.memory = MagicMock()
+        self.agent.show_block = MagicMock()
+
+    def answer(self, *blocks):
+        return "I will run:\n" + "\n".join(f"```{tag}\n{code}\n```" for tag, code in blocks)
+
+    def test_sequential_stops_on_first_failure(self):
+        self.agent.tools = {"python": RecordingTool("python"), "go": RecordingTool("go")}
+        success, feedback = self.agent.execute_modules(self.answer(("python", "fail now"), ("python", "ok"), ("go", "ok")))
+        self.assertFalse(success)
+        self.assertEqual(feedback, "[python] fail now")
+        self.assertEqual(len(self.agent.blocks_result), 1)
+        self.assertEqual(self.agent.tools["go"].executed, [])
+
+    def test_parallel_execution_from_config(self):
+        with patch.object(agent_module.config, 'getboolean', return_value=True) as getboolean:
+            self.assertTrue(Agent("test", "prompt.txt", None).parallel_execution)
+        getboolean.assert_called_once_with('MAIN', 'parallel_execution', fallback=False)
+        self.assertFalse(Agent("test", "prompt.txt", None, parallel_execution=False).parallel_execution)
+
+    def test_parallel_runs_tools_concurrently(self):
+        barrier = threading.Barrier(2)
+        self.agent.tools = {"python": RecordingTool("python", barrier), "go": RecordingTool("go", barrier)}
+        success, _ = self.agent.execute_modules(self.answer(("go", "second"), ("python", "first")), parallel=True)
+        self.assertTrue(success)
+        self.assertFalse(barrier.broken)
+        self.assertEqual([result.tool_type for result in self.agent.blocks_result], ["python", "go"])
+        self.assertEqual([result.feedback for result in self.agent.blocks_result], ["[python] first", "[go] second"])
+
+    def test_parallel_keeps_block_order_within_tool(self):
+        self.agent.tools = {"python": RecordingTool("python"), "go": RecordingTool("go")}
+        self.agent.execute_modules(self.answer(("python", "a"), ("go", "b"), ("python", "c")), parallel=True)
+        self.assertEqual([block.strip() for block in self.agent.tools["python"].executed], ["a", "c"])
+        self.assertEqual([result.feedback for result in self.agent.blocks_result], ["[python] a", "[python] c", "[go] b"])
+
+    def test_parallel_failure(self):
+        self.agent.tools = {"python": RecordingTool("python"), "go": RecordingTool("go")}
+        success, feedback = self.agent.execute_modules(self.answer(("python", "ok"), ("go", "fail"), ("go", "never")), parallel=True)
+        self.assertFalse(success)
+        self.assertEqual(feedback, "[go] fail")
+        self.assertNotIn("never", "".join(self.agent.tools["go"].executed))
+        self.assertFalse(self.agent.success)
+
+    def test_parallel_without_stop_on_failure(self):
+        self.agent.tools = {"python": RecordingTool("python")}
+        self.agent.tools["python"].independent_blocks = True
+        success, feedback = self.agent.execute_modules(self.answer(("python", "fail"), ("python", "ok")),
+                                                       parallel=True, stop_on_failure=False)
+        self.assertFalse(success)
+        self.assertEqual(feedback, "[python] fail")
+        self.assertEqual([result.success for result in self.agent.blocks_result], [False, True])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import asyncio
+import importlib.util
+import os, sys
+import tempfile
+import threading
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+import httpx
+from sources.memory import Memory
+from sources.interaction import Interaction
+import sources.agents, sources.browser, sources.llm_provider # imported before the app so they stay loaded
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+class FakeAgent:
+    def __init__(self, conversation_folder):
+        self.type = "casual_agent"
+        self.agent_name = "Jarvis"
+        self.success = True
+        self.memory = Memory("system prompt", memory_compression=False)
+        self.memory.conversation_folder = conversation_folder
+        self.llm = MagicMock()
+        self.llm.health_report.return_value = {}
+
+    async def process(self, prompt, speech):
+        return "answer", ""
+
+    def get_blocks_result(self):
+        return []
+
+class TestApiReadiness(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        modules = {"celery": MagicMock(), "aiofiles": MagicMock()}
+        # the background initialization is not started, the tests set the interaction of the app
+        with patch.dict(sys.modules, modules), patch.object(sys, "argv", ["api.py"]), patch.object(threading, "Thread"):
+            spec = importlib.util.spec_from_file_location("agenticseek_api", os.path.join(ROOT_DIR, "api.py"))
+            cls.api_module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(cls.api_module)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        with patch('sources.interaction.AgentRouter', MagicMock()):
+            self.interaction = Interaction([FakeAgent(self.tmpdir.name)], tts_enabled=False, stt_enabled=False)
+        self.interaction.router.readiness.return_value = {"language": "ready"}
+        self.interaction.router.is_ready.return_value = True
+        self.interaction.router.select_agent.return_value = self.interaction.agents[0]
+        patcher = patch.object(self.api_module, "interaction", self.interaction)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_requests(self, requests):
+        async def run():
+            transport = httpx.ASGITransport(app=self.api_module.api)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await requests(client)
+        return asyncio.run(run())
+
+    def test_query_rejected_while_loading(self):
+        """Test queries are answered with 503 while the routing models load, /health reports it"""
+        self.interaction.router.is_ready.return_value = False
+        self.interaction.router.readiness.return_value = {"language": "loading"}
+
+        async def requests(client):
+            return await client.post("/query", json={"query": "hello"}), await client.get("/health")
+        query, health = self.run_requests(requests)
+        self.assertEqual(query.status_code, 503)
+        self.assertEqual(health.status_code, 200)
+        self.assertFalse(health.json()["ready"])
+        self.interaction.router.select_agent.assert_not_called()
+
+    def test_health_answers_while_routing(self):
+        """Test /health is served while a query waits on the routing models"""
+        routing = threading.Event()
+        release = threading.Event()
+        released = []
+
+        def select_agent(query):
+            routing.set()
+            released.append(release.wait(5))
+            return self.interaction.agents[0]
+        self.interaction.router.select_agent.side_effect = select_agent
+
+        async def requests(client):
+            query = asyncio.ensure_future(client.post("/query", json={"query": "hello"}))
+            await asyncio.to_thread(routing.wait, 5)
+            try:
+                health = await asyncio.wait_for(client.get("/health"), timeout=2)
+            finally:
+                release.set()
+            return health, await query
+        health, query = self.run_requests(requests)
+        self.assertEqual(released, [True]) # /health answered before the routing was released
+        self.assertEqual(health.status_code, 200)
+        self.assertEqual(query.status_code, 200)
+        self.assertEqual(query.json()["answer"], "answer")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sources.tools.block_parser import parse_blocks, BlockStreamParser
+
+ANSWER = """Let me check the files first:
+```bash
+ls -la
+```
+Then save the script:
+```python:script.py
+print("hello")
+```
+Done."""
+
+class TestBlockParser(unittest.TestCase):
+    def test_blocks_in_order(self):
+        blocks = parse_blocks(ANSWER)
+        self.assertEqual([block.tag for block in blocks], ["bash", "python"])
+        self.assertEqual(blocks[0].content, "\nls -la\n")
+        self.assertIsNone(blocks[0].save_path)
+        self.assertEqual(blocks[1].save_path, "script.py")
+        self.assertEqual(blocks[1].content, 'print("hello")\n')
+        start, end = blocks[1].span
+        self.assertTrue(ANSWER[start:end].startswith("```python:script.py"))
+        self.assertTrue(ANSWER[start:end].endswith("```"))
+
+    def test_parse_is_cached(self):
+        self.assertIs(parse_blocks(ANSWER), parse_blocks(ANSWER))
+
+    def test_unclosed_block(self):
+        blocks = parse_blocks("Here:\n```python\nprint(1)")
+        self.assertEqual(len(blocks), 1)
+        self.assertFalse(blocks[0].closed)
+        self.assertEqual(blocks[0].tag, "python")
+
+    def test_indented_block(self):
+        blocks = parse_blocks("    ```python\n    def f():\n        return 1\n    ```")
+        self.assertEqual(blocks[0].content, "\ndef f():\n    return 1\n")
+
+    def test_stream_matches_full_parse(self):
+        parser = BlockStreamParser()
+        closed = []
+        for i in range(0, len(ANSWER), 5):
+            closed.extend(parser.feed(ANSWER[i:i + 5]))
+        closed.extend(parser.finish())
+        self.assertEqual(tuple(closed), parse_blocks(ANSWER))
+        self.assertIsNone(parser.pending_block())
+
+    def test_inline_fence_is_text(self):
+        blocks = parse_blocks("Use ``` fences.\n```python\nprint(1)\n```")
+        self.assertEqual([block.content for block in blocks], ['\nprint(1)\n'])
+
+    def test_block_nested_in_markdown(self):
+        answer = "```markdown\n# Usage\n```python\nprint(1)\n```\n```\nDone."
+        blocks = parse_blocks(answer)
+        self.assertEqual([block.tag for block in blocks], ["markdown", "python"])
+        self.assertEqual(blocks[1].content, '\nprint(1)\n')
+        self.assertTrue(all(block.closed for block in blocks))
+
+    def test_stream_waits_for_tag_after_fence(self):
+        parser = BlockStreamParser()
+        parser.feed("```markdown\n# Usage\n```")
+        self.assertEqual(parser.feed("python\nprint(1)\n"), [parser.blocks[0]])
+        self.assertEqual(parser.pending_block().tag, "python")
+        self.assertEqual(parser.feed("```"), [])
+        self.assertEqual([block.tag for block in parser.finish()], ["python"])
+
+    def test_stream_pending_block(self):
+        parser = BlockStreamParser()
+        self.assertEqual(parser.feed("text\n```py"), [])
+        self.assertEqual(parser.feed("thon\nx = 1\n``"), [])
+        self.assertEqual(parser.pending_block().tag, "python")
+        closed = parser.feed("`\nafter")
+        self.assertEqual([block.content for block in closed], ["\nx = 1\n"])
+
+if __name__ == '__main__':
+    unittest.main()
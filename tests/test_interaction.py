@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os, sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.memory import Memory
+from sources.interaction import Interaction
+
+class FakeAgent:
+    def __init__(self, agent_type, conversation_folder):
+        self.type = agent_type
+        self.agent_name = agent_type
+        self.memory = Memory("system prompt", memory_compression=False)
+        self.memory.conversation_folder = conversation_folder
+
+class TestInteractionSessions(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        patcher = patch('sources.interaction.AgentRouter', MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_interaction(self):
+        agents = [FakeAgent(agent_type, self.tmpdir.name) for agent_type in ["casual_agent", "code_agent"]]
+        return Interaction(agents, tts_enabled=False, stt_enabled=False)
+
+    def test_agents_share_session(self):
+        """Test the memories of all agents are saved under the session of the interaction"""
+        interaction = self.make_interaction()
+        self.assertEqual({agent.memory.session_id for agent in interaction.agents}, {interaction.session_id})
+        for agent in interaction.agents:
+            agent.memory.push("user", f"hello {agent.type}")
+        interaction.save_session()
+        sessions = interaction.list_sessions()
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0]['session_id'], interaction.session_id)
+        self.assertEqual(sorted(sessions[0]['agent_types']), ["casual_agent", "code_agent"])
+
+    def test_recover_session(self):
+        """Test a session is recovered by id in every agent and continued"""
+        first = self.make_interaction()
+        for agent in first.agents:
+            agent.memory.push("user", f"first {agent.type}")
+            agent.memory.push("assistant", "answer")
+        first.save_session()
+        second = self.make_interaction()
+        second.agents[0].memory.push("user", "second")
+        second.agents[0].memory.push("assistant", "answer")
+        second.save_session()
+
+        resumed = self.make_interaction()
+        self.assertTrue(resumed.load_last_session(first.session_id))
+        self.assertEqual(resumed.session_id, first.session_id)
+        self.assertEqual([agent.memory.memory[1]['content'] for agent in resumed.agents],
+                         ["first casual_agent", "first code_agent"])
+        self.assertFalse(self.make_interaction().load_last_session("unknown"))
+
+        last = self.make_interaction()
+        self.assertTrue(last.load_last_session())
+        self.assertEqual(last.session_id, second.session_id)
+
+class TestInteractionRouting(unittest.TestCase):
+    def test_router_options(self):
+        """Test the routing options are given to the router"""
+        with patch('sources.interaction.AgentRouter') as router:
+            Interaction([], tts_enabled=False, stt_enabled=False, langs=["en"],
+                        routing_engine="knn", router_confidence_threshold=0.5, routing_cache_size=0)
+        router.assert_called_once_with([], supported_language=["en"], routing_engine="knn",
+                                       router_confidence_threshold=0.5, cache_size=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import time
+from unittest.mock import patch, MagicMock
+import os, sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.language import LanguageUtility
+
+def fake_translator(lang):
+    tokenizer = MagicMock(side_effect=lambda texts, **kwargs: {"input_ids": texts})
+    tokenizer.batch_decode.side_effect = lambda ids, skip_special_tokens: [f"translated from {lang}"] * len(ids)
+    model = MagicMock()
+    model.generate.side_effect = lambda input_ids: [[0]] * len(input_ids)
+    return tokenizer, model
+
+class TestLanguageUtility(unittest.TestCase):
+    def setUp(self):
+        transformers = MagicMock()
+        transformers.MarianTokenizer.from_pretrained.side_effect = lambda name: fake_translator(name)[0]
+        transformers.MarianMTModel.from_pretrained.side_effect = lambda name: fake_translator(name)[1]
+        self.model_loader = transformers.MarianMTModel.from_pretrained
+        self.patch = patch.dict(sys.modules, {"transformers": transformers})
+        self.patch.start()
+        self.language = LanguageUtility(["en", "fr", "zh"], translator_idle_timeout=60, translation_cache_size=2)
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def test_translators_loaded_on_first_use(self):
+        self.assertEqual(self.language.translators, {})
+        self.language.translate("bonjour", "fr")
+        self.language.translate("salut", "fr")
+        self.assertEqual(list(self.language.translators), ["fr"])
+        self.assertEqual(self.model_loader.call_count, 1)
+
+    def test_translation_cache(self):
+        self.assertEqual(self.language.translate("bonjour", "fr"), "translated from Helsinki-NLP/opus-mt-fr-en")
+        _, model = self.language.translators["fr"]
+        self.language.translate("bonjour", "fr")
+        self.assertEqual(model.generate.call_count, 1)
+        self.language.translate("salut", "fr")
+        self.language.translate("merci", "fr")
+        self.assertNotIn(("fr", "bonjour"), self.language.translation_cache)
+
+    def test_idle_translators_evicted(self):
+        self.language.translate("bonjour", "fr")
+        with patch('sources.language.time.time', return_value=time.time() + 120):
+            self.language.translate("你好", "zh")
+        self.assertEqual(list(self.language.translators), ["zh"])
+
+    def test_idle_translators_evicted_on_english_queries(self):
+        self.language.translate("bonjour", "fr")
+        with patch('sources.language.time.time', return_value=time.time() + 120):
+            self.language.detect_language("hello there")
+        self.assertEqual(self.language.translators, {})
+        self.language.translate("salut", "fr")
+        self.assertEqual(list(self.language.translators), ["fr"])
+        with patch('sources.language.time.time', return_value=time.time() + 120):
+            self.language.translate("hello there", "en")
+        self.assertEqual(self.language.translators, {})
+
+    def test_translate_batch(self):
+        texts = ["bonjour", "hello", "你好", "bonjour", "salut"]
+        translations = self.language.translate_batch(texts, ["fr", "en", "zh", "fr", "fr"])
+        self.assertEqual(translations[1], "hello")
+        self.assertEqual(translations[0], translations[3])
+        self.assertTrue(translations[2].endswith("zh-en"))
+        _, model = self.language.translators["fr"]
+        self.assertEqual(model.generate.call_count, 1)
+        self.assertEqual(self.language.translators["fr"][0].call_args[0][0], ["bonjour", "salut"])
+
+    def test_english_and_unsupported_not_translated(self):
+        self.assertEqual(self.language.translate("hello", "en"), "hello")
+        self.assertEqual(self.language.translate("hola", "es"), "hola")
+        self.assertEqual(self.language.translators, {})
+
+if __name__ == '__main__':
+    unittest.main()
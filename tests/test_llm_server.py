@@ -0,0 +1,256 @@
+import unittest
+import importlib
+import importlib.util
+import json
+import os, sys
+import tempfile
+import threading
+import types
+from unittest.mock import patch, MagicMock
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'llm_server'))
+
+def server_sources(name: str) -> types.ModuleType:
+    """Package of llm_server/sources under a name that does not clash with the agent sources package."""
+    package = types.ModuleType(name)
+    package.__path__ = [os.path.join(SERVER_DIR, 'sources')]
+    return package
+
+sys.modules["llm_server_sources"] = server_sources("llm_server_sources")
+generator_module = importlib.import_module("llm_server_sources.generator")
+cache_module = importlib.import_module("llm_server_sources.cache")
+
+class FakeLLM(generator_module.GeneratorLLM):
+    """Generator streaming a fixed answer, each generation waits for its release event."""
+    def __init__(self, **kwargs):
+        super().__init__(use_cache=False, **kwargs)
+        self.set_model("fake-model")
+        self.started = []
+        self.models = {}
+        self.releases = {}
+
+    def generate_stream(self, history, model):
+        name = history[-1]['content']
+        self.started.append(name)
+        self.models[name] = model
+        self.releases.setdefault(name, threading.Event()).wait(5)
+        for token in ["Hello", " world", "."]:
+            yield token
+
+    def release(self, name):
+        self.releases.setdefault(name, threading.Event()).set()
+
+def message(content):
+    return [{"role": "user", "content": content}]
+
+def wait_done(generator, request_id):
+    for _ in range(500):
+        if not generator.get_status(request_id)["is_generating"]:
+            return
+        threading.Event().wait(0.01)
+    raise TimeoutError(request_id)
+
+class TestGenerationAdmission(unittest.TestCase):
+    def test_fifo_admission(self):
+        """Test queued requests are started in arrival order once a worker is free"""
+        generator = FakeLLM(max_workers=1, max_queue_size=4)
+        ids = [generator.start(message(name)) for name in ["a", "b", "c"]]
+        self.assertTrue(generator.get_status(ids[2])["is_queued"])
+        for name in ["a", "b", "c"]:
+            generator.release(name)
+        for request_id in ids:
+            wait_done(generator, request_id)
+        self.assertEqual(generator.started, ["a", "b", "c"])
+        self.assertEqual(generator.get_status(ids[0])["sentence"], "Hello world.")
+
+    def test_queue_full(self):
+        """Test requests past the workers and queue slots are rejected"""
+        generator = FakeLLM(max_workers=1, max_queue_size=1)
+        first = generator.start(message("a"))
+        second = generator.start(message("b"))
+        self.assertIsNone(generator.start(message("c")))
+        generator.release("a")
+        generator.release("b")
+        wait_done(generator, first)
+        wait_done(generator, second)
+        self.assertIsNotNone(generator.start(message("c")))
+        generator.release("c")
+
+    def test_cancel(self):
+        """Test a cancelled generation stops before generating"""
+        generator = FakeLLM(max_workers=1, max_queue_size=1)
+        request_id = generator.start(message("a"))
+        self.assertTrue(generator.cancel(request_id))
+        generator.release("a")
+        wait_done(generator, request_id)
+        status = generator.get_status(request_id)
+        self.assertTrue(status["is_cancelled"])
+        self.assertEqual(status["sentence"], "")
+        self.assertFalse(generator.cancel("unknown"))
+
+    def test_stream(self):
+        """Test a streamed generation yields its chunks and goes through the admission queue"""
+        generator = FakeLLM(max_workers=1, max_queue_size=0)
+        request_id = generator.start(message("a"), stream=True)
+        self.assertIsNone(generator.start(message("b"), stream=True))
+        generator.release("a")
+        self.assertEqual(list(generator.stream(request_id)), ["Hello", " world", "."])
+
+    def test_model_fixed_at_admission(self):
+        """Test concurrent requests generate and cache with the model set when they were admitted"""
+        generator = FakeLLM(max_workers=2, max_queue_size=2)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        generator.cache = cache_module.Cache(cache_dir=tmpdir.name)
+        self.addCleanup(generator.cache.db.close)
+        first = generator.start(message("a"))
+        generator.set_model("other-model")
+        second = generator.start(message("b"))
+        third = generator.start(message("c"), model="third-model")
+        for name in ["a", "b", "c"]:
+            generator.release(name)
+        for request_id in [first, second, third]:
+            wait_done(generator, request_id)
+        self.assertEqual(generator.models, {"a": "fake-model", "b": "other-model", "c": "third-model"})
+        self.assertEqual(generator.get_status(first)["model"], "fake-model")
+        self.assertEqual(generator.cache.get(cache_module.Cache.make_key("fake-model", message("a"))), "Hello world.")
+        self.assertEqual(generator.cache.get(cache_module.Cache.make_key("other-model", message("b"))), "Hello world.")
+        self.assertIsNone(generator.cache.get(cache_module.Cache.make_key("other-model", message("a"))))
+
+    def test_stream_closed_early_cancels(self):
+        """Test a stream closed by its client cancels the generation"""
+        generator = FakeLLM(max_workers=1, max_queue_size=0)
+        request_id = generator.start(message("a"), stream=True)
+        chunks = generator.stream(request_id)
+        generator.release("a")
+        self.assertEqual(next(chunks), "Hello")
+        chunks.close()
+        self.assertTrue(generator.get_status(request_id)["is_cancelled"])
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def make_cache(self, **kwargs):
+        cache = cache_module.Cache(cache_dir=self.tmpdir.name, **kwargs)
+        self.addCleanup(cache.db.close)
+        return cache
+
+    def test_make_key_stable(self):
+        """Test keys only depend on the model, roles and stripped contents"""
+        history = [{"role": "user", "content": "hello "}]
+        key = cache_module.Cache.make_key("model", history)
+        self.assertEqual(key, cache_module.Cache.make_key("model", [{"role": "user", "content": "hello", "timestamp": 1}]))
+        self.assertNotEqual(key, cache_module.Cache.make_key("other", history))
+        self.assertNotEqual(key, cache_module.Cache.make_key("model", [{"role": "assistant", "content": "hello"}]))
+        self.assertEqual(len(key), 64)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entries leave memory but stay on disk"""
+        cache = self.make_cache(max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")
+        cache.put("c", "3")
+        self.assertEqual(list(cache.lru), ["a", "c"])
+        self.assertEqual(cache.get("b"), "2")
+        self.assertEqual(cache.stats()["disk_entries"], 3)
+
+    def test_ttl_expiry(self):
+        """Test expired entries are misses and are pruned from disk"""
+        cache = self.make_cache(ttl=10)
+        with patch.object(cache_module.time, "time", return_value=1000.0):
+            cache.put("a", "1")
+        with patch.object(cache_module.time, "time", return_value=1005.0):
+            self.assertEqual(cache.get("a"), "1")
+        with patch.object(cache_module.time, "time", return_value=1011.0):
+            self.assertIsNone(cache.get("a"))
+            cache.prune()
+        self.assertEqual(cache.stats()["disk_entries"], 0)
+
+    def test_persistence(self):
+        """Test entries are read back by a new cache on the same file"""
+        self.make_cache().put("a", "1")
+        cache = self.make_cache()
+        self.assertEqual(cache.get("a"), "1")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_failed_and_empty_generations_not_cached(self):
+        """Test only complete non-empty generations are cached"""
+        generator = FakeLLM()
+        generator.cache = self.make_cache()
+        answers = {"empty": [], "fail": None, "ok": ["Hi"]}
+
+        def generate_stream(history, model):
+            answer = answers[history[-1]['content']]
+            if answer is None:
+                yield "partial"
+                raise Exception("backend error")
+            yield from answer
+        generator.generate_stream = generate_stream
+        self.assertEqual(list(generator.generate_cached(message("empty"), "fake-model")), [])
+        with self.assertRaises(Exception):
+            list(generator.generate_cached(message("fail"), "fake-model"))
+        self.assertEqual(list(generator.generate_cached(message("ok"), "fake-model")), ["Hi"])
+        self.assertEqual(generator.cache.stats()["disk_entries"], 1)
+
+class TestServerRoutes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            import flask
+        except ImportError:
+            raise unittest.SkipTest("flask is not installed")
+        modules = {"sources": server_sources("sources"), "llama_cpp": MagicMock(), "ollama": MagicMock()}
+        argv = ["app.py", "--provider", "ollama", "--port", "0", "--workers", "1", "--max_queue", "0", "--no_cache"]
+        with patch.dict(sys.modules, modules), patch.object(sys, "argv", argv):
+            for name in [name for name in sys.modules if name.startswith("sources.")]:
+                del sys.modules[name]
+            spec = importlib.util.spec_from_file_location("llm_server_app", os.path.join(SERVER_DIR, "app.py"))
+            cls.app_module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(cls.app_module)
+
+    def setUp(self):
+        self.generator = self.app_module.generator
+        self.release = threading.Event()
+        release = self.release
+        self.models = []
+
+        def generate_stream(history, model):
+            self.models.append(model)
+            release.wait(5)
+            yield "Hi"
+        self.generator.generate_stream = generate_stream
+        self.generator.set_model("fake-model")
+        self.client = self.app_module.app.test_client()
+
+    def tearDown(self):
+        self.release.set()
+        self.generator.executor.submit(lambda: None).result() # wait for the running generation
+
+    def test_stream_queue_full(self):
+        """Test /generate_stream is rejected with 429 while the workers are busy"""
+        response = self.client.post('/generate', json={"messages": message("a")})
+        self.assertEqual(response.status_code, 202)
+        response = self.client.post('/generate_stream', json={"messages": message("b")})
+        self.assertEqual(response.status_code, 429)
+
+    def test_stream_events(self):
+        """Test /generate_stream sends the request id, the tokens and the end event"""
+        self.release.set()
+        response = self.client.post('/generate_stream', json={"messages": message("a")})
+        events = [line[len("data: "):] for line in response.get_data(as_text=True).split("\n") if line.startswith("data: ")]
+        self.assertIn("id", json.loads(events[0]))
+        self.assertEqual(json.loads(events[1]), {"token": "Hi"})
+        self.assertEqual(events[-1], "[DONE]")
+
+    def test_stream_request_model(self):
+        """Test the model given with a /generate_stream request is used instead of the /setup one"""
+        self.release.set()
+        response = self.client.post('/generate_stream', json={"messages": message("a"), "model": "request-model"})
+        response.get_data()
+        self.assertEqual(self.models, ["request-model"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@ import os
 import sys
 import json
 import datetime
+from unittest.mock import MagicMock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
 from sources.memory import Memory
@@ -35,7 +36,7 @@ class TestMemory(unittest.TestCase):
     def test_get_filename(self):
         filename = self.memory.get_filename()
         self.assertTrue(filename.startswith("memory_"))
-        self.assertTrue(filename.endswith(".txt"))
+        self.assertTrue(filename.endswith(".jsonl"))
         self.assertIn(self.memory.session_time.strftime('%Y-%m-%d'), filename)
 
     def test_save_memory(self):
@@ -79,6 +80,101 @@ class TestMemory(unittest.TestCase):
         self.memory.reset(new_memory)
         self.assertEqual(self.memory.memory, new_memory)
 
+    def test_token_count_running_total(self):
+        self.memory.push("user", "Hello there")
+        self.memory.push("assistant", "Hi, how can I help?")
+        expected = sum(self.memory.count_tokens(message['content']) for message in self.memory.memory)
+        self.assertEqual(self.memory.total_tokens, expected)
+        self.memory.clear_section(0, 0)
+        expected = sum(self.memory.count_tokens(message['content']) for message in self.memory.memory)
+        self.assertEqual(self.memory.total_tokens, expected)
+        self.memory.clear()
+        self.assertEqual(self.memory.total_tokens, self.memory.count_tokens(self.system_prompt))
+
+    def test_get_within_budget(self):
+        self.memory.push("user", "old message " * 50)
+        self.memory.push("assistant", "old answer " * 50)
+        self.memory.push("user", "new question")
+        budget = self.memory.token_counts[0] + self.memory.token_counts[-1] + 1
+        messages = self.memory.get_within_budget(max_tokens=budget)
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0]['role'], "system")
+        self.assertEqual(messages[1]['content'], "new question")
+        self.assertEqual(len(self.memory.get_within_budget(max_tokens=100000)), 4)
+
+    def test_trim_text_to_max_ctx(self):
+        ideal_ctx = self.memory.get_ideal_ctx(self.memory.model_provider)
+        text = "word " * (ideal_ctx * 2)
+        trimmed = self.memory.trim_text_to_max_ctx(text)
+        self.assertLessEqual(self.memory.count_tokens(trimmed), ideal_ctx)
+
+    def test_trim_text_to_token_budget(self):
+        ideal_ctx = self.memory.get_ideal_ctx(self.memory.model_provider)
+        while self.memory.total_tokens < ideal_ctx // 2:
+            self.memory.push("user", "old message " * 50)
+            self.memory.push("assistant", "old answer " * 50)
+        trimmed = self.memory.trim_text_to_max_ctx("word " * (ideal_ctx * 2), reserve=256)
+        self.assertGreater(self.memory.count_tokens(trimmed), 0)
+        self.assertLessEqual(self.memory.total_tokens + self.memory.count_tokens(trimmed) + 256, ideal_ctx)
+        self.memory.push("user", "old message " * ideal_ctx)
+        self.assertEqual(self.memory.trim_text_to_max_ctx("word " * 100), "")
+
+    def test_background_compression(self):
+        memory = Memory(self.system_prompt, memory_compression=True, model_provider="test-1b")
+        memory.download_model = lambda: None
+        calls = []
+        def fake_summarize_batch(texts, min_length=64):
+            calls.extend(texts)
+            return ["short summary" for _ in texts]
+        memory.summarize_batch = fake_summarize_batch
+        long_text = "long answer " * 200
+        memory.push("user", "Hello")
+        memory.push("assistant", long_text)
+        memory.push("user", long_text)
+        memory.compression_executor.submit(lambda: None).result() # wait for the worker queue
+        self.assertEqual(len(calls), 1) # same text summarized once
+        self.assertEqual(memory.memory[2]['content'], long_text) # not swapped before the next LLM call
+        messages = memory.get_within_budget(max_tokens=100)
+        self.assertEqual(memory.memory[2]['content'], "short summary")
+        self.assertEqual(memory.memory[3]['content'], "short summary")
+        self.assertEqual(memory.total_tokens, sum(memory.count_tokens(m['content']) for m in memory.memory))
+        self.assertEqual(messages[-1]['content'], "short summary")
+
+    def fake_compression(self, memory):
+        memory.download_model = lambda: None
+        memory.summarize_batch = lambda texts, min_length=64: ["short summary" for _ in texts]
+        return memory
+
+    def test_summaries_applied_without_context_size(self):
+        memory = self.fake_compression(Memory(self.system_prompt, memory_compression=True, model_provider="deepseek-chat"))
+        self.assertIsNone(memory.get_ideal_ctx(memory.model_provider))
+        memory.push("user", "Hello")
+        memory.push("assistant", "long answer " * 200)
+        memory.compression_executor.submit(lambda: None).result()
+        self.assertEqual(memory.get_within_budget()[-1]['content'], "short summary")
+
+    def test_recovered_session_compressed(self):
+        self.memory.push("user", "Hello")
+        self.memory.push("assistant", "long answer " * 200)
+        self.memory.save_memory()
+        memory = self.fake_compression(Memory(self.system_prompt, memory_compression=True, model_provider="deepseek-chat"))
+        memory.load_memory()
+        memory.compression_executor.submit(lambda: None).result()
+        self.assertEqual(memory.get_within_budget()[-1]['content'], "short summary")
+
+    def test_summarize_batch_buckets(self):
+        memory = Memory(self.system_prompt, memory_compression=False, summary_beams=1, summary_batch_size=2)
+        memory.tokenizer = MagicMock()
+        memory.tokenizer.side_effect = lambda texts, **kwargs: {'input_ids': texts, 'attention_mask': None}
+        memory.tokenizer.batch_decode.side_effect = lambda ids, **kwargs: [f"summary of {len(text)}" for text in ids]
+        memory.model = MagicMock()
+        memory.model.generate.side_effect = lambda input_ids, **kwargs: input_ids
+        texts = ["a" * 500, "short", "b" * 300, "c" * 400]
+        summaries = memory.summarize_batch(texts)
+        self.assertEqual(memory.model.generate.call_count, 2) # 3 long texts in buckets of 2
+        self.assertEqual(memory.model.generate.call_args.kwargs['num_beams'], 1)
+        self.assertEqual(summaries, ["summary of 511", "short", "summary of 311", "summary of 411"])
+
     def test_save_and_load_memory(self):
         self.memory.push("user", "Hello")
         self.memory.push("assistant", "Hi")
@@ -89,5 +185,56 @@ class TestMemory(unittest.TestCase):
         self.assertEqual(len(new_memory.memory), 3)  # System + messages
         self.assertEqual(new_memory.memory[1]['content'], "Hello")
 
+    def read_journal(self):
+        path = os.path.join(self.memory.conversation_folder, "casual_agent", self.memory.get_filename())
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_journal_appends_new_messages(self):
+        self.memory.push("user", "Hello")
+        self.memory.save_memory()
+        self.memory.push("assistant", "Hi")
+        self.memory.save_memory()
+        self.memory.save_memory()
+        records = self.read_journal()
+        self.assertEqual([record['op'] for record in records], ['replace', 'append'])
+        self.assertEqual(records[1]['message']['content'], "Hi")
+        self.memory.clear_section(0, 0)
+        self.memory.save_memory()
+        path = os.path.join(self.memory.conversation_folder, "casual_agent", self.memory.get_filename())
+        self.assertEqual(self.memory.replay_journal(path), self.memory.memory)
+        self.assertEqual(len(self.memory.memory), 2)
+
+    def test_journal_compaction(self):
+        memory = Memory(self.system_prompt, memory_compression=False, journal_compact_after=3)
+        for i in range(5):
+            memory.push("user", f"message {i}")
+            memory.save_memory()
+        self.memory = memory
+        records = self.read_journal()
+        self.assertLessEqual(len(records), 3)
+        path = os.path.join(memory.conversation_folder, "casual_agent", memory.get_filename())
+        self.assertEqual(memory.replay_journal(path), memory.memory)
+
+    def test_session_index_recovery_by_id(self):
+        self.memory.push("user", "Hello")
+        self.memory.push("assistant", "Hi")
+        self.memory.save_memory()
+        other = Memory(self.system_prompt, memory_compression=False)
+        other.session_time = self.memory.session_time + datetime.timedelta(seconds=1)
+        other.push("user", "Other session")
+        other.push("assistant", "Other answer")
+        other.save_memory()
+
+        sessions = self.memory.list_sessions()
+        self.assertEqual([session['session_id'] for session in sessions], [other.session_id, self.memory.session_id])
+        self.assertEqual(sessions[1]['message_count'], 3)
+        last = Memory(self.system_prompt, memory_compression=False)
+        last.load_memory()
+        self.assertEqual(last.memory[-1]['content'], "Other answer")
+        by_id = Memory(self.system_prompt, memory_compression=False)
+        by_id.load_memory(session_id=self.memory.session_id)
+        self.assertEqual([m['content'] for m in by_id.memory[1:]], ["Hello", "Hi"])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import patch
+import os, sys
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources import model_profile
+from sources.model_profile import optimize_model, get_model_profile, get_summary_settings
+
+class TestModelProfile(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = torch.nn.Sequential(torch.nn.Linear(64, 64), torch.nn.ReLU(), torch.nn.Linear(64, 4))
+        self.patch = patch.object(model_profile, 'configure_threads')
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def test_default_profile_keeps_model(self):
+        self.assertIs(optimize_model(self.model, "default"), self.model)
+
+    def test_cpu_optimized_quantizes_linear_layers(self):
+        inputs = torch.randn(8, 64)
+        baseline = self.model(inputs)
+        quantized = optimize_model(self.model, "cpu-optimized")
+        self.assertNotIsInstance(quantized[0], torch.nn.Linear)
+        self.assertTrue(torch.equal(quantized(inputs).argmax(dim=1), baseline.argmax(dim=1)))
+
+    def test_unknown_profile_falls_back_to_default(self):
+        with patch.object(model_profile.config, 'get', return_value="gpu-turbo"):
+            self.assertEqual(get_model_profile(), "default")
+
+    def test_summary_settings_follow_profile(self):
+        with patch.object(model_profile, 'get_model_profile', return_value="cpu-optimized"):
+            self.assertEqual(get_summary_settings()["summary_beams"], 1)
+        with patch.object(model_profile, 'get_model_profile', return_value="default"):
+            self.assertEqual(get_summary_settings(), {"summary_beams": 4, "summary_batch_size": 8})
+
+if __name__ == '__main__':
+    unittest.main()
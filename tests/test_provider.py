@@ -1,14 +1,18 @@
 import unittest
+import asyncio
 from unittest.mock import patch, MagicMock
 import os, sys
 import socket
 import subprocess
 from urllib.parse import urlparse
 import platform
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
 
 from sources.llm_provider import Provider
+from sources.health import HealthMonitor
 
 class TestIsIpOnline(unittest.TestCase):
     def setUp(self):
@@ -47,7 +51,7 @@ class TestIsIpOnline(unittest.TestCase):
         for ip in google_ips:
             with self.subTest(ip=ip), \
                  patch('socket.gethostbyname', return_value=ip), \
-                 patch('subprocess.run', return_value=MagicMock(returncode=0)):
+                 patch('socket.create_connection', return_value=MagicMock()):
                 result = self.checker.is_ip_online(ip)
                 self.assertTrue(result)
 
@@ -62,9 +66,246 @@ class TestIsIpOnline(unittest.TestCase):
         """Test with valid domain name"""
         address = "google.com"
         with patch('socket.gethostbyname', return_value="142.250.190.78"), \
-             patch('subprocess.run', return_value=MagicMock(returncode=0)):
+             patch('socket.create_connection', return_value=MagicMock()):
             result = self.checker.is_ip_online(address)
             self.assertTrue(result)
 
+class TestHealthMonitor(unittest.TestCase):
+    def test_cached_status(self):
+        """Test lookups use the cached probe result instead of probing"""
+        monitor = HealthMonitor(ttl=60)
+        with patch('socket.create_connection', side_effect=OSError("refused")):
+            monitor.refresh("10.0.0.1:11434")
+        with patch('socket.create_connection') as create_connection:
+            self.assertFalse(monitor.is_online("10.0.0.1:11434"))
+            create_connection.assert_not_called()
+        monitor.stop()
+
+    def test_shared_monitor(self):
+        """Test providers share one monitor and only local backends are watched"""
+        local = Provider("ollama", "test-model")
+        self.assertIs(local.health, Provider("test", "test-model").health)
+        monitor = HealthMonitor(background=False)
+        cloud = Provider("huggingface", "test-model", health_monitor=monitor)
+        self.assertTrue(cloud.check_backend_online())
+        self.assertEqual(monitor.addresses, set())
+        server = Provider("server", "test-model", "127.0.0.1:3333", health_monitor=monitor)
+        self.assertTrue(server.check_backend_online())
+        self.assertEqual(monitor.addresses, {"127.0.0.1:3333"})
+        self.assertIsNone(monitor.thread)
+
+    def test_parse_address(self):
+        """Test the probed port is taken from the address or its scheme"""
+        self.assertEqual(HealthMonitor.parse_address("127.0.0.1:11434"), ("127.0.0.1", 11434))
+        self.assertEqual(HealthMonitor.parse_address("https://api.openai.com"), ("api.openai.com", 443))
+
+class TestRespondStream(unittest.TestCase):
+    def test_non_streaming_provider(self):
+        """Test providers without streaming yield their whole answer"""
+        provider = Provider("test", "test-model")
+        chunks = list(provider.respond_stream([{"role": "user", "content": "hi"}], verbose=False))
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("plan", chunks[0])
+
+    def test_server_stream(self):
+        """Test server-sent events are parsed into chunks"""
+        provider = Provider("server", "test-model", "http://127.0.0.1:3333", health_monitor=HealthMonitor(background=False))
+        stream_response = MagicMock()
+        stream_response.__enter__.return_value.iter_lines.return_value = [
+            'data: {"id": "1234"}', 'data: {"token": "Hello"}', '', 'data: {"token": " world"}', 'data: [DONE]'
+        ]
+        with patch('requests.Session.post', side_effect=[MagicMock(), stream_response]):
+            chunks = list(provider.respond_stream([{"role": "user", "content": "hi"}], verbose=False))
+        self.assertEqual(chunks, ["Hello", " world"])
+
+class TestRespondAsync(unittest.TestCase):
+    def test_fallback_to_sync_provider(self):
+        """Test providers without async implementation yield their whole answer"""
+        provider = Provider("test", "test-model")
+
+        async def collect():
+            return [chunk async for chunk in provider.respond_async([{"role": "user", "content": "hi"}], verbose=False)]
+        chunks = asyncio.run(collect())
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("plan", chunks[0])
+
+    def test_cancel_closes_upstream(self):
+        """Test cancelling the consumer closes the upstream stream"""
+        provider = Provider("test", "test-model")
+        upstream_closed = asyncio.Event()
+
+        async def slow_stream(history, verbose):
+            try:
+                while True:
+                    yield "token "
+                    await asyncio.sleep(0.01)
+            finally:
+                upstream_closed.set()
+        provider.async_stream_providers["test"] = slow_stream
+
+        async def consume():
+            async for _ in provider.respond_async([], verbose=False):
+                pass
+
+        async def run():
+            task = asyncio.ensure_future(consume())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return upstream_closed.is_set()
+        self.assertTrue(asyncio.run(run()))
+
+class TestLoadBalancing(unittest.TestCase):
+    def setUp(self):
+        self.provider = Provider("test", "test-model", "10.0.0.1:3333, 10.0.0.2:3333")
+        self.first, self.second = self.provider.balancer.nodes
+
+    def test_failover(self):
+        """Test a failing node is put aside and the request retried on the next node"""
+        self.first.provider.available_providers["test"] = MagicMock(side_effect=Exception("Connection reset"))
+        self.second.provider.available_providers["test"] = MagicMock(return_value="answer")
+        self.assertEqual(self.provider.respond([], verbose=False), "answer")
+        self.assertFalse(self.first.is_healthy())
+        self.assertEqual(self.first.failures, 1)
+        self.assertEqual(self.provider.balancer.ranked()[0], self.second)
+
+    def test_stream_failover(self):
+        """Test streaming fails over before any chunk was yielded"""
+        self.first.provider.available_providers["test"] = MagicMock(side_effect=Exception("Connection reset"))
+        chunks = list(self.provider.respond_stream([], verbose=False))
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("plan", chunks[0])
+
+    def test_least_outstanding(self):
+        """Test nodes with less outstanding requests are tried first"""
+        self.provider.balancer.acquire(self.first)
+        self.assertEqual(self.provider.balancer.ranked()[0], self.second)
+        self.provider.balancer.release(self.first)
+        self.assertEqual(self.first.outstanding, 0)
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """Minimal llm_server answering every generation with a single token."""
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'data: {"token": "answer"}\n\ndata: [DONE]\n\n' if self.path == "/generate_stream" else b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class TestServerPool(unittest.TestCase):
+    def make_provider(self, addresses):
+        return Provider("server", "test-model", ",".join(addresses), request_timeout=5,
+                        health_monitor=HealthMonitor(background=False))
+
+    def test_unreachable_nodes_fail(self):
+        """Test unreachable server nodes are counted as failures, not as fast answers"""
+        provider = self.make_provider([f"http://127.0.0.1:{closed_port()}" for _ in range(2)])
+        self.assertIn("seem offline", provider.respond([], verbose=False))
+        for node in provider.balancer.report():
+            self.assertEqual((node["failures"], node["healthy"]), (1, False))
+
+    def test_failover_to_live_node(self):
+        """Test requests fail over from an unreachable node to a live one, streaming or not"""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StreamHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        dead, live = f"http://127.0.0.1:{closed_port()}", f"http://127.0.0.1:{server.server_port}"
+        provider = self.make_provider([dead, live])
+        self.assertEqual(provider.respond([], verbose=False), "answer")
+        self.assertEqual(list(provider.respond_stream([], verbose=False)), ["answer"])
+        dead_node, live_node = provider.balancer.nodes
+        self.assertEqual(dead_node.failures, 1)
+        self.assertFalse(dead_node.is_healthy())
+        self.assertTrue(live_node.is_healthy())
+        self.assertIsNotNone(live_node.latency_ewma)
+
+    def test_empty_answer_fails_over(self):
+        """Test a node giving an empty answer is put aside"""
+        provider = Provider("test", "test-model", "10.0.0.1:3333, 10.0.0.2:3333")
+        first, second = provider.balancer.nodes
+        first.provider.available_providers["test"] = MagicMock(return_value="")
+        second.provider.available_providers["test"] = MagicMock(return_value="answer")
+        self.assertEqual(provider.respond([], verbose=False), "answer")
+        self.assertEqual(first.failures, 1)
+
+class TestNodeAddresses(unittest.TestCase):
+    def test_local_ollama_nodes(self):
+        """Test each node of a local ollama pool is reached at its own address"""
+        with patch.dict(os.environ, {"DOCKER_INTERNAL_URL": ""}):
+            provider = Provider("ollama", "test-model", "10.0.0.1:11434,10.0.0.2:11434", is_local=True,
+                                health_monitor=HealthMonitor(background=False))
+        self.assertEqual([node.provider.get_ollama_host() for node in provider.balancer.nodes],
+                         ["http://10.0.0.1:11434", "http://10.0.0.2:11434"])
+
+    def test_docker_ollama_port(self):
+        """Test a local ollama in docker is reached through the internal url on the configured port"""
+        with patch.dict(os.environ, {"DOCKER_INTERNAL_URL": "http://host.docker.internal"}):
+            provider = Provider("ollama", "test-model", "127.0.0.1:11500", is_local=True,
+                                health_monitor=HealthMonitor(background=False))
+        self.assertEqual(provider.get_ollama_host(), "http://host.docker.internal:11500")
+
+class TestClientPool(unittest.TestCase):
+    def test_client_created_once(self):
+        """Test clients are created lazily and reused"""
+        provider = Provider("test", "test-model")
+        factory = MagicMock(side_effect=lambda: object())
+        first = provider.get_client("backend", factory)
+        second = provider.get_client("backend", factory)
+        self.assertIs(first, second)
+        factory.assert_called_once()
+
+    def test_openai_client_per_base_url(self):
+        """Test OpenAI compatible backends get one client per base url"""
+        provider = Provider("test", "test-model")
+        provider.api_key = "key"
+        deepseek = provider.get_openai_client("https://api.deepseek.com")
+        self.assertIs(deepseek, provider.get_openai_client("https://api.deepseek.com"))
+        self.assertIsNot(deepseek, provider.get_openai_client("https://openrouter.ai/api/v1"))
+        provider.close()
+        self.assertEqual(provider.clients, {})
+
+    def test_lm_studio_without_api_key(self):
+        """Test local OpenAI compatible servers get a client without an API key set"""
+        provider = Provider("lm-studio", "test-model", "127.0.0.1:1234", health_monitor=HealthMonitor(background=False))
+        with patch.dict(os.environ, {}, clear=True):
+            client = provider.get_openai_client(provider.get_openai_base_url())
+
+            async def get_async_client():
+                return provider.get_async_openai_client(provider.get_openai_base_url())
+            async_client = asyncio.run(get_async_client())
+        self.assertEqual(client.api_key, "not-needed")
+        self.assertEqual(async_client.api_key, "not-needed")
+        provider.close()
+
+    def test_async_clients_per_event_loop(self):
+        """Test async clients are created for each event loop and closed on their loop"""
+        provider = Provider("test", "test-model")
+
+        async def get_client():
+            return provider.get_async_client("async-http", provider.make_async_http_client)
+        first_loop, second_loop = asyncio.new_event_loop(), asyncio.new_event_loop()
+        self.addCleanup(first_loop.close)
+        self.addCleanup(second_loop.close)
+        first = first_loop.run_until_complete(get_client())
+        self.assertIs(first, first_loop.run_until_complete(get_client()))
+        second = second_loop.run_until_complete(get_client())
+        self.assertIsNot(first, second)
+        provider.close()
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+        self.assertEqual(len(provider.async_clients), 0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
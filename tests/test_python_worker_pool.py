@@ -0,0 +1,74 @@
+import unittest
+import time
+import threading
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sources.tools.python_worker_pool import PythonWorkerPool
+
+@unittest.skipUnless(os.name == "posix", "worker limits need a POSIX system")
+class TestPythonWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = PythonWorkerPool(size=2, max_runs=3, timeout=5)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_output_and_errors(self):
+        self.assertEqual(self.pool.execute('print("hello")'), ({"status": "ok", "stderr": ""}, "hello\n"))
+        status, output = self.pool.execute('print("before")\nraise ValueError("bad value")')
+        self.assertEqual((status["status"], status["error"], output), ("error", "bad value", "before\n"))
+        self.assertEqual(self.pool.execute('import sys\nsys.exit(1)')[0]["status"], "exit")
+
+    def test_streamed_output(self):
+        chunks = []
+        status, output = self.pool.execute('import time\nfor i in range(3):\n    print(i)\n    time.sleep(0.05)', on_output=chunks.append)
+        self.assertEqual("".join(chunks), output)
+        self.assertEqual(output, "0\n1\n2\n")
+
+    def test_concurrent_runs(self):
+        start = time.monotonic()
+        threads = [threading.Thread(target=self.pool.execute, args=('import time\ntime.sleep(0.5)',)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(time.monotonic() - start, 0.95)
+
+    def test_fresh_globals_and_workers_recycled(self):
+        self.pool.execute('x = 1')
+        self.assertEqual(self.pool.execute('print(x)')[0]["error"], "name 'x' is not defined")
+        pids = {self.pool.execute('import os\nprint(os.getpid())')[1] for _ in range(8)}
+        self.assertGreater(len(pids), 2)
+        self.assertEqual(len(self.pool.workers), 2)
+
+    def test_process_state_persists_until_recycled(self):
+        pool = PythonWorkerPool(size=1, max_runs=2, timeout=5)
+        self.addCleanup(pool.shutdown)
+        pool.execute('import os\nos.environ["LEAK"] = "1"')
+        self.assertEqual(pool.execute('print(os.environ.get("LEAK"))')[1], "1\n")
+        self.assertEqual(pool.execute('print(os.environ.get("LEAK"))')[1], "None\n")
+
+    def test_memory_limit(self):
+        pool = PythonWorkerPool(size=1, memory_mb=256, timeout=5)
+        self.addCleanup(pool.shutdown)
+        status, output = pool.execute('import mmap\nreserved = mmap.mmap(-1, 4 << 30, prot=mmap.PROT_READ)\nprint("reserved")')
+        self.assertEqual((status["status"], output), ("ok", "reserved\n"))
+        self.assertEqual(pool.execute('data = bytearray(512 << 20)')[0]["error"], "MemoryError")
+
+    def test_timeout_kills_worker(self):
+        self.pool.timeout = 0.5
+        status, output = self.pool.execute('import time\nprint("start")\ntime.sleep(10)')
+        self.assertEqual(status["error"], "timed out after 0.5 seconds")
+        self.assertEqual(output, "start\n")
+        self.pool.timeout = 5
+        self.assertEqual(self.pool.execute('print(1)')[1], "1\n")
+
+    def test_cpu_limit(self):
+        self.pool.cpu_seconds = 1
+        status, _ = self.pool.execute('while True:\n    pass')
+        self.assertEqual(status["error"], "CPU time limit exceeded")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,365 @@
+import unittest
+import time
+import tempfile
+import threading
+from unittest.mock import patch, MagicMock
+import os, sys
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # Add project root to Python path
+
+from sources.router import AgentRouter
+from sources.routing_cache import RoutingCache
+from sources.knn_router import KnnRouter
+from sources.router_benchmark import load_dataset, run_benchmark, default_targets
+
+VOCABULARY = ["web", "search", "code", "python", "script", "hello", "how", "file", "find", "and", "then"]
+
+def bag_of_words(texts):
+    return np.array([[text.lower().count(word) for word in VOCABULARY] + [0.01] for text in texts], dtype=np.float32)
+
+class FakeClassifier:
+    def __init__(self):
+        self.model = object()
+        self.tokenizer = object()
+        self.examples = []
+
+    def add_examples(self, texts, labels):
+        self.examples.extend(zip(texts, labels))
+
+    def predict(self, text):
+        return [("talk", 0.9), ("LOW", 0.8)]
+
+    def predict_batch(self, texts, batch_size=32):
+        return [self.predict(text) for text in texts]
+
+class TestRouterLoading(unittest.TestCase):
+    def setUp(self):
+        self.patches = [
+            patch('sources.router.LanguageUtility', MagicMock()),
+            patch.object(AgentRouter, 'load_pipelines', return_value={"bart": MagicMock()}),
+            patch.object(AgentRouter, 'load_llm_router', side_effect=FakeClassifier),
+            patch.object(AgentRouter, 'state_dir', tempfile.mkdtemp()),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_classifiers_share_backbone(self):
+        router = AgentRouter([])
+        self.assertTrue(router.wait_ready())
+        self.assertIs(router.talk_classifier.model, router.complexity_classifier.model)
+        self.assertIsNot(router.talk_classifier, router.complexity_classifier)
+        talk_labels = {label for _, label in router.talk_classifier.examples}
+        complexity_labels = {label for _, label in router.complexity_classifier.examples}
+        self.assertEqual(complexity_labels, {"LOW", "HIGH"})
+        self.assertNotIn("HIGH", talk_labels)
+        self.assertEqual(AgentRouter.load_llm_router.call_count, 1)
+
+    def test_readiness_while_loading(self):
+        release = threading.Event()
+        AgentRouter.load_pipelines.side_effect = lambda: release.wait() and {"bart": MagicMock()}
+        router = AgentRouter([])
+        self.assertEqual(router.readiness()["bart"], "loading")
+        self.assertFalse(router.is_ready())
+        release.set()
+        self.assertTrue(router.wait_ready())
+        self.assertEqual(set(router.readiness().values()), {"ready"})
+
+    def test_readiness_error(self):
+        AgentRouter.load_llm_router.side_effect = Exception("missing model")
+        router = AgentRouter([])
+        self.assertFalse(router.wait_ready())
+        self.assertEqual(router.readiness()["llm_router"], "error: missing model")
+        with self.assertRaises(Exception):
+            router.talk_classifier
+
+    def test_trained_state_persisted(self):
+        first = AgentRouter([])
+        self.assertTrue(first.wait_ready())
+        with patch.object(FakeClassifier, 'add_examples') as add_examples:
+            second = AgentRouter([])
+            self.assertTrue(second.wait_ready())
+            add_examples.assert_not_called()
+        self.assertEqual(second.talk_classifier.examples, first.talk_classifier.examples)
+        self.assertIs(second.talk_classifier.model, second.complexity_classifier.model)
+        self.assertEqual(len(os.listdir(AgentRouter.state_dir)), 1)
+
+    def test_trained_state_key_changes_with_examples(self):
+        router = AgentRouter([])
+        router.wait_ready()
+        key = router.router_state_key(router.talk_classifier)
+        with patch.object(AgentRouter, 'few_shots_tasks', return_value=[("hi", "talk")]):
+            self.assertNotEqual(router.router_state_key(router.talk_classifier), key)
+
+class TestRoutingCascade(unittest.TestCase):
+    def setUp(self):
+        self.bart = MagicMock(return_value={"labels": ["web", "talk"], "scores": [0.6, 0.4]})
+        self.patches = [
+            patch('sources.router.LanguageUtility', MagicMock()),
+            patch.object(AgentRouter, 'load_pipelines', return_value={"bart": self.bart}),
+            patch.object(AgentRouter, 'load_classifiers', return_value=(FakeClassifier(), FakeClassifier())),
+        ]
+        for p in self.patches:
+            p.start()
+        self.router = AgentRouter([], router_confidence_threshold=0.7)
+        self.router.wait_ready()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def route(self, prediction, labels=["talk", "web", "code"]):
+        with patch.object(AgentRouter, 'llm_router', return_value=prediction):
+            return self.router.router_vote("search the web for news", labels)
+
+    def test_confident_router_skips_bart(self):
+        self.assertEqual(self.route(("code", 0.9)), "code")
+        self.bart.assert_not_called()
+        self.assertEqual(self.router.last_decision["tier"], "llm_router")
+
+    def test_uncertain_router_escalates_to_bart(self):
+        self.assertEqual(self.route(("code", 0.3)), "web")
+        self.bart.assert_called_once()
+        self.assertEqual(self.router.last_decision["tier"], "vote")
+
+    def test_unknown_label_escalates(self):
+        self.assertEqual(self.route(("mcp", 0.95)), "mcp")
+        self.bart.assert_called_once()
+
+    def test_routing_stats(self):
+        self.route(("code", 0.9))
+        self.route(("code", 0.3))
+        self.router.router_vote("hi", ["talk"])
+        stats = self.router.routing_stats()
+        self.assertEqual(stats["decisions"], {"short": 1, "llm_router": 1, "bart": 0, "vote": 1, "knn": 0})
+        self.assertAlmostEqual(stats["fast_path_rate"], 2 / 3)
+
+class TestConcurrentSignals(unittest.TestCase):
+    def setUp(self):
+        self.patches = [
+            patch('sources.router.LanguageUtility', MagicMock()),
+            patch.object(AgentRouter, 'load_pipelines', return_value={"bart": MagicMock()}),
+            patch.object(AgentRouter, 'load_classifiers', return_value=(FakeClassifier(), FakeClassifier())),
+        ]
+        for p in self.patches:
+            p.start()
+        self.agents = [MagicMock(role="talk", agent_name="jarvis"), MagicMock(role="web", agent_name="browser")]
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def make_router(self, **kwargs):
+        router = AgentRouter(self.agents, cache_size=0, **kwargs)
+        router.lang_analysis.detect_language.return_value = "en"
+        router.lang_analysis.translate.side_effect = lambda text, lang: text
+        return router
+
+    def test_complexity_and_vote_run_concurrently(self):
+        voting = threading.Event()
+        router = self.make_router()
+        def complexity(text):
+            self.assertTrue(voting.wait(timeout=5))
+            return "LOW"
+        def vote(text, labels):
+            voting.set()
+            return "llm_router", "web", 0.9
+        with patch.object(router, 'estimate_complexity', side_effect=complexity), \
+             patch.object(router, 'cascade_vote', side_effect=vote):
+            self.assertIs(router.select_agent("search the web for news"), self.agents[1])
+
+    def test_high_complexity_wins_over_vote(self):
+        router = self.make_router()
+        with patch.object(router, 'estimate_complexity', return_value="HIGH"), \
+             patch.object(router, 'cascade_vote', return_value=("llm_router", "web", 0.9)):
+            self.assertEqual(router.route("search the web then code an app", "en", ["talk", "web"]),
+                             {"role": None, "complexity": "HIGH"})
+        self.assertEqual(sum(router.tier_counts.values()), 0)
+
+    def test_threads_split_only_with_cpu_optimized_profile(self):
+        with patch('sources.router.configure_threads') as configure_threads, \
+             patch('sources.router.get_model_profile', return_value="default"):
+            self.make_router()
+        configure_threads.assert_not_called()
+        with patch('sources.router.configure_threads') as configure_threads, \
+             patch('sources.router.get_model_profile', return_value="cpu-optimized"):
+            self.make_router()
+            self.make_router(concurrent_signals=False)
+        configure_threads.assert_called_once_with(concurrent_jobs=2)
+
+    def test_stage_timings_recorded(self):
+        router = self.make_router(concurrent_signals=False)
+        with patch.object(router, 'estimate_complexity', return_value="LOW"), \
+             patch.object(router, 'router_vote', return_value="web"):
+            router.select_agent("search the web for news")
+        self.assertIsNone(router.signal_pool)
+        self.assertEqual(set(router.last_timings),
+                         {"cache_hit", "detect_language", "translate", "complexity", "vote", "total"})
+        self.assertGreaterEqual(router.last_timings["total"], router.last_timings["vote"])
+
+class TestRoutingCache(unittest.TestCase):
+    def setUp(self):
+        self.patches = [
+            patch('sources.router.LanguageUtility', MagicMock()),
+            patch.object(AgentRouter, 'load_pipelines', return_value={"bart": MagicMock()}),
+            patch.object(AgentRouter, 'load_classifiers', return_value=(FakeClassifier(), FakeClassifier())),
+        ]
+        for p in self.patches:
+            p.start()
+        self.agents = [MagicMock(role="talk", agent_name="jarvis"), MagicMock(role="web", agent_name="browser")]
+        self.router = AgentRouter(self.agents)
+        self.router.lang_analysis.detect_language.return_value = "en"
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_repeated_query_hits_cache(self):
+        with patch.object(AgentRouter, 'route', return_value={"role": "web", "complexity": "LOW"}) as route:
+            self.assertIs(self.router.select_agent("Search the web for news"), self.agents[1])
+            self.assertIs(self.router.select_agent("  search the WEB for news! "), self.agents[1])
+            route.assert_called_once()
+        stats = self.router.routing_stats()["cache"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_cache_ttl_and_size(self):
+        cache = RoutingCache(max_entries=2, ttl=10)
+        for i in range(3):
+            cache.put(cache.make_key(f"query {i}", "en", ["talk"]), {"role": "talk"})
+        self.assertIsNone(cache.get(cache.make_key("query 0", "en", ["talk"])))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        with patch('sources.routing_cache.time.time', return_value=time.time() + 11):
+            self.assertIsNone(cache.get(cache.make_key("query 2", "en", ["talk"])))
+
+class TestBatchRouting(unittest.TestCase):
+    def setUp(self):
+        self.bart = MagicMock(side_effect=lambda texts, labels, batch_size: [{"labels": ["web", "talk"], "scores": [0.9, 0.1]} for _ in texts])
+        self.patches = [
+            patch('sources.router.LanguageUtility', MagicMock()),
+            patch.object(AgentRouter, 'load_pipelines', return_value={"bart": self.bart}),
+            patch.object(AgentRouter, 'load_classifiers', return_value=(FakeClassifier(), FakeClassifier())),
+        ]
+        for p in self.patches:
+            p.start()
+        self.agents = default_targets()
+        self.router = AgentRouter(self.agents)
+        self.router.lang_analysis.detect_language.return_value = "en"
+        self.router.lang_analysis.translate_batch.side_effect = lambda texts, langs, batch_size: texts
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_select_agents_routes_unique_misses_once(self):
+        self.router.select_agent("hello there, how are you")
+        with patch.object(AgentRouter, 'route_batch', side_effect=lambda texts, langs, labels, batch_size: [{"role": "web", "complexity": "LOW"}] * len(texts)) as route_batch:
+            agents = self.router.select_agents(["hello there, how are you", "search the news", "Search the news!"])
+        self.assertEqual(route_batch.call_args[0][0], ["search the news", "Search the news!"])
+        self.assertEqual([agent.role for agent in agents], ["talk", "web", "web"])
+
+    def test_uncertain_texts_batched_through_bart(self):
+        with patch.object(FakeClassifier, 'predict', side_effect=lambda text: [("talk", 0.95 if "hello" in text else 0.4), ("LOW", 0.9)]):
+            agents = self.router.select_agents(["hello my friend", "search the news", "find a laptop", "hi"])
+        self.assertEqual([agent.role for agent in agents], ["talk", "web", "web", "talk"])
+        self.bart.assert_called_once()
+        self.assertEqual(self.bart.call_args[0][0], ["search the news", "find a laptop"])
+        self.assertEqual(self.router.tier_counts["llm_router"], 1)
+        self.assertEqual(self.router.tier_counts["short"], 1)
+
+    def test_high_complexity_skips_vote(self):
+        with patch.object(FakeClassifier, 'predict', return_value=[("HIGH", 0.95), ("web", 0.9)]):
+            agents = self.router.select_agents(["search an api then build an app with it"])
+        self.assertEqual(agents[0].role, "planification")
+        self.assertEqual(sum(self.router.tier_counts.values()), 0)
+
+    def test_benchmark_report(self):
+        path = os.path.join(tempfile.mkdtemp(), "queries.jsonl")
+        with open(path, 'w') as f:
+            f.write('{"text": "hello my friend", "label": "talk"}\n\n{"text": "search the news", "label": "web"}\n')
+            f.write('{"text": "find my file report.pdf", "label": "files"}\n')
+        report = run_benchmark(self.router, load_dataset(path))
+        self.assertEqual(report["count"], 3)
+        self.assertAlmostEqual(report["accuracy"], 1 / 3)
+        self.assertEqual(report["per_label"], {"talk": 1.0, "web": 0.0, "files": 0.0})
+        self.assertEqual([error["prediction"] for error in report["errors"]], ["talk", "talk"])
+
+    def test_benchmark_dataset(self):
+        examples = load_dataset(os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'router_queries.jsonl'))
+        roles = {target.role for target in default_targets()}
+        self.assertTrue(examples)
+        self.assertTrue(all(example["label"] in roles for example in examples))
+
+class TestKnnRouter(unittest.TestCase):
+    def setUp(self):
+        self.knn = KnnRouter(bag_of_words, k=3)
+        self.knn.fit({
+            "tasks": [("search the web", "web"), ("web search please", "web"), ("write python code", "code"),
+                      ("python script", "code"), ("hello how are you", "talk")],
+            "complexity": [("search the web", "LOW"), ("python script", "LOW"),
+                           ("find file and search web then write code", "HIGH")],
+        })
+
+    def test_both_heads_from_one_embedding(self):
+        embed = MagicMock(side_effect=bag_of_words)
+        self.knn.embed_fn = embed
+        prediction = self.knn.predict("search the web for news")
+        embed.assert_called_once()
+        self.assertEqual(prediction["tasks"][0][0], "web")
+        self.assertEqual(prediction["complexity"][0][0], "LOW")
+        self.assertAlmostEqual(sum(score for _, score in prediction["tasks"]), 1.0, places=5)
+
+    def test_predict_batch_matches_predict(self):
+        texts = ["write a python script", "hello, how is it going", "find the file and search the web then code"]
+        batch = self.knn.predict_batch(texts)
+        for text, prediction in zip(texts, batch):
+            single = self.knn.predict(text)
+            for head in ["tasks", "complexity"]:
+                self.assertEqual([label for label, _ in prediction[head]], [label for label, _ in single[head]])
+                np.testing.assert_allclose([score for _, score in prediction[head]], [score for _, score in single[head]], atol=1e-5)
+        self.assertEqual([prediction["tasks"][0][0] for prediction in batch[:2]], ["code", "talk"])
+
+    def test_save_and_load(self):
+        path = os.path.join(tempfile.mkdtemp(), "knn.npz")
+        self.knn.save(path)
+        loaded = KnnRouter(bag_of_words, k=3)
+        loaded.load(path)
+        self.assertEqual(loaded.predict("python code"), self.knn.predict("python code"))
+
+class TestKnnRouting(unittest.TestCase):
+    def setUp(self):
+        self.patches = [
+            patch('sources.router.LanguageUtility', MagicMock()),
+            patch.object(AgentRouter, 'load_pipelines', return_value={"bart": MagicMock()}),
+            patch.object(AgentRouter, 'load_classifiers', return_value=(FakeClassifier(), FakeClassifier())),
+            patch.object(AgentRouter, 'router_state_key', return_value="0" * 64),
+            patch.object(AgentRouter, 'embed_texts', side_effect=bag_of_words),
+            patch.object(AgentRouter, 'state_dir', tempfile.mkdtemp()),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_knn_engine(self):
+        router = AgentRouter([], routing_engine="knn")
+        self.assertTrue(router.wait_ready())
+        self.assertNotIn("bart", router.readiness())
+        AgentRouter.load_pipelines.assert_not_called()
+        router.lang_analysis.translate.side_effect = lambda text, lang: text
+        decision = router.route("can you search the web for the weather in paris", "en", ["talk", "web", "code"])
+        self.assertEqual(decision, {"role": "web", "complexity": "LOW"})
+        self.assertEqual(router.last_decision["tier"], "knn")
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            AgentRouter([], routing_engine="bert")
+
+if __name__ == '__main__':
+    unittest.main()